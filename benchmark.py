@@ -0,0 +1,221 @@
+##############################################################################################
+# modules
+##############################################################################################
+
+import argparse
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+
+##############################################################################################
+# Functions
+##############################################################################################
+
+def write_inventory(path, nodes, port, exp_ratio=0.1, cluster_size=10, gui_backend=''):
+
+    """
+    Writes a synthetic infrastructure.csv of nodes pointing at the fake server.
+    Every cluster_size nodes form a cluster with its first node as publisher, and exp_ratio of the
+    nodes are Expressways.
+
+        : param path : Path of the csv to write.
+        : param nodes : Number of nodes.
+        : param port : Port of the fake server.
+        : param exp_ratio : Share of the nodes that are Expressways.
+        : param cluster_size : Number of nodes per cluster.
+        : param gui_backend : The gui_backend column of the Expressways, empty for the default.
+
+    """
+
+    exp_every = int(1 / exp_ratio) if exp_ratio else 0
+
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['hostname', 'role', 'username', 'password', 'region', 'device', 'cluster', 'address', 'port', 'gui_backend'])
+        writer.writeheader()
+
+        for index in range(nodes):
+            expressway = exp_every and index % exp_every == exp_every - 1
+            writer.writerow({
+                'hostname': f'bench-{"exp" if expressway else "ucm"}-{index:05d}',
+                'role': 'publisher' if index % cluster_size == 0 and not expressway else '',
+                'username': 'expadmin' if expressway else 'admin',
+                'password': 'password',
+                'region': 'bench',
+                'device': 'exp' if expressway else 'ucm',
+                'cluster': f'bench-cluster-{index // cluster_size:04d}',
+                'address': '127.0.0.1',
+                'port': port,
+                'gui_backend': gui_backend if expressway else '',
+            })
+
+
+def _serve(options, port_queue):
+    from fake_server import FakeCLIServer, FakeExpresswayWeb
+
+    server = FakeCLIServer(latency=options['latency'], banner_delay=options['banner_delay'], services=options['services'],
+                           certs=options['certs'], alarms=options['alarms'])
+    web = FakeExpresswayWeb(alarms=options['alarms'], username='expadmin')
+    port_queue.put((server.start(), web.start()))
+
+    while True:
+        time.sleep(1)
+
+
+def _run_checks(path, options, web_port, result_queue):
+
+    """
+    Runs all_checks() against the inventory and puts the measurements on the queue.
+    Runs in its own process so the peak RSS and CPU time are those of this run only.
+
+    """
+
+    import checks
+    from engine import CheckEngine, AdaptiveLimiter
+    from exp_http import ExpresswayHTTP
+    from metrics import Metrics
+    from inventory import Inventory
+    from results import ResultCollector
+    from session_pool import SessionPool
+    from sharding import run_sharded, worker_options
+    from ucm_cli import open_session
+
+    ## The fake server has no browser GUI, the 'http' backend runs against its stand-in web interface.
+    checks.expressway_alarm_cleanup = lambda node, username, password, browsers=None: None
+    http_client = ExpresswayHTTP('http', port=web_port, workers=options['concurrency'])
+
+    inventory = Inventory(path)
+    collector = ResultCollector()
+    limiter = AdaptiveLimiter(options['initial_concurrency'], maximum=options['concurrency']) if options['initial_concurrency'] else None
+    engine = CheckEngine(options['concurrency'], options['cluster_concurrency'], limiter=limiter, start_jitter=options['start_jitter'])
+    pool = SessionPool(open_session, max_idle=len(inventory))
+    metrics = Metrics(inventory.cluster_of)
+    if limiter: metrics.listeners.append(limiter.observe)
+
+    ## The CPU time of the sharded workers is only counted once they have been joined, as that of the children.
+    def _cpu():
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return time.process_time() + children.ru_utime + children.ru_stime
+
+    start_wall = time.monotonic()
+    start_cpu = _cpu()
+
+    if options['processes'] > 1:
+        ## The workers use the default http client, so the Expressways are only run with the browser backend skipped.
+        sharded = worker_options(engine, options['processes'], 1, os.path.join(os.path.dirname(path), 'cert_cache.json'),
+                                 os.path.join(os.path.dirname(path), 'circuit_breaker.json'))
+        run_sharded(inventory, collector, options['processes'], sharded, metrics)
+    else:
+        checks.all_checks(inventory, collector, engine, pool, None, metrics, http_client=http_client)
+
+    wall = time.monotonic() - start_wall
+    cpu = _cpu() - start_cpu
+    pool.close_all()
+
+    result_queue.put({
+        'nodes': len(inventory),
+        'wall_s': round(wall, 3),
+        'nodes_per_s': round(len(inventory) / wall, 2) if wall else None,
+        'peak_rss_mb': round(max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / 1024, 1),
+        'cpu_ms_per_node': round(cpu * 1000 / len(inventory), 2),
+        'findings': len(collector),
+        'final_limit': round(limiter.limit, 1) if limiter else None,
+        'mean_step_s': {name: round(elem['sum'] / elem['count'], 4) for name, elem in metrics.to_dict()['steps'].items()},
+    })
+
+
+def run_benchmark(sizes, options):
+
+    """
+    Starts the fake server in its own process and runs the checks once per inventory size.
+    Returns the list of measurements.
+
+        : param sizes : List of inventory sizes.
+        : param options : Dict of the fake server and engine options.
+
+    """
+
+    ctx = multiprocessing.get_context('spawn')
+    port_queue = ctx.Queue()
+    server = ctx.Process(target=_serve, args=(options, port_queue), daemon=True)
+    server.start()
+    port, web_port = port_queue.get(timeout=60)
+
+    results = []
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            for size in sizes:
+                path = os.path.join(tmp, f'infrastructure_{size}.csv')
+                write_inventory(path, size, port, options['exp_ratio'], gui_backend=options['gui_backend'])
+
+                result_queue = ctx.Queue()
+                worker = ctx.Process(target=_run_checks, args=(path, options, web_port, result_queue))
+                worker.start()
+                result = result_queue.get()
+                worker.join()
+
+                logging.info('## {} - run_benchmark() -- {}'.format(__name__, result))
+                results.append(result)
+
+    finally:
+        server.terminate()
+
+    return results
+
+
+##############################################################################################
+# Run
+##############################################################################################
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Throughput benchmark of the checks against a local fake CUCM/Expressway SSH server.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000], help='inventory sizes to run, 10 to 5000')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds per command on the fake server')
+    parser.add_argument('--banner-delay', type=float, default=0.5, help='seconds before the first prompt')
+    parser.add_argument('--services', type=int, default=60, help='lines of utils service list')
+    parser.add_argument('--certs', type=int, default=12, help='certs in show cert list own')
+    parser.add_argument('--alarms', type=int, default=3, help='alarms in xstatus alarm')
+    parser.add_argument('--exp-ratio', type=float, default=0.1, help='share of Expressway nodes')
+    parser.add_argument('--gui-backend', choices=['browser', 'http'], default='http', help='alarm cleanup backend of the Expressways, browser is skipped')
+    parser.add_argument('--concurrency', type=int, default=200, help='global concurrency of the engine')
+    parser.add_argument('--initial-concurrency', type=int, default=0, help='start limit of the adaptive limiter, 0 for a fixed limit')
+    parser.add_argument('--start-jitter', type=float, default=0, help='seconds over which the first sessions are spread')
+    parser.add_argument('--cluster-concurrency', type=int, default=20, help='per cluster concurrency of the engine')
+    parser.add_argument('--processes', type=int, default=1, help='worker processes the inventory is sharded across')
+    parser.add_argument('--json', help='write the results to this json file')
+    args = parser.parse_args()
+
+    format = "%(asctime)s: %(message)s"
+    logging.basicConfig(format=format, level=logging.INFO, datefmt="%H:%M:%S")
+
+    options = {
+        'latency': args.latency,
+        'banner_delay': args.banner_delay,
+        'services': args.services,
+        'certs': args.certs,
+        'alarms': args.alarms,
+        'exp_ratio': args.exp_ratio,
+        'gui_backend': args.gui_backend,
+        'concurrency': args.concurrency,
+        'cluster_concurrency': args.cluster_concurrency,
+        'initial_concurrency': args.initial_concurrency,
+        'start_jitter': args.start_jitter,
+        'processes': args.processes,
+    }
+
+    results = run_benchmark(args.sizes, options)
+
+    print(f'{"nodes":>6} {"wall s":>8} {"nodes/s":>8} {"peak RSS MB":>12} {"CPU ms/node":>12} {"findings":>9}')
+    for elem in results:
+        print(f'{elem["nodes"]:>6} {elem["wall_s"]:>8} {elem["nodes_per_s"]:>8} {elem["peak_rss_mb"]:>12} {elem["cpu_ms_per_node"]:>12} {elem["findings"]:>9}')
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=1)
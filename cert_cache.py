@@ -0,0 +1,178 @@
+##############################################################################################
+# modules
+##############################################################################################
+
+import json
+import os
+import threading
+import logging
+from datetime import datetime, timedelta
+
+
+##############################################################################################
+# Global Variables & Config
+##############################################################################################
+
+## Cached dates closer than refresh_days to expiry, or already past, are looked up again on every run, as a renewed
+## cert keeps its name and issuer. Every other entry is looked up again once it is max_age_days old.
+refresh_days = 28
+
+max_age_days = 7
+
+
+##############################################################################################
+# Classes
+##############################################################################################
+
+class CertCache:
+
+    """
+    On-disk cache of certificate expiry dates, keyed by node, cert name and issuer as seen in the output of
+    'show cert list own'. The cert list carries no serial number, and a renewed or regenerated cert usually keeps
+    its name and issuer, so the key alone cannot tell a renewed cert from the old one. A cached date is therefore
+    only served while it is more than refresh_days from expiry and less than max_age_days old, otherwise the cert
+    takes a 'show cert own <name>' round trip again.
+
+        : param path : Path to the json file the cache is stored in.
+        : param refresh_days : Days to expiry below which the date is always looked up again.
+        : param max_age_days : Days after which an entry is looked up again.
+
+    """
+
+    def __init__(self, path='cert_cache.json', refresh_days=refresh_days, max_age_days=max_age_days):
+        self.path = path
+        self.refresh_days = refresh_days
+        self.max_age_days = max_age_days
+        self.entries = {}
+        self.dirty = False
+        self._lock = threading.Lock()
+
+        if os.path.exists(self.path):
+            try:
+                with open(self.path) as f:
+                    self.entries = json.load(f)
+            except Exception as e:
+                logging.debug('## {} - {}.__init__() -- EXCEPTION -- {}'.format(__name__, self, e))
+
+    def __repr__(self):
+        return f'CertCache("{self.path}")'
+
+    def __str__(self):
+        return f'CertCache("{self.path}")'
+
+    def __len__(self):
+        return len(self.entries)
+
+
+    @staticmethod
+    def key(node, name, issuer):
+        return f'{node}|{name}|{issuer}'
+
+
+    def get(self, node, name, issuer):
+
+        """
+        Returns the cached expiry date ('%d/%m/%Y') of a cert, or None if the cert is new or has changed, or if the
+        entry is due to be looked up again.
+
+            : param node : The hostname or IP of the server.
+            : param name : The cert name, i.e. 'tomcat.pem'.
+            : param issuer : The cert issuer as shown by 'show cert list own'.
+
+        """
+
+        entry = self.entries.get(self.key(node, name, issuer))
+
+        ## Entries of older versions were the bare date, without the day they were looked up.
+        if not isinstance(entry, dict):
+            return None
+
+        try:
+            now = datetime.now()
+            if datetime.strptime(entry['expiry'], '%d/%m/%Y') - now <= timedelta(days=self.refresh_days):
+                return None
+            if now - datetime.strptime(entry['checked'], '%Y-%m-%d') >= timedelta(days=self.max_age_days):
+                return None
+        except (KeyError, ValueError):
+            return None
+
+        return entry['expiry']
+
+
+    def set(self, node, name, issuer, expiry):
+
+        """
+        Stores the expiry date of a cert.
+
+            : param node : The hostname or IP of the server.
+            : param name : The cert name, i.e. 'tomcat.pem'.
+            : param issuer : The cert issuer as shown by 'show cert list own'.
+            : param expiry : The expiry date as '%d/%m/%Y'.
+
+        """
+
+        with self._lock:
+            self.entries[self.key(node, name, issuer)] = {'expiry': expiry, 'checked': datetime.now().strftime('%Y-%m-%d')}
+            self.dirty = True
+
+
+    def prune(self, node, keys):
+
+        """
+        Drops the entries of a node that were not in its latest cert list, i.e. replaced or deleted certs.
+
+            : param node : The hostname or IP of the server.
+            : param keys : The keys seen in the latest cert list of the node.
+
+        """
+
+        prefix = f'{node}|'
+        keys = set(keys)
+
+        with self._lock:
+            stale = [key for key in self.entries if key.startswith(prefix) and key not in keys]
+            for key in stale:
+                del self.entries[key]
+            if stale:
+                self.dirty = True
+
+
+    def merge(self, nodes, entries):
+
+        """
+        Replaces the entries of the given nodes with the entries of another cache, i.e. of a worker process
+        that checked those nodes.
+
+            : param nodes : The nodes the other cache is authoritative for.
+            : param entries : The entries of the other cache for those nodes.
+
+        """
+
+        prefixes = tuple(node + '|' for node in nodes)
+
+        with self._lock:
+            for key in [key for key in self.entries if key.startswith(prefixes)]:
+                del self.entries[key]
+            self.entries.update(entries)
+            self.dirty = True
+
+
+    def save(self):
+
+        """
+        Writes the cache back to disk if it has changed. The file is replaced atomically so an interrupted
+        write never leaves a truncated cache behind.
+
+        """
+
+        with self._lock:
+            if not self.dirty:
+                return
+
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self.entries, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+
+        logging.debug('## {} - {}.save() -- {} ENTRIES'.format(__name__, self, len(self.entries)))
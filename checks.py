@@ -0,0 +1,472 @@
+##############################################################################################
+# modules
+##############################################################################################
+
+import socket
+import threading
+import logging
+from exp_cli import SSHConnectExp
+from exp_gui import BrowserPool, expressway_alarm_cleanup
+from exp_http import expressway_alarm_cleanup_http
+from engine import NodeTimeout
+from metrics import null_metrics
+from registry import CheckContext, CheckRegistry
+from results import CRITICAL, WARNING, UNKNOWN
+from results import NOT_RESPONDING, TIMED_OUT, STOPPED_SERVICE, EXPIRING_CERT, FAILED_BACKUP, HIGH_UPTIME, EXP_ALARMS
+from results import HIGH_CPU, HIGH_MEMORY, HIGH_DISK
+from ucm_cli import parse_status, parse_stopped_srvs, parse_backup
+from service_baseline import service_baseline, role_of
+from sharding import run_sharded, worker_options
+
+
+##############################################################################################
+# Global Variables & Config
+##############################################################################################
+
+## How the Expressway license alarms are acknowledged, 'browser' (Selenium) or 'http' (plain requests).
+## A gui_backend column in the infrastructure.csv overrides it per node.
+gui_backend = 'browser'
+
+
+##############################################################################################
+# Functions
+##############################################################################################
+
+## Parsers of the check registry, called as parse(lines, ctx).
+
+def _parse_status(lines, ctx):
+    return parse_status(lines)
+
+
+def _parse_stopped_srvs(lines, ctx):
+    baseline = ctx.baseline or service_baseline
+    return parse_stopped_srvs(lines, baseline.expected(ctx.node, role_of(ctx.row)))
+
+
+def _parse_certs(lines, ctx):
+    return ctx.conn.get_certs(ctx.cert_cache, lines)
+
+
+def _parse_backup(lines, ctx):
+    return parse_backup(lines)
+
+
+## Evaluations of the check registry, called as evaluate(parsed, thresholds) and returning (severity, value, item) findings.
+
+def _eval_uptime(status, thresholds):
+    uptime, unit = status['uptime']
+    if 'days' in unit and int(uptime) >= thresholds['days']:
+        return [(WARNING, int(uptime), '')]
+    return []
+
+
+def _eval_cpu(status, thresholds):
+    if status['cpu_idle'] is not None and 100 - status['cpu_idle'] >= thresholds['percent']:
+        return [(WARNING, round(100 - status['cpu_idle'], 1), '')]
+    return []
+
+
+def _eval_memory(status, thresholds):
+
+    ## Cached and buffered memory is given back on demand, so it does not count as used.
+    memory = status['memory']
+    used = memory['used'] - memory.get('cached', 0) - memory.get('buffers', 0)
+    percent = round(used * 100 / memory['total'], 1)
+
+    if percent >= thresholds['percent']:
+        return [(WARNING, percent, '')]
+    return []
+
+
+def _eval_disk(status, thresholds):
+    return [(WARNING, percent, partition) for partition, percent in status['disks'].items() if percent >= thresholds['percent']]
+
+
+def _eval_stopped_srvs(stopped_srvs, thresholds):
+    return [(CRITICAL, f'{elem.state} {elem.reason}'.strip(), elem.name) for elem in stopped_srvs]
+
+
+def _eval_certs(certs, thresholds):
+    return [(WARNING, elem[2], elem[0]) for elem in certs if int(elem[3]) <= thresholds['days']]
+
+
+def _eval_backup(backups, thresholds):
+    if 'ERROR' in backups[0]:
+        return [(CRITICAL, (backups[1], backups[2]), '')]
+    return []
+
+
+## The checks run on every UCM, IM&P and CUC node. Adding a check is one register() call. Each command is run once
+## per node and parsed once for every check that reads it, i.e. uptime, CPU, memory and disks all come from 'show status'.
+ucm_checks = CheckRegistry()
+
+ucm_checks.register(HIGH_UPTIME, 'show status', _parse_status, _eval_uptime, {'days': 180})
+ucm_checks.register(HIGH_CPU, 'show status', _parse_status, _eval_cpu, {'percent': 90})
+ucm_checks.register(HIGH_MEMORY, 'show status', _parse_status, _eval_memory, {'percent': 90})
+ucm_checks.register(HIGH_DISK, 'show status', _parse_status, _eval_disk, {'percent': 90})
+ucm_checks.register(STOPPED_SERVICE, 'utils service list', _parse_stopped_srvs, _eval_stopped_srvs)
+ucm_checks.register(EXPIRING_CERT, 'show cert list own', _parse_certs, _eval_certs, {'days': 28})
+ucm_checks.register(FAILED_BACKUP, 'utils disaster_recovery history Backup', _parse_backup, _eval_backup,
+                    applies=lambda row: bool(row['role']), error='No DRF data available. Check node manually. Error = {e}')
+
+
+def _timed_node(metrics, func):
+
+    """
+    Wraps a per-node check function so the whole node is timed as a 'node' span.
+
+    """
+
+    def inner(node):
+        with metrics.span(node, 'node'):
+            return func(node)
+
+    return inner
+
+
+def _resolve(node):
+
+    """
+    Returns the IP address of a hostname, or the hostname itself when it does not resolve.
+
+    """
+
+    try:
+        return socket.gethostbyname(node)
+    except OSError as e:
+        logging.debug('## {} - _resolve({}) -- EXCEPTION -- {}'.format(__name__, node, e))
+        return node
+
+
+def _connect(breaker, node, address, port, connect):
+
+    """
+    Opens a session with connect(), through the circuit breaker when there is one.
+
+    """
+
+    if breaker is None:
+        return connect()
+
+    return breaker.call(node, address or node, port, connect)
+
+
+def _record_failure(collector, node, e):
+
+    """
+    Records a node the engine gave up on, either timed out or failed outside of the checks' own handling.
+    Called as the node completes, so the later records of a timed out node are dropped by the collector.
+
+        : param collector : The ResultCollector() of the run.
+        : param node : The hostname or IP of the server.
+        : param e : The exception the node ended with, None if it completed.
+
+    """
+
+    if isinstance(e, NodeTimeout):
+        collector.add(node, TIMED_OUT, CRITICAL, str(e) + '. Check node manually')
+    elif e is not None:
+        collector.add(node, NOT_RESPONDING, CRITICAL, str(e))
+
+
+def run_tasks(engine, collector, tasks, cluster_of=None, on_result=None):
+
+    """
+    Runs the nodes of several check tasks together on one engine, so they share its concurrency limits and the
+    run takes about as long as the slowest task instead of the sum of them. The tasks are queued in the given
+    order, then each task's finish function is called once all nodes are done.
+
+        : param engine : The CheckEngine() running the nodes.
+        : param collector : The ResultCollector() of the run.
+        : param tasks : List of (func, hostnames, finish) as returned by core_tasks() and exp_tasks().
+        : param cluster_of : Optional function returning the cluster name of a node.
+        : param on_result : Optional callback called with each (node, result, exception) as its node completes.
+
+    """
+
+    func_of = {}
+    for func, hostnames, finish in tasks:
+        for node in hostnames:
+            func_of[node] = func
+
+    def _on_result(node, result, e):
+        _record_failure(collector, node, e)
+        if on_result: on_result(node, result, e)
+
+    results = engine.run(lambda node: func_of[node](node), list(func_of), cluster_of, _on_result)
+
+    for func, hostnames, finish in tasks:
+        if finish: finish()
+
+    return results
+
+
+def core_checks(inventory, collector, engine, pool, cert_cache, metrics=None, breaker=None, checks=None):
+
+    """
+    Runs the UCM, IM&P and CUC checks of the inventory on their own, optionally only the named checks.
+
+    """
+
+    return run_tasks(engine, collector, [core_tasks(inventory, collector, pool, cert_cache, metrics, breaker, checks)], inventory.cluster_of)
+
+
+def exp_checks(inventory, collector, engine, metrics=None, browsers=None, http_client=None, breaker=None):
+
+    """
+    Runs the Expressway checks of the inventory on their own.
+
+    """
+
+    return run_tasks(engine, collector, [exp_tasks(inventory, collector, metrics, browsers, http_client, breaker)], inventory.cluster_of)
+
+
+def all_checks(inventory, collector, engine, pool, cert_cache, metrics=None, browsers=None, http_client=None, breaker=None, on_result=None):
+
+    """
+    Runs the UCM and the Expressway checks of the inventory at the same time on one engine.
+    The Expressways are queued first as each of them takes longer than a UCM node. The engine starts the nodes in
+    the order they are queued, so they take the first free slots, within the limits of their clusters.
+
+    """
+
+    tasks = [
+        exp_tasks(inventory, collector, metrics, browsers, http_client, breaker),
+        core_tasks(inventory, collector, pool, cert_cache, metrics, breaker),
+    ]
+
+    return run_tasks(engine, collector, tasks, inventory.cluster_of, on_result)
+
+
+def run_checks(inventory, collector, engine, pool, cert_cache, metrics=None, breaker=None, processes=1, browser_pool_size=1):
+
+    """
+    Runs every check of the inventory, in this process with all_checks() or split across worker processes with
+    run_sharded(), whose limits are those of the engine shared out between them. The collector is then closed, so
+    the threads of timed out nodes add nothing more, and the cert cache and circuit breaker are saved.
+
+        : param inventory : The Inventory() loaded from the infrastructure.csv.
+        : param collector : The ResultCollector() the findings are recorded to.
+        : param engine : The CheckEngine() of the run.
+        : param pool : The SessionPool() of the UCM sessions, unused by the workers that open their own.
+        : param cert_cache : The CertCache() of the run.
+        : param metrics : Optional Metrics() the timings are recorded to.
+        : param breaker : Optional CircuitBreaker() of the run.
+        : param processes : The number of worker processes, 1 runs the checks in this process.
+        : param browser_pool_size : The number of browsers of the Expressway license alarm cleanup.
+
+    """
+
+    if processes > 1:
+        options = worker_options(engine, processes, browser_pool_size, cert_cache.path, breaker.path if breaker else None)
+        run_sharded(inventory, collector, processes, options, metrics, cert_cache, breaker)
+
+    else:
+        browsers = BrowserPool(browser_pool_size)
+
+        ## The UCM and Expressway nodes are checked at the same time, sharing the engine's limits.
+        try:
+            all_checks(inventory, collector, engine, pool, cert_cache, metrics, browsers, breaker=breaker)
+        finally:
+            browsers.close_all()
+
+    collector.close()
+
+    cert_cache.save()
+    if breaker is not None:
+        breaker.save()
+
+
+##############################################################################################
+
+def core_tasks(inventory, collector, pool, cert_cache, metrics=None, breaker=None, checks=None):
+
+    """
+    Takes the UCM, IM&P and CUC servers from the inventory and returns the (func, hostnames, finish) task
+    calling the _core_checks() inner function for each.
+
+        : param inventory : The Inventory() loaded from the infrastructure.csv.
+        : param collector : The ResultCollector() of the run the findings are recorded to.
+        : param pool : The SessionPool() the SSHConnect() sessions are taken from.
+        : param cert_cache : The CertCache() holding the known cert expiry dates.
+        : param metrics : Optional Metrics() of the run the timings are recorded to.
+        : param breaker : Optional CircuitBreaker() the connections are retried and fast-failed by.
+        : param checks : Optional names of the ucm_checks to run, all of them by default.
+
+    """
+
+    def _core_checks (node):
+
+        """
+        Inner function that takes an SSHConnect() session from the pool and runs the ucm_checks registry on it.
+
+            : param node : The hostname or IP of the UCM, IM&P or CUC server.
+
+        """
+
+
+        logging.info('## {} - _core_checks({}) -- STARTING CHECKS'.format(__name__, node))
+
+        ## Returns the username and password corresponding to the node from the inventory.
+        row = inventory[node]
+        username, password = row['username'], row['password']
+        port, address = int(row.get('port') or 22), row.get('address') or None
+
+        ## Take an SSHConnect() session from the pool, call its methods and record the servers that fail the
+        ## conditions to the collector.
+        conn = None
+
+        try:
+            conn = _connect(breaker, node, address, port, lambda: pool.acquire(node, username, password, port, address, metrics=metrics))
+            conn.metrics = metrics
+            logging.debug('## {} - pool.acquire("{}")'.format(__name__, node))
+
+            ## Runs every check of the registry that applies to the node, its commands in one pipelined round trip.
+            ucm_checks.run(CheckContext(node, row, conn, cert_cache), collector, metrics, checks)
+
+        except Exception as e:
+            logging.debug('## {} - SSHConnect("{}") -- EXCEPTION -- {}'.format(__name__, node, e))
+            collector.add(node, NOT_RESPONDING, CRITICAL, str(e))
+            if conn is not None: conn.broken = True
+
+        ## Hand the session back to the pool, it is health checked before it is used again. A session on which a
+        ## command raised is closed by the pool instead, as its late output would put it out of step.
+        if conn is not None:
+            pool.release(node, conn)
+            logging.debug('## {} - pool.release("{}")'.format(__name__, node))
+
+        logging.info('## {} - _core_checks({}) -- UCM CHECKS COMPLETE'.format(__name__, node))
+
+
+    logging.debug('## {} - core_tasks() -- ENTERING FUNC'.format(__name__))
+
+    if metrics is None: metrics = null_metrics
+
+    ## Create a list of server hostnames from the inventory.
+    hostnames = [row['hostname'] for row in inventory.ucm_nodes]
+
+    return _timed_node(metrics, _core_checks), hostnames, None
+
+
+##############################################################################################
+
+def exp_tasks(inventory, collector, metrics=None, browsers=None, http_client=None, breaker=None):
+
+    """
+    Takes the Expressway servers from the inventory and returns the (func, hostnames, finish) task calling the
+    _exp_checks() inner function for each. finish records the cluster alarms once every node is done.
+
+        : param inventory : The Inventory() loaded from the infrastructure.csv.
+        : param collector : The ResultCollector() of the run the findings are recorded to.
+        : param metrics : Optional Metrics() of the run the timings are recorded to.
+        : param browsers : Optional BrowserPool() the GUI alarm cleanup borrows its browsers from.
+        : param http_client : Optional ExpresswayHTTP() used by the nodes on the 'http' backend.
+        : param breaker : Optional CircuitBreaker() the connections are retried and fast-failed by.
+
+    """
+
+    def _exp_checks(node):
+
+        row = inventory[node]
+        username, password = row['username'], row['password']
+        port, address = int(row.get('port') or 22), row.get('address') or None
+
+        backend = row.get('gui_backend') or gui_backend
+
+        def _open_exp():
+            conn = SSHConnectExp(node, username, password, port, address, metrics)
+            logging.debug('## {} - SSHConnectExp("{}")'.format(__name__, node))
+
+            conn.init_connect()
+            logging.debug('## {} - SSHConnectExp("{}").init_connect()'.format(__name__, node))
+
+            return conn
+
+        ## The GUI cleanup is skipped on nodes known to be down, the SSH connect below reports them.
+        try:
+            with metrics.span(node, 'gui_cleanup', backend):
+                if breaker is not None and breaker.is_open(node):
+                    logging.debug('## {} - expressway_alarm_cleanup("{}") -- CIRCUIT OPEN -- SKIPPING'.format(__name__, node))
+                elif backend == 'http':
+                    expressway_alarm_cleanup_http(node, username, password, http_client, address)
+                else:
+                    expressway_alarm_cleanup(node, username, password, browsers)
+
+        except Exception as e:
+            logging.debug('## {} - expressway_alarm_cleanup("{}") -- EXCEPTION -- {}'.format(__name__, node, e))
+
+        try:
+            conn = _connect(breaker, node, address, port, _open_exp)
+
+            try:
+                ## The peers list the alarms of a node by its IP, so a node without an address column is resolved.
+                _add_alarms(node, address or _resolve(node), conn.get_alarms())
+                logging.debug('## {} - SSHConnectExp("{}").get_alarms()'.format(__name__, node))
+
+            except Exception as e:
+                logging.debug('## {} - SSHConnectExp("{}").get_alarms() -- EXCEPTION -- {}'.format(__name__, node, e))
+                collector.add(node, EXP_ALARMS, UNKNOWN, f'Alarm check failed: {e}')
+
+        except Exception as e:
+            logging.debug('## {} - SSHConnect("{}") -- EXCEPTION -- {}'.format(__name__, node, e))
+            collector.add(node, NOT_RESPONDING, CRITICAL, str(e))
+
+        try:
+            conn.close_ssh()
+            logging.debug('## {} - SSHConnectExp("{}").close_ssh()'.format(__name__, node))
+
+        except Exception as e:
+                logging.debug('## {} - SSHConnectExp("{}").close_ssh() -- EXCEPTION -- {}'.format(__name__, node, e))
+
+        logging.info('## {} - _core_checks({}) -- EXPRESSWAY CHECKS COMPLETE'.format(__name__, node))
+
+
+    ## Every peer of an Expressway cluster lists the alarms of the whole cluster, so the alarms are gathered per
+    ## cluster as {(cluster, origin, id, title): [alarm, reporting nodes]} and recorded once after the run.
+    cluster_alarms = {}
+    alarms_lock = threading.Lock()
+
+    def _add_alarms(node, address, alarms):
+        cluster = inventory.cluster_of(node)
+
+        with alarms_lock:
+            hostname_of[(cluster, address)] = node
+
+            for alarm in alarms:
+                origin = address if alarm.peer == 'This system' else alarm.peer
+                entry = cluster_alarms.setdefault((cluster, origin, alarm.id, alarm.title), [alarm, set()])
+                entry[1].add(node)
+
+    def _record_alarms():
+
+        ## The thread of a timed out Expressway can still be adding its alarms.
+        with alarms_lock:
+            items = [(key, (alarm, set(reporters))) for key, (alarm, reporters) in cluster_alarms.items()]
+
+        for (cluster, origin, alarm_id, title), (alarm, reporters) in items:
+            value = alarm.to_dict()
+
+            ## Alarms are recorded against the peer that raised them when it is in the inventory, and against the
+            ## first reporting node otherwise, so the same alarm keeps the same node from run to run.
+            if hostname_of.get((cluster, origin)) not in (None, *collector.timed_out):
+                node, value['peer'] = hostname_of[(cluster, origin)], 'This system'
+            else:
+                node = min(reporters - collector.timed_out, default=min(reporters))
+
+            collector.add(node, EXP_ALARMS, WARNING, value, f'{alarm_id} {title}')
+
+
+    logging.debug('## {} - exp_tasks() -- ENTERING FUNC'.format(__name__))
+
+    if metrics is None: metrics = null_metrics
+
+    hostnames = [row['hostname'] for row in inventory.exp_nodes]
+
+    ## Hostname of each Expressway by (cluster, hostname or address), to match the peer addresses in the alarms.
+    hostname_of = {}
+    for row in inventory.exp_nodes:
+        cluster = inventory.cluster_of(row['hostname'])
+        hostname_of[(cluster, row['hostname'])] = row['hostname']
+        if row.get('address'): hostname_of[(cluster, row['address'])] = row['hostname']
+
+    return _timed_node(metrics, _exp_checks), hostnames, _record_alarms
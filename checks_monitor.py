@@ -0,0 +1,96 @@
+##############################################################################################
+# modules
+##############################################################################################
+
+import json
+import logging
+from datetime import date
+from email.message import EmailMessage
+from email_settings import smtp_server, from_email, to_email, cc_email_1, cc_email_2
+from inventory import Inventory
+from mailer import ReportMailer
+from monitor import Monitor, format_event
+
+
+##############################################################################################
+# Global Variables & Config
+##############################################################################################
+
+## Seconds between polls of each node. The monitor keeps one admin CLI session open per UCM node on top of the
+## sessions of the daily checks.
+poll_interval = 30
+
+## Every event is appended to this file as a json line.
+events_log = 'uc_checks_events.jsonl'
+
+## With email_events each round with events is also emailed.
+email_events = True
+
+mailer = ReportMailer(smtp_server)
+
+
+##############################################################################################
+# Functions
+##############################################################################################
+
+def log_events(events):
+
+    """
+    Appends the events of a round to the events log.
+
+    """
+
+    with open(events_log, 'a') as f:
+        for elem in events:
+            f.write(json.dumps(elem.to_dict(), default=str) + '\n')
+
+
+def email_events_of(events):
+
+    """
+    Emails the events of a round as one message.
+
+    """
+
+    msg = EmailMessage()
+    msg.set_content(''.join(format_event(elem) + '\n' for elem in events))
+
+    msg['Subject'] = f'UC Checks - {len(events)} state changes - {date.today()}'
+    msg['From'] = f'{from_email}'
+    msg['To'] = f'{to_email}'
+    msg['Bcc'] = f'{cc_email_1}, {cc_email_2}'
+
+    mailer.send(msg)
+
+
+def monitor():
+
+    """
+    Polls the UCM nodes of the inventory until interrupted and reports each change of state as it is seen.
+
+    """
+
+    inventory = Inventory('infrastructure.csv')
+
+    nodes = Monitor(inventory, poll_interval)
+    nodes.listeners.append(log_events)
+    if email_events:
+        mailer.start()
+        nodes.listeners.append(email_events_of)
+
+    try:
+        nodes.run_forever()
+    except KeyboardInterrupt:
+        logging.info('## {} - monitor() -- STOPPED -- {}'.format(__name__, nodes))
+
+
+##############################################################################################
+# Run
+##############################################################################################
+
+if __name__ == '__main__':
+
+    format = "%(asctime)s: %(message)s"
+    logging.basicConfig(format=format, level=logging.INFO, datefmt="%H:%M:%S")
+
+    monitor()
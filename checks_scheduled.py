@@ -2,317 +2,251 @@
 # modules
 ##############################################################################################
 
-import csv
-import concurrent.futures
+import os
 import time
+import threading
 from datetime import date
-import schedule
+from functools import partial
 import logging
-import smtplib
-import os
 from email.message import EmailMessage
-from ucm_cli import SSHConnect, parse_resp
-from exp_cli import SSHConnectExp, parse_resp_exp
+from ucm_cli import open_session
 from email_settings import smtp_server, from_email, to_email, cc_email_1, cc_email_2
-from exp_gui import expressway_alarm_cleanup
+from checks import run_checks, core_checks
+from engine import CheckEngine, AdaptiveLimiter
+from inventory import Inventory
+from session_pool import SessionPool
+from cert_cache import CertCache
+from circuit_breaker import CircuitBreaker
+from results import ResultCollector
+from results_db import ResultsDB
+from report import StreamingReport, render_changes
+from metrics import Metrics
+from mailer import ReportMailer
+from job_scheduler import JobScheduler
+from results import NOT_RESPONDING, TIMED_OUT, STOPPED_SERVICE, HIGH_CPU, HIGH_MEMORY, HIGH_DISK
 
 
 ##############################################################################################
 # Global Variables & Config
 ##############################################################################################
 
-nodes_not_responding = []
-
-nodes_high_uptime = []
-
-nodes_stpd_srvs = []
-
-nodes_expiring_certs = []
-
-nodes_failed_backup = []
-
-exp_alarms = []
-
-
-##############################################################################################
-# Functions
-##############################################################################################
-
-def core_checks():
+## Number of nodes checked at the same time across the run, and within a single cluster.
+max_concurrency = 200
 
-    """
-    Reads the server info from the infrastructure.csv.
-    Creates a thread for each server returned from the csv and calls the _core_checks() inner function.
-
-    """
-
-    def _core_checks (node):
+cluster_concurrency = 20
 
-        """
-        Inner function that creates an instance of SSHConnect() and calls the methods configured there in.
+## The global limit adapts between min_concurrency and max_concurrency, starting from initial_concurrency, and the
+## first sessions are spread over start_jitter seconds.
+initial_concurrency = 10
 
-            : param node : The hostname or IP of the UCM, IM&P or CUC server.
+min_concurrency = 2
 
-        """
+start_jitter = 10
 
+## Kept between runs, so each run starts from the limit the previous one settled on.
+limiter = AdaptiveLimiter(initial_concurrency, min_concurrency, max_concurrency)
 
-        logging.info('## {} - _core_checks({}) -- STARTING CHECKS'.format(__name__, node))
+## Worker processes the inventory is split across by cluster, to spread the SSH crypto over several cores.
+## With 1 every node is checked in this process. The concurrency limits above are shared out between the workers.
+processes = 1
 
-        ## Returns the username and password corresponding to the node from the csv.
-        with open('infrastructure.csv') as f:
-            for row in csv.DictReader(f):
-                if node == row['hostname']:
-                    role, username, password = row['role'], row['username'], row['password']
+## Seconds the whole run may take before the report is sent with what was collected, and seconds a single node may take.
+run_budget = 30 * 60
 
-        ## Create the SSHConnect() instance, call its methods and records servers that fail the conditions to the
-        ## 5 lists at the top of the script.
-        try:
-            conn = SSHConnect(node, username, password)
-            logging.debug('## {} - SSHConnect("{}")'.format(__name__, node))
+node_timeout = 10 * 60
 
-            conn.init_connect()
-            logging.debug('## {} - SSHConnect("{}").init_connect()'.format(__name__, node))
+## Loaded by the first run and kept between runs, the csv is only parsed again when it changes.
+inventory = None
 
+inventory_lock = threading.Lock()
 
-            try:
-                conn.run_cmd('set cli pagination off')
-                logging.debug('## {} - SSHConnect("{}").run_cmd()'.format(__name__, node))
+## UCM sessions are kept open between runs, at most max_idle_sessions of them, to stay under the admin CLI session limit.
+max_idle_sessions = 100
 
-            except Exception as e:
-                logging.debug('## {} - SSHConnect("{}").run_cmd() -- EXCEPTION -- {}'.format(__name__, node, e))
+pool = SessionPool(open_session, max_idle_sessions)
 
+## Cert expiry dates, only new or changed certs are looked up on the nodes.
+cert_cache = CertCache('cert_cache.json')
 
-            try:
-                uptime, unit = conn.get_uptime()
-                logging.debug('## {} - SSHConnect("{}").get_uptime()'.format(__name__, node))
 
-                if 'days' in unit and int(uptime) >= 180:
-                    logging.debug('## {} - SSHConnect("{}").get_uptime() -- {} {}'.format(__name__, node, uptime, unit))
-                    nodes_high_uptime.append(node + ': ' + uptime + ' ' + unit)
+## Headless browsers shared by the Expressway GUI alarm cleanup, started on first use and closed after the run.
+browser_pool_size = 4
 
-            except Exception as e:
-                logging.debug('## {} - SSHConnect("{}").get_uptime() -- EXCEPTION -- {}'.format(__name__, node, e))
-                nodes_high_uptime.append(node + ': An exception occurred. Check node manually')
+## Nodes that failed the last runs in a row, only tried again once their SSH port answers a TCP probe.
+## The polls keep their own, so a few failed polls do not open a node's circuit for the daily run.
+breaker = CircuitBreaker('circuit_breaker.json')
 
+poll_breaker = CircuitBreaker('circuit_breaker_polls.json')
 
-            try:
-                stopped_srvs = conn.get_stopped_srvs()
-                logging.debug('## {} - SSHConnect("{}").get_stopped_srvs() -- {}'.format(__name__, node, stopped_srvs))
+## Every run is saved to the results database. With changes_only the email only lists new, resolved and still open
+## findings compared with the previous run.
+results_db = ResultsDB('results.db')
 
-                if len(stopped_srvs) >= 1:
-                    nodes_stpd_srvs.append(node + ': ' + str(stopped_srvs))
+changes_only = True
 
-            except Exception as e:
-                logging.debug('## {} - SSHConnect("{}").get_stopped_srvs() -- EXCEPTION -- {}'.format(__name__, node, e))
-                nodes_stpd_srvs.append(node + ': An exception occurred. Check node manually')
+## Every finding is appended to this journal as it is recorded, so a run that crashes still leaves its findings
+## behind. It is removed once the email is sent. The name holds the script and the process id, so runs of the
+## manual and the scheduled checks on the same day each keep their own.
+report_journal = 'uc_checks_scheduled_{}_{}.partial.txt'
 
+## Reports are sent from a background thread over a reused connection to the relay, and kept in the spool folder
+## until the relay accepts them.
+mailer = ReportMailer(smtp_server)
 
-            try:
-                certs = conn.get_certs()
-                logging.debug('## {} - SSHConnect("{}").get_certs() -- {}'.format(__name__, node, certs))
+## Checks polled on their own cadence between the daily reports, as name: (seconds between polls, check names).
+## Only changes since the previous poll of the same checks are emailed. Every check, the cert sweep included, still
+## runs in the daily report at start_time.
+cadences = {
+    'services': (5 * 60, {STOPPED_SERVICE}),
+    'status': (15 * 60, {HIGH_CPU, HIGH_MEMORY, HIGH_DISK}),
+}
 
-                for elem in certs:
-                    if int(elem[3]) <= 28:
-                        nodes_expiring_certs.append(node + ': ' + str(elem[0]) + ', ' + str(elem[2]))
+## Nodes polled at the same time by each cadence.
+poll_concurrency = 20
 
-            except Exception as e:
-                logging.debug('## {} - SSHConnect("{}").get_certs() -- EXCEPTION -- {}'.format(__name__, node, e))
-                nodes_expiring_certs.append(node + ': An exception occurred. Check node manually')
+## The findings of the last poll of each cadence, keyed by (node, check, item).
+polled = {}
 
+## Timings of each run, exported at the end of the run as json and for the Prometheus textfile collector.
+metrics_json = 'uc_checks_metrics.json'
 
-            if not role:
-                logging.debug('## {} - SSHConnect("{}").get_backup() -- NOT PUBLISHER -- SKIPPING'.format(__name__, node))
+metrics_prom = 'uc_checks.prom'
 
-            else:
-                try:
-                    backups = conn.get_backup()
-                    logging.debug('## {} - SSHConnect("{}").get_backup() -- {}'.format(__name__, node, backups))
 
-                    if 'ERROR' in backups[0]:
-                        nodes_failed_backup.append(node + ': Last successful backp = ' + str(backups[1]) + ', Days since last backup = ' + str(backups[2]))
+##############################################################################################
+# Functions
+##############################################################################################
 
-                except Exception as e:
-                    logging.debug('## {} - SSHConnect("{}").get_backup() -- EXCEPTION -- {}'.format(__name__, node, e))
-                    nodes_failed_backup.append(node + ': No DRF data available. Check node manually. Error = ' + str(e))
+def run_and_email():
 
+    """
+    Calls the run_checks() function and emails the results, rendered into the report as each node finishes.
 
-        except Exception as e:
-            logging.debug('## {} - SSHConnect("{}") -- EXCEPTION -- {}'.format(__name__, node, e))
-            nodes_not_responding.append(node + ': ' + str(e))
+    """
 
-        try:
-            conn.close_ssh()
-            logging.debug('## {} - SSHConnect("{}").close_ssh()'.format(__name__, node))
+    logging.info('## {} - run_and_email() -- STARTING CHECKS'.format(__name__))
 
-        except Exception as e:
-                logging.debug('## {} - SSHConnect("{}").close_ssh() -- EXCEPTION -- {}'.format(__name__, node, e))
+    deadline = time.monotonic() + run_budget
 
-        logging.info('## {} - _core_checks({}) -- UCM CHECKS COMPLETE'.format(__name__, node))
+    inventory = load_inventory()
 
+    today = date.today()
 
-    logging.debug('## {} - core_checks() -- ENTERING FUNC'.format(__name__))
+    collector = ResultCollector()
 
-    ## Create a list of server hostnames from the csv.
-    with open('infrastructure.csv') as f:
-        hostnames = [row['hostname'] for row in csv.DictReader(f) if 'cte' not in row['region'] and 'exp' not in row['device']]
+    report = StreamingReport(report_journal.format(today, os.getpid()))
+    collector.listeners.append(report.add)
 
-    ## Map each server in the hostnames[] list to the inner _core_checks() function and create a thread for it.
-    with concurrent.futures.ThreadPoolExecutor(max_workers=10) as ex:
-        results = [ex.map(_core_checks, hostnames)]
+    engine = CheckEngine(max_concurrency, cluster_concurrency, deadline, node_timeout, limiter, start_jitter)
 
-        for f in results:
+    metrics = Metrics(inventory.cluster_of)
+    metrics.listeners.append(limiter.observe)
 
-            return f
+    run_checks(inventory, collector, engine, pool, cert_cache, metrics, breaker, processes, browser_pool_size)
 
+    metrics.export_json(metrics_json)
+    metrics.export_prometheus(metrics_prom)
+    logging.info('## {} - run_and_email() -- METRICS EXPORTED -- {}'.format(__name__, limiter))
 
-##############################################################################################
+    run_id = results_db.save_run(collector)
 
-def exp_checks():
+    msg = EmailMessage()
+    if changes_only:
+        msg.set_content(render_changes(results_db.diff(run_id)))
+    else:
+        msg.set_content(report.render())
 
-    def _exp_checks(node):
+    msg['Subject'] = f'UC Morning Checks - {today}'
+    msg['From'] = f'{from_email}'
+    msg['To'] = f'{to_email}'
+    msg['Bcc'] = f'{cc_email_1}, {cc_email_2}'
+    #msg['To'] = f'{cc_email_1}'
 
-        with open('infrastructure.csv') as f:
-            for row in csv.DictReader(f):
-                if node == row['hostname']:
-                    username, password = row['username'], row['password']
+    mailer.send(msg)
+    logging.info('## {} - run_and_email() -- REPORT QUEUED -- {}'.format(__name__, mailer))
 
-        try:
-            expressway_alarm_cleanup(node, username, password)
+    report.close(remove=True)
+    logging.info('## {} - run_and_email() -- REPORT JOURNAL REMOVED'.format(__name__))
 
-        except Exception as e:
-            logging.debug('## {} - expressway_alarm_cleanup("{}") -- EXCEPTION -- {}'.format(__name__, node, e))
+    logging.info('## {} - run_and_email() -- ALL CHECKS COMPLETE'.format(__name__))
 
-        try:
-            conn = SSHConnectExp(node, username, password)
-            logging.debug('## {} - SSHConnectExp("{}")'.format(__name__, node))
 
-            conn.init_connect()
-            logging.debug('## {} - SSHConnectExp("{}").init_connect()'.format(__name__, node))
+def load_inventory():
 
-            try:
-                if len(conn.run_cmd('xstatus alarm')) > 5:
-                    exp_alarm_resp = node, conn.run_cmd('xstatus alarm')
-                    exp_alarms.append(exp_alarm_resp)
-                logging.debug('## {} - SSHConnectExp("{}").run_cmd()'.format(__name__, node))
+    """
+    Returns the inventory, loading it on the first call and reloading it if the csv has changed since.
 
-            except Exception as e:
-                logging.debug('## {} - SSHConnectExp("{}").run_cmd() -- EXCEPTION -- {}'.format(__name__, node, e))
+    """
 
-        except Exception as e:
-            logging.debug('## {} - SSHConnect("{}") -- EXCEPTION -- {}'.format(__name__, node, e))
-            nodes_not_responding.append(node + ': ' + str(e))
+    global inventory
 
-        try:
-            conn.close_ssh()
-            logging.debug('## {} - SSHConnectExp("{}").close_ssh()'.format(__name__, node))
+    with inventory_lock:
+        if inventory is None:
+            inventory = Inventory('infrastructure.csv')
+        else:
+            inventory.reload()
 
-        except Exception as e:
-                logging.debug('## {} - SSHConnectExp("{}").close_ssh() -- EXCEPTION -- {}'.format(__name__, node, e))
+        return inventory
 
-        logging.info('## {} - _core_checks({}) -- EXPRESSWAY CHECKS COMPLETE'.format(__name__, node))
 
+def poll_and_email(name, interval, checks):
 
-    logging.debug('## {} - exp_checks() -- ENTERING FUNC'.format(__name__))
+    """
+    Runs some of the UCM checks on every UCM node and emails what changed since their previous poll.
+    The first poll only records the findings, as the daily report already lists them.
 
-    with open('infrastructure.csv') as f:
-        hostnames = [row['hostname'] for row in csv.DictReader(f) if 'exp' in row['device']]
+        : param name : The name of the cadence.
+        : param interval : Seconds between polls, also the time a poll may take.
+        : param checks : The names of the checks to run.
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=10) as ex:
-        results = [ex.map(_exp_checks, hostnames)]
+    """
 
-        for f in results:
+    logging.info('## {} - poll_and_email({}) -- STARTING POLL'.format(__name__, name))
 
-            return f
+    inventory = load_inventory()
+    collector = ResultCollector()
 
+    engine = CheckEngine(poll_concurrency, cluster_concurrency, time.monotonic() + interval, interval)
+    core_checks(inventory, collector, engine, pool, cert_cache, breaker=poll_breaker, checks=checks)
+    collector.close()
+    poll_breaker.save()
 
-##############################################################################################
+    current = {(elem.node, elem.check, elem.item): elem for elem in collector}
+    previous = polled.get(name)
 
-def run_and_email():
+    if previous is None:
+        polled[name] = current
+        logging.info('## {} - poll_and_email({}) -- FIRST POLL, {} FINDINGS'.format(__name__, name, len(current)))
+        return
 
-    """
-    Calls the core_checks() function, writes the results to a log file and to an email.
+    ## The nodes that could not be checked keep their previous findings, unverified, instead of resolving them.
+    unchecked = {elem.node for elem in collector if elem.check in (NOT_RESPONDING, TIMED_OUT)}
+    carried = {key: elem for key, elem in previous.items()
+               if key[0] in unchecked and key[1] not in (NOT_RESPONDING, TIMED_OUT) and key not in current}
 
-    """
-
-    logging.info('## {} - run_and_email() -- STARTING CHECKS'.format(__name__))
+    polled[name] = {**current, **carried}
 
-    core_checks()
+    changes = {
+        'new': [current[key] for key in current.keys() - previous.keys()],
+        'resolved': [previous[key] for key in previous.keys() - current.keys() - carried.keys()],
+        'open': [current[key] for key in current.keys() & previous.keys()],
+        'unverified': list(carried.values()),
+    }
 
-    exp_checks()
+    logging.info('## {} - poll_and_email({}) -- {} NEW, {} RESOLVED'.format(__name__, name, len(changes['new']), len(changes['resolved'])))
 
-    today = date.today()
+    if not changes['new'] and not changes['resolved']:
+        return
 
-    results_file = f'uc_checks_{today}.txt'
-
-    with open(results_file, 'a') as f:
-
-        f.write('NODES NOT RESPONDING\n')
-        f.write('='*len('NODES NOT RESPONDING'))
-        f.write('\n')
-        for elem in sorted(nodes_not_responding): f.write(str(elem) + '\n')
-        f.write('\n\n')
-
-        f.write('UCM NODES WITH STOPPED SERVICES\n')
-        f.write('='*len('UCM NODES WITH STOPPED SERVICES'))
-        f.write('\n')
-        for elem in sorted(nodes_stpd_srvs): f.write(str(elem) + '\n')
-        f.write('\n\n')
-
-        f.write('UCM NODES WITH EXPIRING CERTS\n')
-        f.write('='*len('UCM NODES WITH EXPIRING CERTS'))
-        f.write('\n')
-        for elem in sorted(nodes_expiring_certs): f.write(str(elem) + '\n')
-        f.write('\n\n')
-
-        f.write('UCM NODES WITH FAILED BACKUPS\n')
-        f.write('='*len('UCM NODES WITH FAILED BACKUPS'))
-        f.write('\n')
-        for elem in sorted(nodes_failed_backup): f.write(str(elem) + '\n')
-        f.write('\n\n')
-
-        f.write('UCM NODES WITH UPTIME >180 DAYS\n')
-        f.write('='*len('UCM NODES WITH UPTIME >180 DAYS'))
-        f.write('\n')
-        for elem in sorted(nodes_high_uptime): f.write(str(elem) + '\n')
-        f.write('\n\n')
-
-        f.write('EXPRESSWAY NODES WITH ALARMS\n')
-        f.write('='*len('EXPRESSWAY NODES WITH ALARMS'))
-        f.write('\n')
-        for elem in sorted(exp_alarms):
-            f.write(elem[0] + ':\n')
-            f.write('*'*len(elem[0]) + '\n')
-            for elem2 in elem[1][2:-5]:
-                f.write(elem2 + '\n')
-            f.write('\n\n')
-
-
-    with open(results_file) as rf:
-        msg = EmailMessage()
-        msg.set_content(rf.read())
+    msg = EmailMessage()
+    msg.set_content(render_changes(changes))
 
-    msg['Subject'] = f'UC Morning Checks - {today}'
+    msg['Subject'] = f'UC Checks - {name} changed - {date.today()}'
     msg['From'] = f'{from_email}'
     msg['To'] = f'{to_email}'
     msg['Bcc'] = f'{cc_email_1}, {cc_email_2}'
-    #msg['To'] = f'{cc_email_1}'
 
-    s = smtplib.SMTP(f'{smtp_server}')
-    s.send_message(msg)
-    s.quit()
-
-    del nodes_not_responding[:]
-    del nodes_high_uptime[:]
-    del nodes_stpd_srvs[:]
-    del nodes_expiring_certs[:]
-    del nodes_failed_backup[:]
-    del exp_alarms[:]
-    logging.info('## {} - run_and_email() -- RESULTS LISTS CLEARED'.format(__name__))
-
-    os.remove(results_file)
-    logging.info('## {} - run_and_email() -- RESULTS FILE REMOVED'.format(__name__))
-
-    logging.info('## {} - run_and_email() -- ALL CHECKS COMPLETE'.format(__name__))
+    mailer.send(msg)
 
 
 ##############################################################################################
@@ -320,17 +254,23 @@ def run_and_email():
 def scheduler(start_time):
 
     """
-    Small function to schedule when the script will be run.
+    Runs the daily report at start_time and polls the checks of each cadence in between, each on its own timer.
+    A slow run only delays the next run of its own job, and a job still running when it is due again is skipped.
 
-        : param start_time: The time of day the script will be run.
+        : param start_time: The time of day the daily report is run.
 
     """
 
-    schedule.every().day.at(start_time).do(run_and_email)
+    jobs = JobScheduler()
+    jobs.add('report', run_and_email, at=start_time)
+
+    for name, (interval, checks) in cadences.items():
+        jobs.add(name, partial(poll_and_email, name, interval, checks), interval)
+
+    pool.start_maintenance()
+    mailer.start()
 
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
+    jobs.run_forever()
 
 
 ##############################################################################################
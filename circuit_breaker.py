@@ -0,0 +1,201 @@
+##############################################################################################
+# modules
+##############################################################################################
+
+import paramiko
+import json
+import os
+import random
+import socket
+import threading
+import time
+import logging
+
+
+##############################################################################################
+# Global Variables & Config
+##############################################################################################
+
+## Extra connection attempts after a transient error, and the backoff between them in seconds.
+retries = 2
+
+backoff_base = 2
+
+backoff_max = 20
+
+## Consecutive failed connections after which a node's circuit opens, and the seconds its TCP probe may take.
+failure_threshold = 2
+
+probe_timeout = 3
+
+
+##############################################################################################
+# Classes
+##############################################################################################
+
+class CircuitOpen(Exception):
+
+    """
+    Raised instead of connecting to a node whose circuit is open and whose TCP probe failed.
+
+    """
+
+
+class CircuitBreaker:
+
+    """
+    Retries the connection to a node on transient errors, and remembers across runs the nodes that keep failing.
+    Once the connection to a node has failed failure_threshold times in a row, retries included as one, its
+    circuit opens and later connections first try a cheap TCP connect to its SSH port. Only if that answers is
+    the full SSH handshake attempted, and one success closes the circuit again.
+    A run connects to each node once, so failures count runs as long as every schedule that connects on its own
+    cadence, i.e. the daily checks and the polls, has a breaker of its own.
+    Timeouts are not retried, as they have already cost the full connect timeout.
+
+        : param path : Path to the json file the node states are stored in.
+
+    """
+
+    def __init__(self, path='circuit_breaker.json'):
+        self.path = path
+        self.nodes = {}
+        self.dirty = False
+        self._lock = threading.Lock()
+
+        if os.path.exists(self.path):
+            try:
+                with open(self.path) as f:
+                    self.nodes = json.load(f)
+            except Exception as e:
+                logging.debug('## {} - {}.__init__() -- EXCEPTION -- {}'.format(__name__, self, e))
+
+    def __repr__(self):
+        return f'CircuitBreaker("{self.path}")'
+
+    def __str__(self):
+        return f'CircuitBreaker("{self.path}")'
+
+
+    def is_open(self, node):
+        return self.nodes.get(node, {}).get('failures', 0) >= failure_threshold
+
+
+    @staticmethod
+    def is_transient(e):
+
+        """
+        Returns True for the errors worth another attempt straight away, i.e. a reset connection or an SSH banner
+        that did not arrive, and False for timeouts, failed DNS lookups and failed logins.
+
+        """
+
+        if isinstance(e, (paramiko.AuthenticationException, socket.timeout, socket.gaierror)):
+            return False
+
+        return isinstance(e, (paramiko.SSHException, ConnectionError, EOFError))
+
+
+    @staticmethod
+    def probe(address, port):
+
+        """
+        Returns None if a TCP connection to the address and port opens within probe_timeout, the error otherwise.
+
+        """
+
+        try:
+            socket.create_connection((address, port), timeout=probe_timeout).close()
+            return None
+        except OSError as e:
+            return e
+
+
+    def call(self, node, address, port, connect):
+
+        """
+        Calls connect() with retries and returns its result, recording the outcome against the node.
+
+            : param node : The hostname or IP of the server.
+            : param address : The address the node is reached on.
+            : param port : The SSH port of the node.
+            : param connect : Function opening the session.
+
+        """
+
+        if self.is_open(node):
+            error = self.probe(address, port)
+            if error is not None:
+                state = self.nodes[node]
+                logging.debug('## {} - {}.call({}) -- OPEN, PROBE FAILED -- {}'.format(__name__, self, node, error))
+                raise CircuitOpen(f'Not responding since {state["since"]}, port {port} unreachable: {error}')
+
+            logging.debug('## {} - {}.call({}) -- OPEN, PROBE ANSWERED, TRYING'.format(__name__, self, node))
+
+        for attempt in range(retries + 1):
+            try:
+                result = connect()
+
+            except Exception as e:
+                if attempt < retries and self.is_transient(e):
+                    delay = min(backoff_max, backoff_base * 2 ** attempt) * random.uniform(0.5, 1)
+                    logging.debug('## {} - {}.call({}) -- ATTEMPT {} FAILED, RETRY IN {:.1f}s -- {}'.format(__name__, self, node, attempt + 1, delay, e))
+                    time.sleep(delay)
+                    continue
+
+                self.record_failure(node, e)
+                raise
+
+            self.record_success(node)
+            return result
+
+
+    def record_success(self, node):
+        with self._lock:
+            if self.nodes.pop(node, None) is not None:
+                self.dirty = True
+
+
+    def record_failure(self, node, e):
+        with self._lock:
+            state = self.nodes.setdefault(node, {'failures': 0, 'since': time.strftime('%Y-%m-%d %H:%M')})
+            state['failures'] += 1
+            state['error'] = str(e)
+            self.dirty = True
+
+
+    def merge(self, nodes, states):
+
+        """
+        Replaces the states of the given nodes with those of another breaker, i.e. of a worker process that
+        checked those nodes.
+
+            : param nodes : The nodes the other breaker is authoritative for.
+            : param states : The states of the failing nodes among them.
+
+        """
+
+        with self._lock:
+            for node in nodes:
+                self.nodes.pop(node, None)
+            self.nodes.update(states)
+            self.dirty = True
+
+
+    def save(self):
+
+        """
+        Writes the node states back to disk if they have changed, replacing the file atomically.
+
+        """
+
+        with self._lock:
+            if not self.dirty:
+                return
+
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self.nodes, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+
+        logging.debug('## {} - {}.save() -- {} FAILING NODES'.format(__name__, self, len(self.nodes)))
@@ -0,0 +1,213 @@
+##############################################################################################
+# modules
+##############################################################################################
+
+import codecs
+import re
+import select
+import time
+import logging
+
+
+##############################################################################################
+# Global Variables & Config
+##############################################################################################
+
+## Wall-clock budget for a single command, from send to the returned prompt.
+cmd_timeout = 120
+
+## Upper limit on the bytes read for a single command before giving up on it.
+max_cmd_bytes = 8 * 1024 * 1024
+
+## ANSI escape sequences (CSI, charset selection and keypad modes) sent by the CLI.
+ansi_escape = re.compile(r'\x1b(?:\[[0-?]*[ -/]*[@-~]|[()][A-Za-z0-9]|[=>])')
+
+## The prompt shown by the CLI pager when pagination has not been turned off.
+pager_prompt = re.compile(r'\s*Press <enter> for 1 line, <space> for one page, or <q> to quit\s*')
+
+
+##############################################################################################
+# Classes
+##############################################################################################
+
+class PromptTimeout(Exception):
+
+    """
+    Raised when the CLI prompt is not returned before the command deadline.
+
+    """
+
+
+class OutputTooLarge(Exception):
+
+    """
+    Raised when a command returns more than max_cmd_bytes without a prompt.
+
+    """
+
+
+class LineDecoder:
+
+    """
+    Turns the raw chunks received from the channel into decoded lines as they arrive.
+    Multi-byte characters and escape sequences split across chunks are kept until they are complete,
+    '\r\n' ends a line, a lone '\r' overwrites the line like a terminal would, and ANSI escapes,
+    backspaces and pager prompts are dropped.
+
+        : param encoding : The encoding of the CLI output.
+
+    """
+
+    def __init__(self, encoding='utf-8'):
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+        self._partial = ''
+
+    def __repr__(self):
+        return 'LineDecoder()'
+
+    def __str__(self):
+        return 'LineDecoder()'
+
+
+    def feed(self, data):
+
+        """
+        Decodes a chunk and returns the list of lines it completed.
+
+            : param data : The bytes received from the channel.
+
+        """
+
+        text = self._partial + self._decoder.decode(data)
+        lines = text.split('\n')
+        self._partial = lines.pop()
+
+        return [self._clean(elem) for elem in lines]
+
+
+    def flush(self):
+
+        """
+        Returns the last, unterminated, line i.e. the one holding the prompt, and resets the decoder.
+
+        """
+
+        line = self._clean(self._partial + self._decoder.decode(b'', final=True))
+        self._partial = ''
+        self._decoder.reset()
+
+        return [line]
+
+
+    @staticmethod
+    def _clean(line):
+        line = ansi_escape.sub('', line.rstrip('\r')).replace('\x08', '')
+        line = line.rsplit('\r', 1)[-1]
+        return pager_prompt.sub('', line)
+
+
+class PromptReader:
+
+    """
+    Reads the output of one command at a time from a paramiko channel, up to and including the next prompt.
+    The channel is polled with select() against a per-command deadline, only the newly received bytes are
+    searched for the prompt, and the output is handed out as decoded lines while it arrives. Bytes received
+    after a prompt are kept for the next command, so pipelined commands can be read back one by one.
+
+        : param channel : The paramiko.Channel returned by invoke_shell().
+        : param prompt : The CLI prompt that marks the end of the output, i.e. 'admin:'.
+        : param timeout : Seconds allowed for each command. Defaults to cmd_timeout.
+        : param max_bytes : Maximum bytes read for each command. Defaults to max_cmd_bytes.
+
+    """
+
+    def __init__(self, channel, prompt, timeout=None, max_bytes=None):
+        self.channel = channel
+        self.prompt = prompt.encode()
+        self.timeout = timeout if timeout is not None else cmd_timeout
+        self.max_bytes = max_bytes if max_bytes is not None else max_cmd_bytes
+        self.pending = b''
+
+    def __repr__(self):
+        return f'PromptReader("{self.prompt.decode()}")'
+
+    def __str__(self):
+        return f'PromptReader("{self.prompt.decode()}")'
+
+
+    def iter_lines(self, timeout=None):
+
+        """
+        Generator yielding the decoded lines of the next output, the last one being the prompt line.
+        It must be run to the end, or the rest of the output will be read as part of the next command.
+
+            : param timeout : Seconds allowed for this output. Defaults to the reader's timeout.
+
+        """
+
+        if timeout is None: timeout = self.timeout
+
+        decoder = LineDecoder()
+        keep = len(self.prompt) - 1
+        tail = b''
+        received = 0
+        deadline = time.monotonic() + timeout
+        chunk, self.pending = self.pending, b''
+
+        while True:
+            if chunk:
+                ## The tail of the previous chunk is searched with this one to catch a prompt split across both.
+                window = tail + chunk
+                found = window.find(self.prompt)
+
+                if found != -1:
+                    end = found + len(self.prompt) - len(tail)
+                    self.pending = chunk[end:]
+                    logging.debug('## {} - {}.iter_lines() -- PROMPT FOUND -- {} bytes'.format(__name__, self, received + end))
+                    yield from decoder.feed(chunk[:end])
+                    yield from decoder.flush()
+                    return
+
+                received += len(chunk)
+                if received > self.max_bytes:
+                    raise OutputTooLarge('More than {} bytes without a {} prompt'.format(self.max_bytes, self.prompt.decode()))
+
+                yield from decoder.feed(chunk)
+                tail = window[-keep:] if keep else b''
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise PromptTimeout('No {} prompt after {}s ({} bytes read)'.format(self.prompt.decode(), timeout, received))
+
+            readable, _, _ = select.select([self.channel], [], [], remaining)
+            if not readable:
+                chunk = b''
+                continue
+
+            chunk = self.channel.recv(65535)
+            if not chunk:
+                raise EOFError('Channel closed before {} prompt ({} bytes read)'.format(self.prompt.decode(), received))
+
+
+    def read_lines(self, timeout=None):
+
+        """
+        Returns the decoded lines of the next output as a list.
+
+            : param timeout : Seconds allowed for this output. Defaults to the reader's timeout.
+
+        """
+
+        return list(self.iter_lines(timeout))
+
+
+    def discard(self):
+
+        """
+        Drops any bytes left over from an earlier command, both kept by the reader and waiting on the channel.
+
+        """
+
+        self.pending = b''
+        while self.channel.recv_ready():
+            self.channel.recv(65535)
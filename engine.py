@@ -0,0 +1,305 @@
+##############################################################################################
+# modules
+##############################################################################################
+
+import asyncio
+import collections
+import concurrent.futures
+import random
+import threading
+import time
+import logging
+
+
+##############################################################################################
+# Global Variables & Config
+##############################################################################################
+
+## Default number of nodes checked at the same time across the whole run.
+max_concurrency = 200
+
+## Default number of nodes checked at the same time within one cluster.
+cluster_concurrency = 20
+
+## Default bounds of the adaptive limit, it starts at initial_concurrency and moves between the two.
+initial_concurrency = 10
+
+min_concurrency = 2
+
+## Seconds above which a step counts as slow and backs the adaptive limit off, by span name.
+latency_targets = {'connect': 3, 'auth': 15, 'cmd': 30}
+
+## Seconds after a back off during which further slow or failed steps do not back off again.
+backoff_cooldown = 2
+
+
+##############################################################################################
+# Classes
+##############################################################################################
+
+class AdaptiveLimiter:
+
+    """
+    Concurrency limit that adapts to how the network and the nodes cope, additive increase and multiplicative
+    decrease. Every healthy connect, auth or command step raises the limit by 1/limit, so by about one per
+    round of nodes, and a failed or slow step halves it, at most once per backoff_cooldown.
+    observe() is called from the worker threads, i.e. as a Metrics() listener, while acquire() and release()
+    run on the engine's event loop.
+
+        : param initial : The limit the run starts with.
+        : param minimum : The lowest the limit goes.
+        : param maximum : The highest the limit goes.
+        : param targets : Dict of the seconds above which a step counts as slow, by span name.
+
+    """
+
+    def __init__(self, initial=initial_concurrency, minimum=min_concurrency, maximum=max_concurrency, targets=None):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(max(minimum, min(initial, maximum)))
+        self.targets = targets or latency_targets
+        self.in_flight = 0
+        self.increases = 0
+        self.decreases = 0
+        self._last_decrease = 0.0
+        self._waiters = collections.deque()
+        self._loop = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f'AdaptiveLimiter({self.limit:.1f}, {self.in_flight} in flight)'
+
+    def __str__(self):
+        return f'AdaptiveLimiter({self.limit:.1f}, {self.in_flight} in flight)'
+
+
+    def observe(self, node, name, seconds, ok=True):
+
+        """
+        Adjusts the limit from a timed step, with the signature of a Metrics() listener. Steps without a
+        latency target, i.e. the checks themselves, are ignored.
+
+        """
+
+        if name not in self.targets:
+            return
+
+        with self._lock:
+            if ok and seconds <= self.targets[name]:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+                self.increases += 1
+
+            elif time.monotonic() - self._last_decrease >= backoff_cooldown:
+                self.limit = max(self.minimum, self.limit / 2)
+                self.decreases += 1
+                self._last_decrease = time.monotonic()
+                logging.info('## {} - {}.observe({}) -- BACKING OFF, {} {} IN {:.1f}s'.format(__name__, self, node, name, 'OK' if ok else 'FAILED', seconds))
+
+            else:
+                return
+
+        ## A thread of a timed out node can still report after the run's loop has closed, it then has no one to wake.
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+
+        try:
+            loop.call_soon_threadsafe(self._wake)
+        except RuntimeError as e:
+            logging.debug('## {} - {}.observe({}) -- LOOP CLOSED -- {}'.format(__name__, self, node, e))
+
+
+    def detach(self):
+
+        """
+        Forgets the event loop of a finished run, so the limiter can be kept for the next one.
+
+        """
+
+        self._loop = None
+        self._waiters.clear()
+        self.in_flight = 0
+
+
+    async def acquire(self):
+        self._loop = asyncio.get_running_loop()
+
+        while self.in_flight >= int(self.limit):
+            waiter = self._loop.create_future()
+            self._waiters.append(waiter)
+            await waiter
+
+        self.in_flight += 1
+
+
+    def release(self):
+        self.in_flight -= 1
+        self._wake()
+
+
+    def _wake(self):
+        free = int(self.limit) - self.in_flight
+
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+
+class NodeTimeout(Exception):
+
+    """
+    Returned for a node whose checks did not finish within the node timeout or before the run deadline.
+
+    """
+
+
+class CheckEngine:
+
+    """
+    Runs a blocking per-node check function for many nodes at once on an asyncio event loop.
+    The paramiko sessions stay blocking and run in a thread pool sized to the global limit, while asyncio
+    enforces the global and per-cluster limits and hands back results as each node completes.
+
+        : param max_concurrency : The maximum number of nodes checked at the same time.
+        : param cluster_concurrency : The maximum number of nodes of one cluster checked at the same time.
+        : param deadline : Optional time.monotonic() value by which the whole run must be finished.
+        : param node_timeout : Optional seconds allowed for the checks of a single node.
+        : param limiter : Optional AdaptiveLimiter() that replaces the fixed global limit. max_concurrency still
+                          sizes the thread pool.
+        : param start_jitter : Seconds over which the first sessions of the run are spread at random, so they do not
+                               all hit the jump host and the SSH daemons at the same moment.
+
+    """
+
+    def __init__(self, max_concurrency=max_concurrency, cluster_concurrency=cluster_concurrency, deadline=None, node_timeout=None,
+                 limiter=None, start_jitter=0):
+        self.max_concurrency = max_concurrency
+        self.cluster_concurrency = cluster_concurrency
+        self.deadline = deadline
+        self.node_timeout = node_timeout
+        self.limiter = limiter
+        self.start_jitter = start_jitter
+
+    def __repr__(self):
+        return f'CheckEngine({self.max_concurrency}, {self.cluster_concurrency})'
+
+    def __str__(self):
+        return f'CheckEngine({self.max_concurrency}, {self.cluster_concurrency})'
+
+
+    def time_left(self):
+
+        """
+        Returns the seconds a node may still take, the lower of the node timeout and the time to the run
+        deadline, or None when neither is set.
+
+        """
+
+        limits = []
+        if self.node_timeout is not None: limits.append(self.node_timeout)
+        if self.deadline is not None: limits.append(self.deadline - time.monotonic())
+
+        return min(limits) if limits else None
+
+
+    async def as_completed(self, func, nodes, cluster_of=None):
+
+        """
+        Async generator that calls func(node) for every node and yields (node, result, exception) tuples
+        in the order the nodes finish.
+        A node that runs past its time gets a NodeTimeout() exception and is not waited for, its thread is left
+        to finish on its own. Nodes still queued when the deadline passes get a NodeTimeout() straight away.
+
+            : param func : Blocking function taking a single node argument.
+            : param nodes : Iterable of nodes to check.
+            : param cluster_of : Optional function returning the cluster name of a node.
+
+        """
+
+        loop = asyncio.get_running_loop()
+        global_limit = asyncio.Semaphore(self.max_concurrency)
+        cluster_limits = {}
+        started = time.monotonic()
+
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_concurrency)
+
+        async def _run_node(node):
+            cluster = cluster_of(node) if cluster_of else None
+            if cluster not in cluster_limits:
+                cluster_limits[cluster] = asyncio.Semaphore(self.cluster_concurrency)
+
+            async with cluster_limits[cluster]:
+                if self.limiter is None:
+                    async with global_limit:
+                        return await _start_node(node, cluster)
+
+                await self.limiter.acquire()
+                try:
+                    return await _start_node(node, cluster)
+                finally:
+                    self.limiter.release()
+
+        async def _start_node(node, cluster):
+            logging.debug('## {} - {}._run_node({}) -- CLUSTER == {}'.format(__name__, self, node, cluster))
+
+            ## Nodes that get a slot within the jitter window start at a random point of it.
+            delay = random.uniform(0, self.start_jitter) - (time.monotonic() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            timeout = self.time_left()
+            if timeout is not None and timeout <= 0:
+                return node, None, NodeTimeout('Run deadline reached before the checks started')
+
+            try:
+                return node, await asyncio.wait_for(loop.run_in_executor(executor, func, node), timeout), None
+            except asyncio.TimeoutError:
+                logging.info('## {} - {}._run_node({}) -- TIMED OUT AFTER {:.0f}s'.format(__name__, self, node, timeout))
+                return node, None, NodeTimeout('Checks did not finish within {:.0f}s'.format(timeout))
+            except Exception as e:
+                logging.debug('## {} - {}._run_node({}) -- EXCEPTION -- {}'.format(__name__, self, node, e))
+                return node, None, e
+
+        ## The tasks are created in the order of the nodes, so they queue on the limits in that order. as_completed()
+        ## alone would wrap the coroutines in a set and start them in an arbitrary order.
+        tasks = [asyncio.ensure_future(_run_node(node)) for node in nodes]
+
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+            ## Stragglers past the deadline are not waited for.
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+    def run(self, func, nodes, cluster_of=None, on_result=None):
+
+        """
+        Blocking wrapper around as_completed() for the synchronous callers. Returns the list of
+        (node, result, exception) tuples in completion order.
+
+            : param func : Blocking function taking a single node argument.
+            : param nodes : Iterable of nodes to check.
+            : param cluster_of : Optional function returning the cluster name of a node.
+            : param on_result : Optional callback called with each tuple as soon as its node completes.
+
+        """
+
+        async def _run():
+            results = []
+            async for result in self.as_completed(func, nodes, cluster_of):
+                if on_result: on_result(*result)
+                results.append(result)
+            return results
+
+        logging.debug('## {} - {}.run() -- ENTER'.format(__name__, self))
+
+        try:
+            return asyncio.run(_run())
+        finally:
+            if self.limiter is not None: self.limiter.detach()
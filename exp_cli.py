@@ -3,35 +3,58 @@
 ##############################################################################################
 
 import paramiko
+import socket
+import time
 import datetime
 from datetime import datetime
 import re
 import logging
+from cli_reader import PromptReader
+from metrics import null_metrics, timed
 
 
 ##############################################################################################
-# Functions
+# Global Variables & Config
+##############################################################################################
+
+alarm_start = re.compile(r'^\*s Alarm \d+:')
+
+alarm_field = re.compile(r'^\s+(\w+):\s*"?(.*?)"?\s*$')
+
+
+##############################################################################################
+# Classes
 ##############################################################################################
 
-def parse_resp_exp(func):
+class Alarm:
 
     """
-    Decorator function to parse th results of each command that is run in the server CLI.
+    A single alarm of 'xstatus alarm'. Peer is 'This system' for the alarms raised by the node itself, and the
+    address of the cluster peer otherwise.
 
     """
 
-    def inner(*args,**kwargs):
+    __slots__ = ('id', 'title', 'level', 'state', 'peer', 'description', 'uuid')
 
-        resp = str(func(*args,**kwargs)).replace("'b'", "").split('\\r\\n')
+    def __init__(self, id='', title='', level='', state='', peer='', description='', uuid=''):
+        self.id = id
+        self.title = title
+        self.level = level
+        self.state = state
+        self.peer = peer
+        self.description = description
+        self.uuid = uuid
 
-        return resp
+    def __repr__(self):
+        return f'Alarm("{self.id}", "{self.title}", "{self.peer}")'
 
-    return inner
+    def __str__(self):
+        return f'Alarm("{self.id}", "{self.title}", "{self.peer}")'
 
 
-##############################################################################################
-# Classes
-##############################################################################################
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
 
 class SSHConnectExp:
 
@@ -41,17 +64,37 @@ class SSHConnectExp:
         : param node : The hostname or IP of the UCM, IM&P or CUC server.
         : param username : username of the given server.
         : param password : password of the given server.
+        : param port : SSH port of the given server.
+        : param address : Optional address to connect to when the node name is not resolvable.
+        : param metrics : Optional Metrics() the connect, auth, command and check timings are recorded to.
 
     """
 
-    def __init__(self, node, username, password):
+    def __init__(self, node, username, password, port=22, address=None, metrics=None):
         self.node = node
         self.username = username
         self.password = password
+        self.port = port
+        self.address = address or node
+        self.metrics = metrics or null_metrics
         self.client = paramiko.SSHClient()
         self.client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        self.client.connect(hostname=self.node,username=self.username,password=self.password,timeout=60)
-        self.conn = self.client.invoke_shell()
+
+        ## The TCP connect is timed on its own, the key exchange and authentication then run over its socket.
+        with self.metrics.span(self.node, 'connect'):
+            sock = socket.create_connection((self.address, self.port), timeout=60)
+
+        try:
+            with self.metrics.span(self.node, 'auth'):
+                self.client.connect(hostname=self.address,port=self.port,username=self.username,password=self.password,timeout=60,sock=sock)
+                self.conn = self.client.invoke_shell()
+
+        except Exception:
+            self.client.close()
+            sock.close()
+            raise
+
+        self.reader = PromptReader(self.conn, 'OK')
 
 
     def __repr__(self):
@@ -61,6 +104,7 @@ class SSHConnectExp:
         return f'SSHConnect("{self.node}")'
 
 
+    @timed('init_connect')
     def init_connect(self):
 
         """
@@ -71,71 +115,63 @@ class SSHConnectExp:
         logging.debug('## {} - {}.init_connect() -- ENTER'.format(__name__, self))
 
         try:
-            def _init_connect(buffer=''):
-                prompt = False
-                output = self.conn.recv(65535)
-                buffer += str(output)
-                recursion_depth = 1
-                max_recursion_depth = 10
+            self.reader.read_lines()
+            logging.debug('## {} - {}.init_connect() -- PROMPT == {}'.format(__name__, self, True))
+            return True
 
-                if 'OK' not in buffer and max_recursion_depth <= 10:
-                    logging.debug('## {} - {}.init_connect() -- PROMPT == {}'.format(__name__, self, prompt))
-                    recursion_depth += 1
-                    return _init_connect(buffer)
+        except Exception as e:
+            logging.debug('## {} - {}.init_connect() -- EXCEPTION == {}'.format(__name__, self, e))
+            return e
 
-                elif 'OK' not in buffer and max_recursion_depth > 10:
-                    raise RecursionError('Too many loops.')
 
-                elif 'OK' in buffer:
-                    prompt = True
-                    logging.debug('## {} - {}.init_connect() -- PROMPT == {}'.format(__name__, self, prompt))
-                    return prompt
+    def _run(self, cmd):
+        start = time.monotonic()
+        ok = False
 
-            return _init_connect()
+        ## Recorded as failed when the prompt is not returned, so the limiter backs off on command timeouts.
+        try:
+            self.conn.send(cmd + '\n')
+            resp = self.reader.read_lines()
+            ok = True
+        finally:
+            self.metrics.observe_command(self.node, cmd, time.monotonic() - start, ok)
 
-        except Exception as e:
-            logging.debug('## {} - {}.init_connect() -- EXCEPTION == {}'.format(__name__, self, e))
-            return e
+        return resp
 
 
-    @parse_resp_exp
     def run_cmd(self, cmd):
 
         """
         Runs a CLI command on the target server and confirms the return of the 'OK' prompt before completing.
-        Decorated by the parse_resp() function to properly parse the return.
+        Returns the decoded output as a list of lines.
 
         """
 
         logging.debug('## {} - {}.run_cmd() -- ENTER'.format(__name__, self))
 
         try:
-            self.conn.send(cmd + '\n')
+            resp = self._run(cmd)
+            logging.debug('## {} - {}.run_cmd("{}") -- PROMPT == {}'.format(__name__, self, cmd, True))
+            return resp
 
-            def _run_cmd(buffer=''):
-                prompt = False
-                output = self.conn.recv(65535)
-                buffer += str(output)
-                recursion_depth = 1
-                max_recursion_depth = 10
+        except Exception as e:
+            logging.debug('## {} - {}.run_cmd("{}") -- EXCEPTION == {}'.format(__name__, self, cmd, e))
+            return [str(e)]
 
-                if 'OK' not in buffer and max_recursion_depth <= 10:
-                    logging.debug('## {} - {}.run_cmd("{}") -- PROMPT == {}'.format(__name__, self, cmd, prompt))
-                    return _run_cmd(buffer)
 
-                elif 'OK' not in buffer and max_recursion_depth > 10:
-                    raise RecursionError('Too many loops.')
+    @timed('get_alarms')
+    def get_alarms(self):
 
-                elif 'OK' in buffer:
-                    prompt = True
-                    logging.debug('## {} - {}.run_cmd("{}") -- PROMPT == {}'.format(__name__, self, cmd, prompt))
-                    return buffer
+        """
+        Runs 'xstatus alarm' once and returns the alarms as a list of Alarm() records.
+        Raises when the command fails, so a failed check is not mistaken for a node without alarms.
 
-            return _run_cmd()
+        """
 
-        except Exception as e:
-            logging.debug('## {} - {}.run_cmd("{}") -- EXCEPTION == {}'.format(__name__, self, cmd, e))
-            return e
+        alarms = parse_alarms(self._run('xstatus alarm'))
+        logging.debug('## {} - {}.get_alarms() -- ALARMS == {}'.format(__name__, self, len(alarms)))
+
+        return alarms
 
 
     def close_ssh(self):
@@ -149,6 +185,42 @@ class SSHConnectExp:
         logging.debug('## {} - {}.close_ssh()'.format(__name__, self))
 
 
+##############################################################################################
+# Functions
+##############################################################################################
+
+def parse_alarms(lines):
+
+    """
+    Parses the output lines of 'xstatus alarm' into Alarm() records.
+
+        : param lines : The output of the command as a list of lines.
+
+    """
+
+    alarms = []
+    fields = None
+
+    for line in lines:
+        if alarm_start.match(line):
+            fields = {}
+            alarms.append(fields)
+            continue
+
+        if fields is None:
+            continue
+
+        if line.startswith('*s/end'):
+            fields = None
+            continue
+
+        match = alarm_field.match(line)
+        if match:
+            fields[match.group(1).lower()] = match.group(2)
+
+    return [Alarm(**{name: elem.get(name, '') for name in Alarm.__slots__}) for elem in alarms]
+
+
 ##############################################################################################
 # Run
 ##############################################################################################
@@ -3,107 +3,288 @@
 ##############################################################################################
 
 from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
+import threading
 import logging
+from contextlib import contextmanager
 
 
 ##############################################################################################
-# Functions
+# Global Variables & Config
 ##############################################################################################
 
-def expressway_alarm_cleanup(node, username, password):
+license_alarms = [
+    'Room system license limit reached',
+    'Capacity warning',
+    'Call license limit reached'
+]
 
-    license_alarms = [
-        'Room system license limit reached',
-        'Capacity warning',
-        'Call license limit reached'
-    ]
+path_to_webdriver = 'D:\\NetOps Apps\\Scripts\\uc_checks\\WebDrivers\\chromedriver.exe'
 
-    path_to_webdriver = 'D:\\NetOps Apps\\Scripts\\uc_checks\\WebDrivers\\chromedriver.exe'
+## Number of headless Chrome instances kept open and shared by the Expressway nodes.
+browser_pool_size = 4
 
-    if '-expe-' in str(node) or '-EXPE-' in str(node):
-        node_url = f'https://{node}:7443/login'
-    else:
-        node_url = f'https://{node}/login'
+## Seconds to wait for a page element, and for a free browser of the pool.
+page_timeout = 15
 
+acquire_timeout = 300
 
-    # create a new Chrome session
-    options = webdriver.ChromeOptions()
-    options.add_argument('headless')
-    driver = webdriver.Chrome(executable_path=path_to_webdriver)
+## Reads the whole alarm table in one round trip, as a list of {index, title, state, peer} objects.
+read_alarms_js = '''
+return Array.from(document.querySelectorAll('#warninglist_tbody > tr')).map(function (row, index) {
+    var cells = row.querySelectorAll('td');
+    var text = function (i) { return cells[i] ? cells[i].innerText.trim() : ''; };
+    return {index: index, title: text(1), state: text(3), peer: text(5)};
+});
+'''
 
-    # Navigate to the application home page
-    driver.get(node_url)
+## Ticks the checkbox of each given row index, returns the number of rows selected.
+select_alarms_js = '''
+var rows = document.querySelectorAll('#warninglist_tbody > tr');
+var selected = 0;
+arguments[0].forEach(function (index) {
+    var box = rows[index] && rows[index].querySelector('td input[type=checkbox]');
+    if (box) {
+        if (!box.checked) { box.click(); }
+        selected += 1;
+    }
+});
+return selected;
+'''
 
-    try:
-        WebDriverWait(driver, 15).until(EC.presence_of_element_located((By.ID, 'save_button')))
-        logging.debug('## {} - {}.expressway_alarm_cleanup() -- GUI RESPONDING'.format(__name__, node))
-    except:
-        driver.quit()
+## Clears what the previous node left behind, so the next node starts from a clean browser.
+reset_js = 'window.localStorage && localStorage.clear(); window.sessionStorage && sessionStorage.clear();'
+
+acknowledge_button = '/html/body/div[2]/div/form/div[2]/input[1]'
+
+
+##############################################################################################
+# Classes
+##############################################################################################
+
+class BrowserPool:
+
+    """
+    Keeps up to size headless Chrome instances open and hands them out to the Expressway nodes one at a time.
+    Browsers are started on first use, and cookies and storage are cleared when a browser is given back so every
+    node gets a fresh session. A caller waiting for a browser is woken both when one is given back and when a
+    broken one is quit, as it can then start a replacement.
+
+        : param size : The maximum number of browsers open at the same time.
+        : param driver_path : Path of the chromedriver executable.
+
+    """
+
+    def __init__(self, size=browser_pool_size, driver_path=path_to_webdriver):
+        self.size = size
+        self.driver_path = driver_path
+        self._idle = []
+        self._started = 0
+        self._cond = threading.Condition()
+
+    def __repr__(self):
+        return f'BrowserPool({self._started}/{self.size} started)'
+
+    def __str__(self):
+        return f'BrowserPool({self._started}/{self.size} started)'
+
+
+    def _start(self):
+        options = webdriver.ChromeOptions()
+        options.add_argument('--headless')
+        options.add_argument('--disable-gpu')
+        options.add_argument('--window-size=1920,1080')
+
+        return webdriver.Chrome(service=Service(executable_path=self.driver_path), options=options)
+
+
+    def acquire(self, timeout=acquire_timeout):
+
+        """
+        Returns an idle browser, starting a new one while fewer than size are open, and waiting for one to be
+        released otherwise.
+
+            : param timeout : Seconds to wait for a free browser, TimeoutError is raised after that.
+
+        """
+
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._idle or self._started < self.size, timeout):
+                raise TimeoutError('No free browser after {}s'.format(timeout))
+
+            if self._idle:
+                return self._idle.pop()
+
+            self._started += 1
+
+        try:
+            driver = self._start()
+            logging.debug('## {} - {}.acquire() -- BROWSER STARTED'.format(__name__, self))
+            return driver
+
+        except Exception:
+            with self._cond:
+                self._started -= 1
+                self._cond.notify()
+            raise
+
+
+    def release(self, driver, broken=False):
+
+        """
+        Gives a browser back to the pool after clearing its cookies and storage. Broken browsers, or ones that
+        fail to reset, are quit instead and replaced on the next acquire().
+
+            : param driver : The browser returned by acquire().
+            : param broken : True when the browser should not be reused.
+
+        """
 
-    driver.maximize_window()
+        if not broken:
+            try:
+                driver.delete_all_cookies()
+                driver.execute_script(reset_js)
+                driver.get('about:blank')
+            except Exception as e:
+                logging.debug('## {} - {}.release() -- RESET FAILED -- {}'.format(__name__, self, e))
+                broken = True
 
-    # Authenticate
-    username_field = driver.find_element_by_id('username')
-    username_field.clear()
-    username_field.send_keys(username)
+        if broken:
+            self._quit(driver)
 
-    password_field = driver.find_element_by_id('password')
-    password_field.clear()
-    password_field.send_keys(password)
+        with self._cond:
+            if broken:
+                self._started -= 1
+            else:
+                self._idle.append(driver)
+            self._cond.notify()
 
-    login_button = driver.find_element_by_id('save_button')
-    login_button.click()
 
-    try:
-        WebDriverWait(driver, 15).until(EC.presence_of_element_located((By.ID, 'warningicon')))
-        logging.debug('## {} - {}.expressway_alarm_cleanup() -- AUTHENTICATION SUCCESSFUL'.format(__name__, node))
-    except:
-        logging.debug('## {} - {}.expressway_alarm_cleanup() -- NO ALARMS, QUITTING'.format(__name__, node))
-        driver.quit()
+    @contextmanager
+    def browser(self):
 
+        """
+        Context manager around acquire() and release(). A browser that raised is quit instead of reused.
 
-    # Navigate to alarms page
-    try:
-        driver.find_element_by_id('warningicon').click()
-    except:
-        logging.debug('## {} - {}.expressway_alarm_cleanup() -- NO ALARMS, QUITTING'.format(__name__, node))
-        driver.quit()
+        """
 
-    try:
-        WebDriverWait(driver, 15).until(EC.presence_of_element_located((By.ID, 'warninglist_tbody')))
-    except:
-        driver.quit()
+        driver = self.acquire()
+        broken = True
 
+        try:
+            yield driver
+            broken = False
 
-    # Capture number of alarms
-    alarm_rows = len(driver.find_elements_by_xpath('//*[@id="warninglist_tbody"]/tr'))
-    logging.debug('## {} - {}.expressway_alarm_cleanup() -- ALARMS == {}'.format(__name__, node, alarm_rows))
+        finally:
+            self.release(driver, broken)
 
-    # Action licensing alarms
-    alarm_index = 1
-    while alarm_index <= alarm_rows:
-        alarm_title = driver.find_element_by_xpath(f'//*[@id="warninglist_tbody"]/tr[{alarm_index}]/td[2]')
-        alarm_state = driver.find_element_by_xpath(f'//*[@id="warninglist_tbody"]/tr[{alarm_index}]/td[4]')
-        alarm_peer = driver.find_element_by_xpath(f'//*[@id="warninglist_tbody"]/tr[{alarm_index}]/td[6]')
 
-        if alarm_title.text in license_alarms and alarm_peer.text == 'This system' and alarm_state.text != 'Acknowledged':
-            driver.find_element_by_xpath(f'//*[@id="warninglist_tbody"]/tr[{alarm_index}]/td[1]').click()
-            logging.debug('## {} - {}.expressway_alarm_cleanup() -- ALARM {} SELECTED'.format(__name__, node, alarm_index))
+    def close_all(self):
 
-            driver.find_element_by_xpath('/html/body/div[2]/div/form/div[2]/input[1]').click()
-            logging.debug('## {} - {}.expressway_alarm_cleanup() -- ALARMS ACKNOWLEDGED'.format(__name__, node))
-        else:
-            pass
+        """
+        Quits every idle browser.
 
-        alarm_index += 1
+        """
 
+        with self._cond:
+            drivers, self._idle = self._idle, []
+            self._started -= len(drivers)
+            self._cond.notify_all()
+
+        for driver in drivers:
+            self._quit(driver)
+
+        logging.debug('## {} - {}.close_all()'.format(__name__, self))
+
+
+    def _quit(self, driver):
+        try:
+            driver.quit()
+        except Exception as e:
+            logging.debug('## {} - {}._quit() -- EXCEPTION -- {}'.format(__name__, self, e))
+
+
+## Shared by every caller that does not pass its own pool.
+browser_pool = BrowserPool()
+
+
+##############################################################################################
+# Functions
+##############################################################################################
+
+def expressway_alarm_cleanup(node, username, password, browsers=None):
+
+    """
+    Logs in to the Expressway web GUI and acknowledges the unacknowledged license alarms raised by the node itself.
+    Returns the number of alarms acknowledged.
+
+        : param node : The hostname or IP of the Expressway.
+        : param username : GUI username.
+        : param password : GUI password.
+        : param browsers : Optional BrowserPool(), defaults to the shared browser_pool.
+
+    """
+
+    if browsers is None: browsers = browser_pool
+
+    if '-expe-' in str(node) or '-EXPE-' in str(node):
+        node_url = f'https://{node}:7443/login'
     else:
-        driver.quit()
+        node_url = f'https://{node}/login'
+
+    with browsers.browser() as driver:
+
+        # Navigate to the application home page
+        driver.get(node_url)
+
+        WebDriverWait(driver, page_timeout).until(EC.presence_of_element_located((By.ID, 'save_button')))
+        logging.debug('## {} - {}.expressway_alarm_cleanup() -- GUI RESPONDING'.format(__name__, node))
+
+        # Authenticate
+        username_field = driver.find_element(By.ID, 'username')
+        username_field.clear()
+        username_field.send_keys(username)
+
+        password_field = driver.find_element(By.ID, 'password')
+        password_field.clear()
+        password_field.send_keys(password)
+
+        driver.find_element(By.ID, 'save_button').click()
+
+        try:
+            WebDriverWait(driver, page_timeout).until(EC.presence_of_element_located((By.ID, 'warningicon')))
+            logging.debug('## {} - {}.expressway_alarm_cleanup() -- AUTHENTICATION SUCCESSFUL'.format(__name__, node))
+        except Exception:
+            logging.debug('## {} - {}.expressway_alarm_cleanup() -- NO ALARMS, QUITTING'.format(__name__, node))
+            return 0
+
+        # Navigate to alarms page
+        driver.find_element(By.ID, 'warningicon').click()
+        WebDriverWait(driver, page_timeout).until(EC.presence_of_element_located((By.ID, 'warninglist_tbody')))
+
+        # Read the whole alarm table in one pass and pick the licensing alarms
+        alarms = driver.execute_script(read_alarms_js)
+        logging.debug('## {} - {}.expressway_alarm_cleanup() -- ALARMS == {}'.format(__name__, node, len(alarms)))
+
+        selected = [elem['index'] for elem in alarms
+                    if elem['title'] in license_alarms and elem['peer'] == 'This system' and elem['state'] != 'Acknowledged']
+
+        if not selected:
+            return 0
+
+        # Tick them all, then acknowledge them with a single click
+        count = driver.execute_script(select_alarms_js, selected)
+        logging.debug('## {} - {}.expressway_alarm_cleanup() -- {} ALARMS SELECTED'.format(__name__, node, count))
+
+        driver.find_element(By.XPATH, acknowledge_button).click()
+        logging.debug('## {} - {}.expressway_alarm_cleanup() -- ALARMS ACKNOWLEDGED'.format(__name__, node))
+
+        return count
 
 
 ##############################################################################################
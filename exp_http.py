@@ -0,0 +1,339 @@
+##############################################################################################
+# modules
+##############################################################################################
+
+import requests
+import logging
+from html.parser import HTMLParser
+from requests.adapters import HTTPAdapter
+from urllib.parse import urljoin
+from exp_gui import license_alarms
+
+
+##############################################################################################
+# Global Variables & Config
+##############################################################################################
+
+## Pages of the Expressway web interface used to log in and to list and acknowledge the alarms.
+login_path = '/login'
+
+alarms_path = '/warninglist'
+
+acknowledge_label = 'Acknowledge'
+
+## Connection pools kept by the shared client, one per Expressway, and keep-alive connections per Expressway.
+## A client whose Expressways share a host, i.e. a local stand-in server, keeps one connection per worker instead.
+pool_nodes = 50
+
+pool_connections = 2
+
+## Seconds to connect and to read a response. verify_tls may also be the path of a CA bundle.
+http_timeout = (10, 30)
+
+verify_tls = True
+
+
+##############################################################################################
+# Classes
+##############################################################################################
+
+class _FormParser(HTMLParser):
+
+    """
+    Collects the forms of a page with their hidden fields and submit buttons, and the rows of the alarm
+    table as (cells, checkbox) where checkbox is the (name, value) of the row's tick box.
+
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.forms = []
+        self._form = None
+        self._in_table = False
+        self._row = None
+        self._cell = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+
+        if tag == 'form':
+            self._form = {'action': attrs.get('action') or '', 'fields': {}, 'submits': [], 'rows': []}
+            self.forms.append(self._form)
+
+        elif tag == 'tbody' and attrs.get('id') == 'warninglist_tbody':
+            self._in_table = True
+
+        elif tag == 'tr' and self._in_table:
+            self._row = {'cells': [], 'checkbox': None}
+
+        elif tag == 'td' and self._row is not None:
+            self._cell = []
+
+        elif tag == 'input' and self._form is not None:
+            kind = (attrs.get('type') or 'text').lower()
+            name = attrs.get('name')
+
+            if kind == 'hidden' and name:
+                self._form['fields'][name] = attrs.get('value') or ''
+            elif kind == 'submit':
+                self._form['submits'].append((name, attrs.get('value') or ''))
+            elif kind == 'checkbox' and self._row is not None and name:
+                self._row['checkbox'] = (name, attrs.get('value') or 'on')
+
+    def handle_endtag(self, tag):
+        if tag == 'form':
+            self._form = None
+
+        elif tag == 'tbody' and self._in_table:
+            self._in_table = False
+
+        elif tag == 'td' and self._cell is not None:
+            self._row['cells'].append(' '.join(''.join(self._cell).split()))
+            self._cell = None
+
+        elif tag == 'tr' and self._row is not None:
+            if self._form is not None:
+                self._form['rows'].append(self._row)
+            self._row = None
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+
+
+class _AddressAdapter(HTTPAdapter):
+
+    """
+    HTTPAdapter for the urls built on the address of an Expressway, that sends its hostname as the TLS server name
+    and checks the certificate against it.
+
+        : param hostnames : Dict of the hostname of each address.
+
+    """
+
+    def __init__(self, hostnames, **kwargs):
+        self.hostnames = hostnames
+        super().__init__(**kwargs)
+
+    def build_connection_pool_key_attributes(self, request, verify, cert=None):
+        host_params, pool_kwargs = super().build_connection_pool_key_attributes(request, verify, cert)
+
+        hostname = self.hostnames.get(host_params['host'])
+        if hostname and host_params['scheme'] == 'https':
+            pool_kwargs['server_hostname'] = hostname
+            pool_kwargs['assert_hostname'] = hostname
+
+        return host_params, pool_kwargs
+
+
+class ExpresswayHTTP:
+
+    """
+    Keep-alive HTTPS client for the Expressway web interface, shared by every Expressway of a run.
+    The connection pools are shared across the nodes, while each node gets its own requests.Session() so the
+    login cookies never leak from one node to another.
+    A node with an address is connected to on that address, while the certificate is still checked against its
+    hostname, which is also sent as the TLS server name and the Host header.
+
+        : param scheme : 'https', or 'http' for a local stand-in server.
+        : param port : Optional port overriding the Expressway's own, i.e. that of a local stand-in server.
+        : param verify : Passed to requests as verify, True, False or the path of a CA bundle.
+        : param timeout : Passed to requests as timeout.
+        : param workers : Optional number of nodes cleaned up at the same time, the keep-alive connections kept per
+                          host when the nodes share one.
+
+    """
+
+    def __init__(self, scheme='https', port=None, verify=verify_tls, timeout=http_timeout, workers=None):
+        self.scheme = scheme
+        self.port = port
+        self.verify = verify
+        self.timeout = timeout
+        self.hostnames = {}
+        self.adapter = _AddressAdapter(self.hostnames, pool_connections=pool_nodes, pool_maxsize=max(pool_connections, workers or 0))
+
+    def __repr__(self):
+        return f'ExpresswayHTTP("{self.scheme}")'
+
+    def __str__(self):
+        return f'ExpresswayHTTP("{self.scheme}")'
+
+
+    def base_url(self, node, address=None):
+
+        """
+        Returns the root url of the web interface, on port 7443 for the Expressway-E nodes.
+
+            : param node : The hostname of the Expressway.
+            : param address : Optional address to connect to instead of the hostname, see session().
+
+        """
+
+        host = address or node
+        if address: self.hostnames[address] = node
+
+        return f'{self.scheme}://{host}' + self._port_of(node)
+
+
+    def session(self, node=None, address=None):
+
+        """
+        Returns a new requests.Session() using the shared connection pools.
+        It must not be closed, as closing a session also closes its adapters.
+
+            : param node : Optional hostname of the Expressway, sent as the Host header when there is an address.
+            : param address : Optional address the urls of base_url() are built on.
+
+        """
+
+        session = requests.Session()
+        session.verify = self.verify
+        if node and address: session.headers['Host'] = node + self._port_of(node)
+        session.mount('https://', self.adapter)
+        session.mount('http://', self.adapter)
+        return session
+
+
+    def _port_of(self, node):
+
+        ## The url port, the Expressway-E nodes serve their web interface on 7443.
+        if self.port:
+            return f':{self.port}'
+        if '-expe-' in str(node) or '-EXPE-' in str(node):
+            return ':7443'
+        return ''
+
+
+    def login(self, session, base_url, username, password):
+
+        """
+        Logs in to the web interface, sending back the hidden fields of the login form.
+
+        """
+
+        url = base_url + login_path
+
+        response = session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+
+        parser = _FormParser()
+        parser.feed(response.text)
+        form = parser.forms[0] if parser.forms else {'action': '', 'fields': {}, 'submits': []}
+
+        data = dict(form['fields'])
+        data.update({'username': username, 'password': password})
+        for name, value in form['submits'][:1]:
+            if name: data[name] = value
+
+        response = session.post(urljoin(url, form['action'] or url), data=data, timeout=self.timeout)
+        response.raise_for_status()
+
+        if 'id="username"' in response.text or 'id="password"' in response.text:
+            raise PermissionError(f'Login to {base_url} failed')
+
+        logging.debug('## {} - {}.login({}) -- AUTHENTICATION SUCCESSFUL'.format(__name__, self, base_url))
+
+
+    def alarms(self, session, base_url):
+
+        """
+        Returns the alarm form, with its rows as dicts of title, state, peer and checkbox.
+
+        """
+
+        url = base_url + alarms_path
+
+        response = session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+
+        parser = _FormParser()
+        parser.feed(response.text)
+
+        for form in parser.forms:
+            if form['rows'] or any(value == acknowledge_label for name, value in form['submits']):
+                form['url'] = urljoin(url, form['action'] or url)
+                form['alarms'] = [{
+                    'title': elem['cells'][1] if len(elem['cells']) > 1 else '',
+                    'state': elem['cells'][3] if len(elem['cells']) > 3 else '',
+                    'peer': elem['cells'][5] if len(elem['cells']) > 5 else '',
+                    'checkbox': elem['checkbox'],
+                } for elem in form['rows']]
+                return form
+
+        return {'url': url, 'fields': {}, 'submits': [], 'alarms': []}
+
+
+    def acknowledge(self, session, form, selected):
+
+        """
+        Acknowledges the selected alarms with a single post of the alarm form.
+
+            : param form : The alarm form returned by alarms().
+            : param selected : The alarms of the form to acknowledge.
+
+        """
+
+        data = list(form['fields'].items())
+        data.extend(elem['checkbox'] for elem in selected)
+
+        submits = [elem for elem in form['submits'] if elem[1] == acknowledge_label] or form['submits'][:1]
+        for name, value in submits:
+            if name: data.append((name, value))
+
+        response = session.post(form['url'], data=data, timeout=self.timeout)
+        response.raise_for_status()
+
+        logging.debug('## {} - {}.acknowledge({}) -- {} ALARMS ACKNOWLEDGED'.format(__name__, self, form['url'], len(selected)))
+
+
+## Shared by every caller that does not pass its own client.
+http_client = ExpresswayHTTP()
+
+
+##############################################################################################
+# Functions
+##############################################################################################
+
+def expressway_alarm_cleanup_http(node, username, password, client=None, address=None):
+
+    """
+    Same as exp_gui.expressway_alarm_cleanup() over plain HTTP requests, without a browser.
+    Acknowledges the unacknowledged license alarms raised by the node itself and returns how many were acknowledged.
+
+        : param node : The hostname or IP of the Expressway.
+        : param username : GUI username.
+        : param password : GUI password.
+        : param client : Optional ExpresswayHTTP(), defaults to the shared http_client.
+        : param address : Optional address to connect to instead of the hostname.
+
+    """
+
+    if client is None: client = http_client
+
+    base_url = client.base_url(node, address)
+
+    session = client.session(node, address)
+    client.login(session, base_url, username, password)
+
+    form = client.alarms(session, base_url)
+    logging.debug('## {} - expressway_alarm_cleanup_http({}) -- ALARMS == {}'.format(__name__, node, len(form['alarms'])))
+
+    selected = [elem for elem in form['alarms'] if elem['checkbox']
+                and elem['title'] in license_alarms and elem['peer'] == 'This system' and elem['state'] != 'Acknowledged']
+
+    if selected:
+        client.acknowledge(session, form, selected)
+
+    return len(selected)
+
+
+##############################################################################################
+# Run
+##############################################################################################
+
+if __name__ == '__main__':
+
+    format = "%(asctime)s: %(message)s"
+    logging.basicConfig(format=format, level=logging.DEBUG, datefmt="%H:%M:%S")
+
+    pass
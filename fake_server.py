@@ -0,0 +1,593 @@
+##############################################################################################
+# modules
+##############################################################################################
+
+import paramiko
+import html
+import secrets
+import socket
+import threading
+import time
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import StreamRequestHandler, ThreadingTCPServer
+from urllib.parse import parse_qs
+
+
+##############################################################################################
+# Global Variables & Config
+##############################################################################################
+
+ucm_prompt = 'admin:'
+
+exp_prompt = 'OK'
+
+show_status = '''
+Host Name    : {node}
+Date         : Fri Jan 27, 2023 07:30:00
+Time Zone    : Greenwich Mean Time (Europe/London)
+Locale       : en_US.UTF-8
+Product Ver  : 12.5.1.14900-63
+Unified OS Version : 7.0.0.0-4
+
+Uptime:
+ 07:30:00 up {uptime} days,  3:12,  1 user,  load average: 0.10, 0.12, 0.09
+
+CPU Idle:   97.49%  System:   01.00%    User:   01.51%
+  IOWAIT:   00.00%     IRQ:   00.00%    Soft:   00.00%
+
+Memory Total:        8061108K
+        Free:         146804K
+        Used:        7914304K
+      Cached:        2446920K
+      Shared:         262508K
+     Buffers:          49364K
+
+                        Total            Free            Used
+Disk/active          19805412K        2853036K       16750600K (86%)
+Disk/inactive        19805412K       18542264K         253104K (2%)
+Disk/logging         69234984K       43048348K       22660360K (35%)
+'''
+
+cert_own = '''
+[
+  Version: V3
+  Serial Number: 1234567890
+  SignatureAlgorithm: SHA256withRSA (1.2.840.113549.1.1.11)
+  Issuer Name: CN=Issuing CA, O=Example
+  Validity From: Mon Jan 02 10:00:00 GMT 2023
+           To:   Thu Jan 02 10:00:00 GMT 2031
+  Subject Name: CN={node}, O=Example
+]
+'''
+
+backup_history = '''
+ Tar Filename:             Backup Device:   Completed On:                     Result:  Backup Type:  Features Backed Up:
+-------------------------------------------------------------------------------------------------------------------------
+ 2023-01-26-02-00-00.tar   NETWORK          Thu Jan 26 02:14:21 GMT 2023      SUCCESS  SCHEDULED     CDR_CAR,UCM,PLM
+ 2023-01-27-02-00-00.tar   NETWORK          Fri Jan 27 02:13:58 GMT 2023      SUCCESS  SCHEDULED     CDR_CAR,UCM,PLM
+'''
+
+alarm = '''*s Alarm {index}:
+    Id: "{alarm_id}"
+    Level: "Warning"
+    State: "Unacknowledged"
+    Peer: "This system"
+    Title: "Call license limit reached"
+    Description: "The number of concurrent calls has reached the licensed limit"
+    UUID: "00000000-0000-0000-0000-{index:012d}"
+'''
+
+## Alarm titles of the fake web interface, cycled through, with the peer that raised them.
+web_alarms = [
+    ('Call license limit reached', 'This system'),
+    ('Capacity warning', '10.0.0.2'),
+    ('Room system license limit reached', 'This system'),
+    ('NTP server not available', 'This system'),
+]
+
+login_page = '''<html><body>
+<form action="/login" method="post">
+<input type="hidden" name="csrf_token" value="{token}">
+<input type="text" id="username" name="username">
+<input type="password" id="password" name="password">
+<input type="submit" id="save_button" name="formbutton" value="Login">
+</form>
+</body></html>'''
+
+alarms_page = '''<html><body>
+<div id="warningicon"></div>
+<div><div>
+<form action="/warninglist" method="post">
+<table><tbody id="warninglist_tbody">
+{rows}
+</tbody></table>
+<input type="hidden" name="csrf_token" value="{token}">
+<div><input type="submit" name="formbutton" value="Acknowledge"> <input type="submit" name="formbutton" value="Unacknowledge"></div>
+</form>
+</div></div>
+</body></html>'''
+
+alarm_row = '''<tr><td><input type="checkbox" name="selected" value="{alarm_id}"></td><td>{title}</td><td>Warning</td>
+<td>{state}</td><td>2023-01-27 07:00:00</td><td>{peer}</td></tr>'''
+
+
+##############################################################################################
+# Classes
+##############################################################################################
+
+class _ServerInterface(paramiko.ServerInterface):
+
+    """
+    Accepts any password and a single interactive shell per connection.
+
+    """
+
+    def __init__(self):
+        self.username = None
+        self.shell_requested = threading.Event()
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_auth_password(self, username, password):
+        self.username = username
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_pty_request(self, channel, term, width, height, pixelwidth, pixelheight, modes):
+        return True
+
+    def check_channel_shell_request(self, channel):
+        self.shell_requested.set()
+        return True
+
+
+class FakeCLIServer:
+
+    """
+    Local paramiko SSH server emulating the CUCM and Expressway admin CLIs, for benchmarking the checks
+    without real nodes. Usernames starting with 'exp' get an Expressway shell ('OK' prompt), every other
+    username gets a CUCM shell ('admin:' prompt).
+
+        : param host : Address to listen on.
+        : param port : Port to listen on, 0 picks a free one.
+        : param latency : Seconds each command takes before its output is sent.
+        : param banner_delay : Seconds before the first prompt is sent after login.
+        : param services : Number of lines returned by 'utils service list'.
+        : param certs : Number of certs returned by 'show cert list own'.
+        : param alarms : Number of alarms returned by 'xstatus alarm'.
+        : param uptime : Days of uptime reported by 'show status'.
+
+    Service names added to stopped are listed as stopped by 'utils service list', i.e. to try the monitor.
+
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, banner_delay=0.0, services=60, certs=12, alarms=3, uptime=45):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.banner_delay = banner_delay
+        self.services = services
+        self.certs = certs
+        self.alarms = alarms
+        self.uptime = uptime
+        self.stopped = set()
+        self.host_key = paramiko.RSAKey.generate(2048)
+        self.sessions = 0
+        self._sock = None
+        self._stop = threading.Event()
+
+    def __repr__(self):
+        return f'FakeCLIServer("{self.host}", {self.port})'
+
+    def __str__(self):
+        return f'FakeCLIServer("{self.host}", {self.port})'
+
+
+    def start(self):
+
+        """
+        Starts listening and accepting connections in a daemon thread. Returns the port listened on.
+
+        """
+
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind((self.host, self.port))
+        self._sock.listen(1024)
+        self.port = self._sock.getsockname()[1]
+
+        threading.Thread(target=self._accept, name='fake-cli-server', daemon=True).start()
+        logging.debug('## {} - {}.start()'.format(__name__, self))
+
+        return self.port
+
+
+    def stop(self):
+        self._stop.set()
+        self._sock.close()
+
+
+    def _accept(self):
+        while not self._stop.is_set():
+            try:
+                client, _ = self._sock.accept()
+            except OSError:
+                return
+
+            threading.Thread(target=self._serve, args=(client,), daemon=True).start()
+
+
+    def _serve(self, client):
+        transport = paramiko.Transport(client)
+        transport.add_server_key(self.host_key)
+        server = _ServerInterface()
+
+        try:
+            transport.start_server(server=server)
+            channel = transport.accept(30)
+            if channel is None or not server.shell_requested.wait(30):
+                return
+
+            self.sessions += 1
+            node = f'fake-{self.sessions}'
+            expressway = (server.username or '').startswith('exp')
+            prompt = exp_prompt if expressway else ucm_prompt
+
+            time.sleep(self.banner_delay)
+            if expressway:
+                channel.sendall(self._crlf('\nWelcome to the fake Expressway shell\n' + prompt + '\n'))
+            else:
+                channel.sendall(self._crlf('\nWelcome to the fake Platform Command Line Interface\n\n' + prompt + ' '))
+
+            buffer = b''
+            while True:
+                data = channel.recv(65535)
+                if not data:
+                    return
+
+                buffer += data
+                while b'\n' in buffer:
+                    line, buffer = buffer.split(b'\n', 1)
+                    cmd = line.decode().strip()
+
+                    time.sleep(self.latency)
+                    output = self._exp_output(cmd) if expressway else self._ucm_output(cmd, node)
+                    if expressway:
+                        channel.sendall(self._crlf(cmd + '\n' + output + '\n' + prompt + '\n'))
+                    else:
+                        channel.sendall(self._crlf(cmd + '\n' + output + '\n' + prompt + ' '))
+
+        except Exception as e:
+            logging.debug('## {} - {}._serve() -- EXCEPTION -- {}'.format(__name__, self, e))
+
+        finally:
+            transport.close()
+
+
+    @staticmethod
+    def _crlf(text):
+        return text.replace('\n', '\r\n').encode()
+
+
+    def _ucm_output(self, cmd, node):
+        if cmd == '':
+            return ''
+
+        if cmd == 'set cli pagination off':
+            return 'Automation Pagination turned off'
+
+        if cmd == 'show status':
+            return show_status.format(node=node, uptime=self.uptime)
+
+        if cmd == 'utils service list':
+            lines = ['Requesting service status, please wait...', 'System SSH [STARTED]']
+            for index in range(self.services):
+                if f'Cisco Service {index}' in self.stopped:
+                    continue
+                if index % 10 == 9:
+                    lines.append(f'Cisco Service {index}[STOPPED]  Service Not Activated')
+                else:
+                    lines.append(f'Cisco Service {index}[STARTED]')
+            lines.extend(f'{elem}[STOPPED]  Component is not running' for elem in sorted(self.stopped))
+            lines.append('Cisco CAR DB[STOPPED]  Commanded Out of Service')
+            lines.append('Primary Node =true')
+            return '\n'.join(lines)
+
+        if cmd == 'show cert list own':
+            return '\n'.join(f'tomcat-{index}/tomcat-{index}.pem: Certificate Signed by Issuing CA' for index in range(self.certs))
+
+        if cmd.startswith('show cert own '):
+            return cert_own.format(node=node)
+
+        if cmd == 'utils disaster_recovery history Backup':
+            return backup_history
+
+        return f'Executed command unsuccessfully\nInvalid command: {cmd}'
+
+
+    def _exp_output(self, cmd):
+        if cmd == 'xstatus alarm':
+            return ''.join(alarm.format(index=index + 1, alarm_id=40000 + index) for index in range(self.alarms)) + '*s/end\n'
+
+        return ''
+
+
+class _WebHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logging.debug('## {} - {}'.format(__name__, format % args))
+
+    def _send(self, status, body='', headers=None):
+        data = body.encode()
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _form(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return parse_qs(self.rfile.read(length).decode())
+
+    def _logged_in(self):
+        cookie = self.headers.get('Cookie') or ''
+        return any(elem.strip() == f'SESSIONID={self.server.web.session_id}' for elem in cookie.split(';'))
+
+    def do_GET(self):
+        web = self.server.web
+
+        if self.path == '/login':
+            return self._send(200, login_page.format(token=web.token))
+
+        if self.path == '/warninglist' and self._logged_in():
+            return self._send(200, web.render_alarms())
+
+        self._send(303, headers={'Location': '/login'})
+
+    def do_POST(self):
+        web = self.server.web
+        form = self._form()
+
+        if form.get('csrf_token') != [web.token]:
+            return self._send(403, 'Invalid token')
+
+        if self.path == '/login':
+            if form.get('username') != [web.username] or form.get('password') != [web.password]:
+                return self._send(200, login_page.format(token=web.token))
+            web.logins += 1
+            return self._send(200, web.render_alarms(), {'Set-Cookie': f'SESSIONID={web.session_id}; Path=/'})
+
+        if self.path == '/warninglist' and self._logged_in():
+            if form.get('formbutton') == ['Acknowledge']:
+                web.acknowledge(form.get('selected', []))
+            return self._send(200, web.render_alarms())
+
+        self._send(303, headers={'Location': '/login'})
+
+
+class FakeExpresswayWeb:
+
+    """
+    Local HTTP server standing in for the Expressway web interface, with a login form and the alarm page, for
+    trying the HTTP alarm cleanup without real nodes.
+
+        : param host : Address to listen on.
+        : param port : Port to listen on, 0 picks a free one.
+        : param alarms : Number of alarms listed, cycling through web_alarms.
+        : param username : The accepted username.
+        : param password : The accepted password.
+
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, alarms=4, username='admin', password='password'):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.token = secrets.token_hex(8)
+        self.session_id = secrets.token_hex(8)
+        self.alarms = [{'id': str(40000 + index), 'title': web_alarms[index % len(web_alarms)][0],
+                        'peer': web_alarms[index % len(web_alarms)][1], 'state': 'Unacknowledged'} for index in range(alarms)]
+        self.logins = 0
+        self.acknowledge_posts = 0
+        self._server = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f'FakeExpresswayWeb("{self.host}", {self.port})'
+
+    def __str__(self):
+        return f'FakeExpresswayWeb("{self.host}", {self.port})'
+
+
+    def start(self):
+
+        """
+        Starts serving in a daemon thread. Returns the port listened on.
+
+        """
+
+        self._server = ThreadingHTTPServer((self.host, self.port), _WebHandler)
+        self._server.daemon_threads = True
+        self._server.web = self
+        self.port = self._server.server_address[1]
+
+        threading.Thread(target=self._server.serve_forever, name='fake-expressway-web', daemon=True).start()
+        logging.debug('## {} - {}.start()'.format(__name__, self))
+
+        return self.port
+
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+    def render_alarms(self):
+        with self._lock:
+            rows = '\n'.join(alarm_row.format(alarm_id=elem['id'], title=html.escape(elem['title']), state=elem['state'],
+                                               peer=html.escape(elem['peer'])) for elem in self.alarms)
+        return alarms_page.format(rows=rows, token=self.token)
+
+
+    def acknowledge(self, alarm_ids):
+        with self._lock:
+            self.acknowledge_posts += 1
+            for elem in self.alarms:
+                if elem['id'] in alarm_ids:
+                    elem['state'] = 'Acknowledged'
+
+
+class _SMTPHandler(StreamRequestHandler):
+
+    def _reply(self, line):
+        self.wfile.write((line + '\r\n').encode())
+
+    def handle(self):
+        smtp = self.server.smtp
+
+        with smtp._lock:
+            smtp.connections += 1
+            refuse = smtp.connections <= smtp.refuse_first
+
+        if refuse:
+            self._reply('421 fake.smtp Service not available')
+            return
+
+        self._reply('220 fake.smtp ESMTP')
+        sender, recipients = None, []
+
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+
+            verb = line.decode(errors='replace').strip().split(' ', 1)[0].upper()
+
+            if verb in ('EHLO', 'HELO'):
+                self._reply('250 fake.smtp')
+            elif verb == 'MAIL':
+                sender, recipients = line.decode().strip()[10:], []
+                self._reply('250 OK')
+            elif verb == 'RCPT':
+                recipient = line.decode().strip()[8:]
+                if recipient.strip('<>') in smtp.reject:
+                    self._reply('550 No such user')
+                    continue
+                recipients.append(recipient)
+                self._reply('250 OK')
+            elif verb == 'DATA':
+                self._reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                while True:
+                    line = self.rfile.readline()
+                    if not line or line.rstrip(b'\r\n') == b'.':
+                        break
+                    data.append(line[1:] if line.startswith(b'..') else line)
+                time.sleep(smtp.delay)
+                if smtp.reject_data:
+                    self._reply('554 Message rejected')
+                    continue
+                with smtp._lock:
+                    smtp.messages.append((sender, recipients, b''.join(data)))
+                self._reply('250 OK queued')
+            elif verb in ('RSET', 'NOOP'):
+                self._reply('250 OK')
+            elif verb == 'QUIT':
+                self._reply('221 Bye')
+                return
+            else:
+                self._reply('502 Command not implemented')
+
+
+class FakeSMTPServer:
+
+    """
+    Local SMTP server standing in for the mail relay, keeping the messages it receives, for trying the report
+    delivery without a real relay.
+
+        : param host : Address to listen on.
+        : param port : Port to listen on, 0 picks a free one.
+        : param refuse_first : Number of connections answered with 421 before the server accepts mail.
+        : param delay : Seconds each message takes to be accepted, to stand in for a slow relay.
+        : param reject : Recipient addresses answered with 550.
+        : param reject_data : True to answer every message with 554 once its data is sent.
+
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, refuse_first=0, delay=0, reject=(), reject_data=False):
+        self.host = host
+        self.port = port
+        self.refuse_first = refuse_first
+        self.delay = delay
+        self.reject = set(reject)
+        self.reject_data = reject_data
+        self.messages = []
+        self.connections = 0
+        self._server = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f'FakeSMTPServer("{self.host}", {self.port})'
+
+    def __str__(self):
+        return f'FakeSMTPServer("{self.host}", {self.port})'
+
+
+    def start(self):
+
+        """
+        Starts serving in a daemon thread. Returns the port listened on.
+
+        """
+
+        ThreadingTCPServer.allow_reuse_address = True
+        self._server = ThreadingTCPServer((self.host, self.port), _SMTPHandler)
+        self._server.daemon_threads = True
+        self._server.smtp = self
+        self.port = self._server.server_address[1]
+
+        threading.Thread(target=self._server.serve_forever, name='fake-smtp', daemon=True).start()
+        logging.debug('## {} - {}.start()'.format(__name__, self))
+
+        return self.port
+
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+##############################################################################################
+# Run
+##############################################################################################
+
+if __name__ == '__main__':
+
+    format = "%(asctime)s: %(message)s"
+    logging.basicConfig(format=format, level=logging.DEBUG, datefmt="%H:%M:%S")
+
+    server = FakeCLIServer(port=2222)
+    server.start()
+    logging.info('## {} - {} -- LISTENING'.format(__name__, server))
+
+    web = FakeExpresswayWeb(port=8080)
+    web.start()
+    logging.info('## {} - {} -- LISTENING'.format(__name__, web))
+
+    smtp = FakeSMTPServer(port=2525)
+    smtp.start()
+    logging.info('## {} - {} -- LISTENING'.format(__name__, smtp))
+
+    while True:
+        time.sleep(1)
@@ -0,0 +1,158 @@
+##############################################################################################
+# modules
+##############################################################################################
+
+import csv
+import os
+import threading
+import logging
+from sharding import shard_of
+
+
+##############################################################################################
+# Classes
+##############################################################################################
+
+class InventoryIndex:
+
+    """
+    The rows of one load of the infrastructure.csv and their views. Never changed once built, reload() replaces it
+    as a whole.
+
+    """
+
+    __slots__ = ('rows', 'by_hostname', 'by_device', 'by_region', 'by_role', 'ucm_nodes', 'exp_nodes', 'mtime')
+
+    def __init__(self, rows=(), shard=None, mtime=None):
+        self.rows = list(rows)
+        self.by_hostname, self.by_device, self.by_region, self.by_role = {}, {}, {}, {}
+        self.mtime = mtime
+
+        for row in self.rows:
+            self.by_hostname[row['hostname']] = row
+            self.by_device.setdefault(row['device'], []).append(row)
+            self.by_region.setdefault(row['region'], []).append(row)
+            self.by_role.setdefault(row['role'], []).append(row)
+
+        nodes = self.rows
+        if shard is not None:
+            index, count = shard
+            nodes = [row for row in nodes if shard_of(row.get('cluster') or row['region'], count) == index]
+
+        self.ucm_nodes = [row for row in nodes if 'cte' not in row['region'] and 'exp' not in row['device']]
+        self.exp_nodes = [row for row in nodes if 'exp' in row['device']]
+
+    def __repr__(self):
+        return f'InventoryIndex({len(self.rows)} rows)'
+
+    def __str__(self):
+        return f'InventoryIndex({len(self.rows)} rows)'
+
+
+class Inventory:
+
+    """
+    Loads the infrastructure.csv once and indexes its rows by hostname, device type, region and role.
+    The file is only parsed again by reload() when its modification time changes, so a long running
+    scheduler can keep a single instance warm between runs.
+    The views are read from a single InventoryIndex() that reload() replaces in one assignment, so each view is
+    always complete. A caller that needs several views of the same load takes index once and reads them from it.
+
+        : param path : Path to the infrastructure.csv file.
+        : param shard : Optional (index, count). The ucm_nodes and exp_nodes views then only hold the clusters of
+                        that shard, while every row can still be looked up.
+
+    """
+
+    def __init__(self, path='infrastructure.csv', shard=None):
+        self.path = path
+        self.shard = shard
+        self.index = InventoryIndex()
+        self._lock = threading.Lock()
+        self.reload()
+
+    def __repr__(self):
+        return f'Inventory("{self.path}")'
+
+    def __str__(self):
+        return f'Inventory("{self.path}")'
+
+    def __len__(self):
+        return len(self.index.rows)
+
+    def __contains__(self, hostname):
+        return hostname in self.index.by_hostname
+
+    def __getitem__(self, hostname):
+        return self.index.by_hostname[hostname]
+
+
+    @property
+    def mtime(self):
+        return self.index.mtime
+
+    @property
+    def rows(self):
+        return self.index.rows
+
+    @property
+    def by_hostname(self):
+        return self.index.by_hostname
+
+    @property
+    def by_device(self):
+        return self.index.by_device
+
+    @property
+    def by_region(self):
+        return self.index.by_region
+
+    @property
+    def by_role(self):
+        return self.index.by_role
+
+    @property
+    def ucm_nodes(self):
+        return self.index.ucm_nodes
+
+    @property
+    def exp_nodes(self):
+        return self.index.exp_nodes
+
+
+    def reload(self):
+
+        """
+        Re-reads the csv if its modification time has changed since the last load.
+        Returns True if the file was parsed again.
+
+        """
+
+        mtime = os.stat(self.path).st_mtime
+
+        with self._lock:
+            if mtime == self.index.mtime:
+                logging.debug('## {} - {}.reload() -- UNCHANGED'.format(__name__, self))
+                return False
+
+            with open(self.path) as f:
+                index = InventoryIndex(csv.DictReader(f), self.shard, mtime)
+
+            ## Built aside and swapped in with one assignment, so readers never see a half built index.
+            self.index = index
+
+        logging.info('## {} - {}.reload() -- {} NODES LOADED'.format(__name__, self, len(index.rows)))
+        return True
+
+
+    def cluster_of(self, hostname):
+
+        """
+        Returns the cluster of a node, taken from the optional 'cluster' column and falling back to its region.
+
+            : param hostname : The hostname of the node.
+
+        """
+
+        row = self.by_hostname[hostname]
+        return row.get('cluster') or row['region']
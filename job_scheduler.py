@@ -0,0 +1,206 @@
+##############################################################################################
+# modules
+##############################################################################################
+
+import heapq
+import itertools
+import math
+import threading
+import time
+import logging
+from datetime import datetime, timedelta
+
+
+##############################################################################################
+# Functions
+##############################################################################################
+
+def seconds_until(at):
+
+    """
+    Returns the seconds from now until the next time the clock reads at.
+
+        : param at : Time of day as 'HH:MM' or 'HH:MM:SS'.
+
+    """
+
+    now = datetime.now()
+    fields = [int(elem) for elem in at.split(':')]
+    due = now.replace(hour=fields[0], minute=fields[1], second=fields[2] if len(fields) > 2 else 0, microsecond=0)
+
+    if due <= now:
+        due += timedelta(days=1)
+
+    return (due - now).total_seconds()
+
+
+##############################################################################################
+# Classes
+##############################################################################################
+
+class Job:
+
+    """
+    A function run by the JobScheduler() every interval seconds, or every day at a time of day.
+
+        : param name : The name of the job, i.e. the check type it runs.
+        : param func : The function to run, called without arguments.
+        : param interval : Seconds between runs.
+        : param at : Optional time of day as 'HH:MM', the job then runs once a day at that time.
+
+    """
+
+    __slots__ = ('name', 'func', 'interval', 'at', 'due', 'running', 'runs', 'skipped')
+
+    def __init__(self, name, func, interval=None, at=None):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.at = at
+        self.due = None
+        self.running = False
+        self.runs = 0
+        self.skipped = 0
+
+    def __repr__(self):
+        return f'Job("{self.name}", {self.at or self.interval})'
+
+    def __str__(self):
+        return f'Job("{self.name}", {self.at or self.interval})'
+
+
+    def next_due(self, due, now):
+
+        """
+        Returns the monotonic time the job is due next, after the run that was due at due.
+        Runs missed while the scheduler was stalled are dropped rather than run back to back.
+
+        """
+
+        if self.at is not None:
+            return now + seconds_until(self.at)
+
+        due += self.interval
+        if due <= now:
+            due += self.interval * math.ceil((now - due) / self.interval)
+
+        return due
+
+
+class JobScheduler:
+
+    """
+    Runs jobs on their own cadences from a heap of timers, sleeping until the next one is due instead of polling.
+    Each run gets its own thread, so a slow job never delays the others, and a job that is still running when it is
+    due again skips that run instead of overlapping itself.
+
+    """
+
+    def __init__(self):
+        self.jobs = {}
+        self._heap = []
+        self._seq = itertools.count()
+        self._stopped = False
+        self._cond = threading.Condition()
+
+    def __repr__(self):
+        return f'JobScheduler({len(self.jobs)} jobs)'
+
+    def __str__(self):
+        return f'JobScheduler({len(self.jobs)} jobs)'
+
+
+    def add(self, name, func, interval=None, at=None, delay=0):
+
+        """
+        Adds a job and returns it.
+
+            : param name : The name of the job.
+            : param func : The function to run, called without arguments.
+            : param interval : Seconds between runs.
+            : param at : Optional time of day as 'HH:MM', the job then runs once a day at that time.
+            : param delay : Seconds until the first run of an interval job.
+
+        """
+
+        job = Job(name, func, interval, at)
+
+        with self._cond:
+            job.due = time.monotonic() + (seconds_until(at) if at is not None else delay)
+            self.jobs[name] = job
+            heapq.heappush(self._heap, (job.due, next(self._seq), job))
+            self._cond.notify()
+
+        logging.debug('## {} - {}.add({}) -- FIRST RUN IN {:.0f}s'.format(__name__, self, job, job.due - time.monotonic()))
+
+        return job
+
+
+    def run_forever(self):
+
+        """
+        Starts the jobs as they fall due until stop() is called.
+
+        """
+
+        with self._cond:
+            while not self._stopped:
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+
+                due, seq, job = self._heap[0]
+                now = time.monotonic()
+
+                if due > now:
+                    self._cond.wait(due - now)
+                    continue
+
+                heapq.heappop(self._heap)
+                self._start(job)
+
+                job.due = job.next_due(due, now)
+                heapq.heappush(self._heap, (job.due, next(self._seq), job))
+
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+
+    def _start(self, job):
+        if job.running:
+            job.skipped += 1
+            logging.info('## {} - {}._start({}) -- STILL RUNNING, SKIPPED'.format(__name__, self, job))
+            return
+
+        job.running = True
+        job.runs += 1
+        threading.Thread(target=self._run, args=(job,), name=f'job-{job.name}', daemon=True).start()
+
+
+    def _run(self, job):
+        start = time.monotonic()
+
+        try:
+            job.func()
+        except Exception as e:
+            logging.info('## {} - {}._run({}) -- EXCEPTION -- {}'.format(__name__, self, job, e))
+        finally:
+            with self._cond:
+                job.running = False
+
+        logging.debug('## {} - {}._run({}) -- FINISHED IN {:.1f}s'.format(__name__, self, job, time.monotonic() - start))
+
+
+##############################################################################################
+# Run
+##############################################################################################
+
+if __name__ == '__main__':
+
+    format = "%(asctime)s: %(message)s"
+    logging.basicConfig(format=format, level=logging.DEBUG, datefmt="%H:%M:%S")
+
+    pass
@@ -0,0 +1,252 @@
+##############################################################################################
+# modules
+##############################################################################################
+
+import email
+import email.policy
+import os
+import queue
+import random
+import smtplib
+import threading
+import time
+import logging
+from datetime import datetime
+
+
+##############################################################################################
+# Global Variables & Config
+##############################################################################################
+
+## Folder the reports are saved to until the relay has accepted them.
+spool_dir = 'undelivered'
+
+## Folder within the spool the reports rejected by the relay are moved to. They are kept for a look but never
+## queued again, as the relay would reject them again.
+rejected_dir = 'rejected'
+
+## Seconds to connect to the relay and to wait for its replies.
+smtp_timeout = 30
+
+## Extra attempts to deliver a report, and the backoff between them in seconds.
+retries = 4
+
+backoff_base = 5
+
+backoff_max = 300
+
+## Seconds the connection to the relay is kept open with nothing left to send.
+idle_close = 60
+
+
+##############################################################################################
+# Classes
+##############################################################################################
+
+class ReportMailer:
+
+    """
+    Delivers the report emails from a background thread, so a slow or unreachable relay never holds up the run.
+    Each report is saved to the spool folder before it is queued and removed once the relay has accepted it.
+    The connection to the relay is reused while there is mail to send. Failed deliveries are retried with backoff,
+    and the reports still undelivered after that stay in the spool and are queued again by the next start().
+    Reports the relay rejects outright, or whose recipients it refuses, are moved to the rejected folder instead.
+
+        : param server : The SMTP relay, as 'host' or 'host:port'.
+        : param port : Optional port of the relay.
+        : param spool : Path of the spool folder.
+        : param timeout : Seconds to connect to the relay and to wait for its replies.
+
+    """
+
+    def __init__(self, server, port=0, spool=spool_dir, timeout=smtp_timeout):
+        self.server = server
+        self.port = port
+        self.spool = spool
+        self.timeout = timeout
+        self.sent = 0
+        self._smtp = None
+        self._queue = queue.Queue()
+        self._queued = set()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+
+    def __repr__(self):
+        return f'ReportMailer("{self.server}", {len(self._queued)} queued)'
+
+    def __str__(self):
+        return f'ReportMailer("{self.server}", {len(self._queued)} queued)'
+
+
+    def start(self):
+
+        """
+        Starts the delivery thread if it is not running, and queues the reports left in the spool by earlier runs.
+
+        """
+
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._deliver_forever, name='report-mailer', daemon=True)
+                self._thread.start()
+
+        if os.path.isdir(self.spool):
+            for name in sorted(os.listdir(self.spool)):
+                if name.endswith('.eml'):
+                    self._enqueue(os.path.join(self.spool, name))
+
+
+    def send(self, msg):
+
+        """
+        Saves the message to the spool and queues it for delivery. Returns the path it was saved to.
+
+            : param msg : The EmailMessage() to send.
+
+        """
+
+        os.makedirs(self.spool, exist_ok=True)
+
+        path = os.path.join(self.spool, datetime.now().strftime('%Y%m%d_%H%M%S_%f') + '.eml')
+        with open(path + '.tmp', 'wb') as f:
+            f.write(msg.as_bytes())
+        os.replace(path + '.tmp', path)
+
+        self.start()
+        self._enqueue(path)
+
+        return path
+
+
+    def wait(self, timeout=None):
+
+        """
+        Waits until every queued report has been delivered or given up on. Returns False on timeout.
+
+            : param timeout : Seconds to wait, None waits for as long as it takes.
+
+        """
+
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._queued, timeout)
+
+
+    def close(self):
+        with self._lock:
+            smtp, self._smtp = self._smtp, None
+
+        if smtp is not None:
+            try:
+                smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                smtp.close()
+
+
+    def _enqueue(self, path):
+        with self._lock:
+            if path in self._queued:
+                return
+            self._queued.add(path)
+
+        self._queue.put(path)
+        logging.debug('## {} - {}._enqueue() -- {}'.format(__name__, self, path))
+
+
+    def _connection(self):
+
+        """
+        Returns the open connection to the relay if it still answers, a new one otherwise.
+
+        """
+
+        if self._smtp is not None:
+            try:
+                if self._smtp.noop()[0] == 250:
+                    return self._smtp
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._smtp.close()
+
+        self._smtp = smtplib.SMTP(self.server, self.port, timeout=self.timeout)
+        logging.debug('## {} - {}._connection() -- CONNECTED'.format(__name__, self))
+
+        return self._smtp
+
+
+    def _deliver(self, path):
+
+        """
+        Sends a spooled report, retrying with backoff. Returns True once the relay has accepted it.
+
+        """
+
+        with open(path, 'rb') as f:
+            msg = email.message_from_bytes(f.read(), policy=email.policy.default)
+
+        for attempt in range(retries + 1):
+            try:
+                self._connection().send_message(msg)
+                return True
+
+            except (smtplib.SMTPException, OSError) as e:
+                if self._smtp is not None:
+                    self._smtp.close()
+                    self._smtp = None
+
+                ## Rejected by the relay itself, another attempt would get the same answer.
+                if isinstance(e, smtplib.SMTPResponseException) and e.smtp_code >= 500:
+                    logging.info('## {} - {}._deliver({}) -- REJECTED -- {}'.format(__name__, self, path, e))
+                    self._reject(path)
+                    return False
+                if isinstance(e, smtplib.SMTPRecipientsRefused):
+                    logging.info('## {} - {}._deliver({}) -- RECIPIENTS REFUSED -- {}'.format(__name__, self, path, e))
+                    self._reject(path)
+                    return False
+
+                if attempt == retries:
+                    logging.info('## {} - {}._deliver({}) -- GIVING UP, KEPT IN SPOOL -- {}'.format(__name__, self, path, e))
+                    return False
+
+                delay = min(backoff_max, backoff_base * 2 ** attempt) * random.uniform(0.5, 1)
+                logging.debug('## {} - {}._deliver({}) -- ATTEMPT {} FAILED, RETRY IN {:.1f}s -- {}'.format(__name__, self, path, attempt + 1, delay, e))
+                time.sleep(delay)
+
+
+    def _reject(self, path):
+        rejected = os.path.join(self.spool, rejected_dir)
+        os.makedirs(rejected, exist_ok=True)
+        os.replace(path, os.path.join(rejected, os.path.basename(path)))
+
+
+    def _deliver_forever(self):
+        while True:
+            try:
+                path = self._queue.get(timeout=idle_close)
+            except queue.Empty:
+                self.close()
+                continue
+
+            try:
+                if self._deliver(path):
+                    os.remove(path)
+                    self.sent += 1
+                    logging.info('## {} - {}._deliver_forever() -- REPORT DELIVERED -- {}'.format(__name__, self, path))
+            except Exception as e:
+                logging.info('## {} - {}._deliver_forever() -- EXCEPTION, KEPT IN SPOOL -- {}'.format(__name__, self, e))
+
+            with self._idle:
+                self._queued.discard(path)
+                self._idle.notify_all()
+
+
+##############################################################################################
+# Run
+##############################################################################################
+
+if __name__ == '__main__':
+
+    format = "%(asctime)s: %(message)s"
+    logging.basicConfig(format=format, level=logging.DEBUG, datefmt="%H:%M:%S")
+
+    pass
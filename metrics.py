@@ -0,0 +1,335 @@
+##############################################################################################
+# modules
+##############################################################################################
+
+import functools
+import json
+import os
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+
+
+##############################################################################################
+# Global Variables & Config
+##############################################################################################
+
+## Upper bounds in seconds of the latency histogram buckets.
+buckets = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+## Number of slowest nodes listed in the json export.
+slowest_nodes = 20
+
+
+##############################################################################################
+# Classes
+##############################################################################################
+
+class Histogram:
+
+    """
+    Cumulative latency histogram in the Prometheus layout.
+
+    """
+
+    __slots__ = ('counts', 'count', 'sum')
+
+    def __init__(self):
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.count += 1
+        self.sum += seconds
+        for index, bound in enumerate(buckets):
+            if seconds <= bound:
+                self.counts[index] += 1
+
+    def to_dict(self):
+        return {'count': self.count, 'sum': round(self.sum, 6), 'buckets': dict(zip(map(str, buckets), self.counts))}
+
+
+class Metrics:
+
+    """
+    Timing spans and per-command latency histograms of a single run, exported at the end of the run as json
+    and as a Prometheus textfile.
+
+        : param cluster_of : Optional function returning the cluster of a node, used to total the time per cluster.
+
+    Functions added to listeners are called as listener(node, name, seconds, ok) for every span, i.e. by the
+    adaptive limiter of the engine.
+
+    """
+
+    def __init__(self, cluster_of=None):
+        self.cluster_of = cluster_of
+        self.listeners = []
+        self.started = datetime.now()
+        self._start = time.monotonic()
+        self.spans = []
+        self.commands = {}
+        self.span_histograms = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f'Metrics({len(self.spans)} spans)'
+
+    def __str__(self):
+        return f'Metrics({len(self.spans)} spans)'
+
+
+    @contextmanager
+    def span(self, node, name, detail=''):
+
+        """
+        Context manager timing a step of the checks of a node. Spans that raise are recorded as failed.
+
+            : param node : The hostname or IP of the server.
+            : param name : The step, i.e. 'connect', 'auth', 'init_connect' or 'get_certs'.
+            : param detail : Optional detail, i.e. the command.
+
+        """
+
+        start = time.monotonic()
+        ok = False
+
+        try:
+            yield
+            ok = True
+
+        finally:
+            self.record(node, name, time.monotonic() - start, detail, ok, start)
+
+
+    def record(self, node, name, seconds, detail='', ok=True, start=None):
+
+        """
+        Records a span that was timed by the caller.
+
+        """
+
+        offset = (start if start is not None else time.monotonic() - seconds) - self._start
+
+        with self._lock:
+            self.spans.append((node, name, detail, round(offset, 6), round(seconds, 6), ok))
+            self.span_histograms.setdefault(name, Histogram()).observe(seconds)
+
+        for listener in self.listeners:
+            listener(node, name, seconds, ok)
+
+
+    def observe_command(self, node, cmd, seconds, ok=True):
+
+        """
+        Records the latency of a CLI command, both as a span and in the histogram of the command.
+
+            : param node : The hostname or IP of the server.
+            : param cmd : The CLI command.
+            : param seconds : Seconds from sending the command to reading its prompt.
+            : param ok : False when the command failed, i.e. no prompt before the timeout.
+
+        """
+
+        ## Commands with an argument, i.e. 'show cert own <name>', share the histogram of the bare command.
+        key = 'show cert own' if cmd.startswith('show cert own ') else cmd
+
+        self.record(node, 'cmd', seconds, cmd, ok)
+
+        with self._lock:
+            self.commands.setdefault(key, Histogram()).observe(seconds)
+
+
+    def merge(self, spans, commands):
+
+        """
+        Adds the spans and command histograms of another Metrics(), i.e. of a worker process.
+
+            : param spans : The spans of the other Metrics().
+            : param commands : Dict of (counts, count, sum) of its command histograms.
+
+        """
+
+        with self._lock:
+            for elem in spans:
+                self.spans.append(tuple(elem))
+                self.span_histograms.setdefault(elem[1], Histogram()).observe(elem[4])
+
+            for cmd, (counts, count, total) in commands.items():
+                histogram = self.commands.setdefault(cmd, Histogram())
+                histogram.counts = [a + b for a, b in zip(histogram.counts, counts)]
+                histogram.count += count
+                histogram.sum += total
+
+
+    def node_totals(self):
+
+        """
+        Returns a dict of the total seconds spent on each node, taken from the 'node' spans.
+
+        """
+
+        totals = {}
+        with self._lock:
+            for node, name, detail, offset, seconds, ok in self.spans:
+                if name == 'node':
+                    totals[node] = totals.get(node, 0) + seconds
+
+        return totals
+
+
+    def cluster_totals(self):
+
+        """
+        Returns a dict of the total node seconds spent on each cluster.
+
+        """
+
+        totals = {}
+        if self.cluster_of is None:
+            return totals
+
+        for node, seconds in self.node_totals().items():
+            try:
+                cluster = self.cluster_of(node)
+            except KeyError:
+                cluster = ''
+            totals[cluster] = totals.get(cluster, 0) + seconds
+
+        return totals
+
+
+    def to_dict(self):
+        node_totals = self.node_totals()
+        cluster_totals = self.cluster_totals()
+
+        with self._lock:
+            return {
+                'started': self.started.isoformat(timespec='seconds'),
+                'duration': round(time.monotonic() - self._start, 3),
+                'slowest_nodes': sorted(node_totals.items(), key=lambda elem: elem[1], reverse=True)[:slowest_nodes],
+                'clusters': cluster_totals,
+                'commands': {cmd: elem.to_dict() for cmd, elem in self.commands.items()},
+                'steps': {name: elem.to_dict() for name, elem in self.span_histograms.items()},
+                'spans': [dict(zip(('node', 'name', 'detail', 'offset', 'seconds', 'ok'), elem)) for elem in self.spans],
+            }
+
+
+    def export_json(self, path):
+
+        """
+        Writes the spans, histograms and per node and per cluster totals to a json file.
+
+            : param path : Path of the json file.
+
+        """
+
+        _write_atomic(path, json.dumps(self.to_dict(), indent=1))
+        logging.debug('## {} - {}.export_json({})'.format(__name__, self, path))
+
+
+    def export_prometheus(self, path):
+
+        """
+        Writes the histograms and totals in the Prometheus text format, for the node_exporter textfile collector.
+
+            : param path : Path of the .prom file.
+
+        """
+
+        lines = []
+
+        def _histogram(metric, label, histograms, help_text):
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} histogram')
+            for key, elem in sorted(histograms.items()):
+                value = _escape(key)
+                for bound, count in zip(buckets, elem.counts):
+                    lines.append(f'{metric}_bucket{{{label}="{value}",le="{bound}"}} {count}')
+                lines.append(f'{metric}_bucket{{{label}="{value}",le="+Inf"}} {elem.count}')
+                lines.append(f'{metric}_sum{{{label}="{value}"}} {elem.sum:.6f}')
+                lines.append(f'{metric}_count{{{label}="{value}"}} {elem.count}')
+
+        with self._lock:
+            commands = dict(self.commands)
+            steps = dict(self.span_histograms)
+
+        _histogram('uc_checks_command_duration_seconds', 'command', commands, 'Latency of each CLI command.')
+        _histogram('uc_checks_step_duration_seconds', 'step', steps, 'Duration of connect, auth, init_connect, cmd and check steps.')
+
+        lines.append('# HELP uc_checks_cluster_seconds Total node seconds spent on each cluster.')
+        lines.append('# TYPE uc_checks_cluster_seconds gauge')
+        for cluster, seconds in sorted(self.cluster_totals().items()):
+            lines.append(f'uc_checks_cluster_seconds{{cluster="{_escape(cluster)}"}} {seconds:.6f}')
+
+        lines.append('# HELP uc_checks_run_duration_seconds Duration of the last run.')
+        lines.append('# TYPE uc_checks_run_duration_seconds gauge')
+        lines.append(f'uc_checks_run_duration_seconds {time.monotonic() - self._start:.3f}')
+
+        lines.append('# HELP uc_checks_last_run_timestamp_seconds Start time of the last run.')
+        lines.append('# TYPE uc_checks_last_run_timestamp_seconds gauge')
+        lines.append(f'uc_checks_last_run_timestamp_seconds {self.started.timestamp():.0f}')
+
+        _write_atomic(path, '\n'.join(lines) + '\n')
+        logging.debug('## {} - {}.export_prometheus({})'.format(__name__, self, path))
+
+
+class NullMetrics:
+
+    """
+    Stand-in used when no Metrics() is given, records nothing.
+
+    """
+
+    @contextmanager
+    def span(self, node, name, detail=''):
+        yield
+
+    def record(self, node, name, seconds, detail='', ok=True, start=None):
+        pass
+
+    def observe_command(self, node, cmd, seconds, ok=True):
+        pass
+
+
+null_metrics = NullMetrics()
+
+
+##############################################################################################
+# Functions
+##############################################################################################
+
+def timed(name):
+
+    """
+    Decorator timing a method of SSHConnect() or SSHConnectExp() as a span of its node, using the
+    instance's metrics attribute.
+
+        : param name : The name of the span.
+
+    """
+
+    def decorator(func):
+
+        @functools.wraps(func)
+        def inner(self, *args, **kwargs):
+            with self.metrics.span(self.node, name):
+                return func(self, *args, **kwargs)
+
+        return inner
+
+    return decorator
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _write_atomic(path, text):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
@@ -0,0 +1,345 @@
+##############################################################################################
+# modules
+##############################################################################################
+
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from ucm_cli import open_session, parse_services, parse_status
+
+
+##############################################################################################
+# Global Variables & Config
+##############################################################################################
+
+## Seconds between polls of a node, and the number of nodes polled at the same time.
+poll_interval = 30
+
+monitor_workers = 50
+
+## Failed polls in a row before a node is reported unreachable, so a single dropped session is not an event.
+unreachable_after = 2
+
+## CPU usage in percent above which a node is reported busy.
+cpu_percent = 90
+
+## Commands polled on every node, sent together in one round trip.
+poll_commands = ['utils service list', 'show status']
+
+## Event kinds.
+SERVICE_STOPPED = 'service_stopped'
+SERVICE_STARTED = 'service_started'
+NODE_UNREACHABLE = 'node_unreachable'
+NODE_REACHABLE = 'node_reachable'
+NODE_RESTARTED = 'node_restarted'
+CPU_HIGH = 'cpu_high'
+CPU_NORMAL = 'cpu_normal'
+
+
+##############################################################################################
+# Functions
+##############################################################################################
+
+def uptime_minutes(uptime):
+
+    """
+    Returns the uptime returned by parse_uptime() in minutes.
+
+        : param uptime : The (uptime, unit) tuple, the unit being 'day', 'days', 'min' or 'hours' for 'hh:mm'.
+
+    """
+
+    value, unit = uptime
+
+    if unit in ('day', 'days'):
+        return int(value) * 1440
+    if unit == 'min':
+        return int(value)
+
+    hours, minutes = value.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+def format_event(event):
+    line = event.timestamp.strftime('%Y-%m-%d %H:%M:%S') + ' ' + event.node + ': ' + event.kind
+    if event.item:
+        line += ' ' + event.item
+    if event.old is not None or event.new is not None:
+        line += ' (' + str(event.old) + ' -> ' + str(event.new) + ')'
+    return line
+
+
+##############################################################################################
+# Classes
+##############################################################################################
+
+class Event:
+
+    """
+    A change of state of a node seen by the Monitor().
+
+        : param node : The hostname or IP of the server.
+        : param kind : What changed, i.e. SERVICE_STOPPED.
+        : param item : What the change is about within the node, i.e. the service name. Empty for the node itself.
+        : param old : The state before the change.
+        : param new : The state after the change.
+
+    """
+
+    __slots__ = ('node', 'kind', 'item', 'old', 'new', 'timestamp')
+
+    def __init__(self, node, kind, item='', old=None, new=None, timestamp=None):
+        self.node = node
+        self.kind = kind
+        self.item = item
+        self.old = old
+        self.new = new
+        self.timestamp = timestamp or datetime.now()
+
+    def __repr__(self):
+        return f'Event("{self.node}", "{self.kind}", "{self.item}", {self.old!r}, {self.new!r})'
+
+    def __str__(self):
+        return f'Event("{self.node}", "{self.kind}", "{self.item}", {self.old!r}, {self.new!r})'
+
+
+    def to_dict(self):
+        return {
+            'node': self.node,
+            'kind': self.kind,
+            'item': self.item,
+            'old': self.old,
+            'new': self.new,
+            'timestamp': self.timestamp.isoformat(timespec='seconds'),
+        }
+
+
+class NodeState:
+
+    """
+    What the Monitor() last saw on a node. services and uptime are None until the first successful poll.
+
+    """
+
+    __slots__ = ('services', 'uptime', 'cpu_high', 'reachable', 'failures')
+
+    def __init__(self):
+        self.services = None
+        self.uptime = None
+        self.cpu_high = False
+        self.reachable = None
+        self.failures = 0
+
+    def __repr__(self):
+        return f'NodeState(reachable={self.reachable}, failures={self.failures})'
+
+    def __str__(self):
+        return f'NodeState(reachable={self.reachable}, failures={self.failures})'
+
+
+class Monitor:
+
+    """
+    Polls the services and status of every UCM, IM&P and CUC node on a short interval over sessions it keeps open,
+    and reports only what changed since the previous poll: a service stopping or starting, a node becoming
+    unreachable or reachable again, restarting, or its CPU crossing cpu_percent.
+    The state of the nodes is only kept in memory, so the first poll after a start sets the baseline without events.
+    Functions added to listeners are called with the list of events of each round that has any.
+
+        : param inventory : The Inventory() loaded from the infrastructure.csv.
+        : param interval : Seconds between polls of a node.
+        : param workers : Number of nodes polled at the same time.
+        : param factory : Function opening a session, called as factory(node, username, password, port, address).
+
+    """
+
+    def __init__(self, inventory, interval=poll_interval, workers=monitor_workers, factory=open_session):
+        self.inventory = inventory
+        self.interval = interval
+        self.factory = factory
+        self.listeners = []
+        self.states = {}
+        self.sessions = {}
+        self.rounds = 0
+        self._pending = []
+        self._busy = set()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='monitor')
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f'Monitor({len(self.sessions)} sessions, {self.rounds} rounds)'
+
+    def __str__(self):
+        return f'Monitor({len(self.sessions)} sessions, {self.rounds} rounds)'
+
+
+    def poll(self, node):
+
+        """
+        Polls a node once and returns the events of what changed since its previous poll.
+
+            : param node : The hostname or IP of the server.
+
+        """
+
+        state = self.states.setdefault(node, NodeState())
+        events = []
+
+        try:
+            session = self.sessions.get(node)
+            if session is None:
+                row = self.inventory[node]
+                session = self.factory(node, row['username'], row['password'], int(row.get('port') or 22), row.get('address') or None)
+                self.sessions[node] = session
+
+            session.prefetch(poll_commands)
+            services = {elem.name: elem for elem in parse_services(session.iter_cmd('utils service list'))}
+            status = parse_status(list(session.iter_cmd('show status')))
+
+        except Exception as e:
+            logging.debug('## {} - {}.poll({}) -- EXCEPTION -- {}'.format(__name__, self, node, e))
+            self._close(node)
+
+            state.failures += 1
+            if state.failures >= unreachable_after and state.reachable is not False:
+                state.reachable = False
+                events.append(Event(node, NODE_UNREACHABLE, '', None, str(e)))
+
+            return events
+
+        if state.reachable is False:
+            events.append(Event(node, NODE_REACHABLE))
+        state.reachable = True
+        state.failures = 0
+
+        ## Services, only the records that differ from the previous poll are looked at.
+        if state.services is not None:
+            changed = set(state.services.values()) ^ set(services.values())
+
+            for name in sorted({elem.name for elem in changed}):
+                old, new = state.services.get(name), services.get(name)
+                if new is None or (old is not None and old.state == new.state):
+                    continue
+
+                if new.stopped and new.activated and (old is None or not old.stopped):
+                    events.append(Event(node, SERVICE_STOPPED, name, old and old.state, f'{new.state} {new.reason}'.strip()))
+                elif new.state == 'STARTED' and old is not None and old.state != 'STARTED':
+                    events.append(Event(node, SERVICE_STARTED, name, old.state, new.state))
+
+        state.services = services
+
+        ## Restarts show as the uptime going down.
+        uptime = uptime_minutes(status['uptime'])
+        if state.uptime is not None and uptime < state.uptime:
+            events.append(Event(node, NODE_RESTARTED, '', state.uptime, uptime))
+        state.uptime = uptime
+
+        ## CPU
+        if status['cpu_idle'] is not None:
+            used = round(100 - status['cpu_idle'], 1)
+            cpu_high = used >= cpu_percent
+            if cpu_high != state.cpu_high:
+                events.append(Event(node, CPU_HIGH if cpu_high else CPU_NORMAL, '', None, used))
+            state.cpu_high = cpu_high
+
+        return events
+
+
+    def poll_round(self):
+
+        """
+        Starts a poll of every UCM node whose previous poll has finished, and hands the events gathered since the
+        last round to the listeners. A node that is slow to answer only delays its own next poll.
+
+        """
+
+        with self._lock:
+            events, self._pending = self._pending, []
+
+        self.rounds += 1
+
+        if events:
+            logging.info('## {} - {}.poll_round() -- {} EVENTS'.format(__name__, self, len(events)))
+            for listener in self.listeners:
+                try:
+                    listener(events)
+                except Exception as e:
+                    logging.info('## {} - {}.poll_round() -- LISTENER EXCEPTION -- {}'.format(__name__, self, e))
+
+        for row in self.inventory.ucm_nodes:
+            node = row['hostname']
+
+            with self._lock:
+                if node in self._busy:
+                    continue
+                self._busy.add(node)
+
+            self._executor.submit(self._poll, node)
+
+
+    def _poll(self, node):
+        try:
+            events = self.poll(node)
+        except Exception as e:
+            logging.info('## {} - {}._poll({}) -- EXCEPTION -- {}'.format(__name__, self, node, e))
+            events = []
+
+        with self._lock:
+            self._busy.discard(node)
+            self._pending.extend(events)
+
+
+    def run_forever(self):
+
+        """
+        Polls every interval seconds until stop() is called or the loop is interrupted, then closes the sessions.
+
+        """
+
+        logging.info('## {} - {}.run_forever() -- MONITORING {} NODES EVERY {}s'.format(__name__, self, len(self.inventory.ucm_nodes), self.interval))
+
+        next_round = time.monotonic()
+
+        try:
+            while not self._stop.is_set():
+                self.poll_round()
+
+                ## A round that started late moves the following ones instead of starting them back to back.
+                next_round = max(next_round + self.interval, time.monotonic())
+                self._stop.wait(next_round - time.monotonic())
+
+        finally:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+            for node in list(self.sessions):
+                self._close(node)
+
+
+    def stop(self):
+        self._stop.set()
+
+
+    def _close(self, node):
+        session = self.sessions.pop(node, None)
+        if session is None:
+            return
+
+        try:
+            session.close_ssh()
+        except Exception as e:
+            logging.debug('## {} - {}._close({}) -- EXCEPTION -- {}'.format(__name__, self, node, e))
+
+
+##############################################################################################
+# Run
+##############################################################################################
+
+if __name__ == '__main__':
+
+    format = "%(asctime)s: %(message)s"
+    logging.basicConfig(format=format, level=logging.DEBUG, datefmt="%H:%M:%S")
+
+    pass
@@ -0,0 +1,204 @@
+##############################################################################################
+# modules
+##############################################################################################
+
+import logging
+from results import UNKNOWN
+
+
+##############################################################################################
+# Global Variables & Config
+##############################################################################################
+
+## Value of the UNKNOWN record written when a check fails, formatted with the exception as e.
+default_error = 'An exception occurred. Check node manually'
+
+
+##############################################################################################
+# Classes
+##############################################################################################
+
+class Check:
+
+    """
+    A check declared by the command it reads, a parser of the command's output and an evaluation of the parsed
+    output against thresholds.
+
+        : param name : The name of the check, also the check name of its records, i.e. HIGH_UPTIME.
+        : param command : The CLI command whose output the check reads.
+        : param parse : Function called as parse(lines, ctx) returning the parsed output. Checks sharing a command
+                        and a parser share the parsed output too.
+        : param evaluate : Function called as evaluate(parsed, thresholds) returning a list of findings as
+                           (severity, value, item) tuples, empty when the node passes.
+        : param thresholds : Dict of the limits passed to evaluate.
+        : param applies : Optional function called with the inventory row, the check is skipped when it returns False.
+        : param error : Value of the UNKNOWN record written when the check fails, formatted with the exception as e.
+
+    """
+
+    __slots__ = ('name', 'command', 'parse', 'evaluate', 'thresholds', 'applies', 'error')
+
+    def __init__(self, name, command, parse, evaluate, thresholds=None, applies=None, error=default_error):
+        self.name = name
+        self.command = command
+        self.parse = parse
+        self.evaluate = evaluate
+        self.thresholds = thresholds or {}
+        self.applies = applies
+        self.error = error
+
+    def __repr__(self):
+        return f'Check("{self.name}", "{self.command}")'
+
+    def __str__(self):
+        return f'Check("{self.name}", "{self.command}")'
+
+
+class CheckContext:
+
+    """
+    What a parser may need besides the output lines, i.e. the session to run follow-up commands on.
+
+        : param node : The hostname or IP of the server.
+        : param row : The inventory row of the node.
+        : param conn : The session the checks run on.
+        : param cert_cache : Optional CertCache().
+        : param baseline : Optional ServiceBaseline(), defaults to the shared service_baseline.
+
+    """
+
+    __slots__ = ('node', 'row', 'conn', 'cert_cache', 'baseline')
+
+    def __init__(self, node, row, conn, cert_cache=None, baseline=None):
+        self.node = node
+        self.row = row
+        self.conn = conn
+        self.cert_cache = cert_cache
+        self.baseline = baseline
+
+    def __repr__(self):
+        return f'CheckContext("{self.node}")'
+
+    def __str__(self):
+        return f'CheckContext("{self.node}")'
+
+
+class CheckRegistry:
+
+    """
+    The checks run on a type of node. Each distinct command is run once per node, all of them in one pipelined
+    round trip, and its output is handed to every check that reads it.
+
+    """
+
+    def __init__(self):
+        self.checks = []
+
+    def __repr__(self):
+        return f'CheckRegistry({len(self.checks)} checks)'
+
+    def __str__(self):
+        return f'CheckRegistry({len(self.checks)} checks)'
+
+    def __iter__(self):
+        return iter(self.checks)
+
+    def __len__(self):
+        return len(self.checks)
+
+
+    def register(self, name, command, parse, evaluate, thresholds=None, applies=None, error=default_error):
+
+        """
+        Adds a check and returns it. See Check() for the parameters.
+
+        """
+
+        check = Check(name, command, parse, evaluate, thresholds, applies, error)
+        self.checks.append(check)
+
+        return check
+
+
+    def for_row(self, row, names=None):
+
+        """
+        Returns the checks that apply to the node of an inventory row.
+
+            : param row : The inventory row of the node.
+            : param names : Optional names of the checks to keep, i.e. only those due on a shorter cadence.
+
+        """
+
+        return [elem for elem in self.checks
+                if (names is None or elem.name in names) and (elem.applies is None or elem.applies(row))]
+
+
+    @staticmethod
+    def commands(checks):
+
+        """
+        Returns the distinct commands of the checks, in the order of the checks.
+
+        """
+
+        return list(dict.fromkeys(elem.command for elem in checks))
+
+
+    def run(self, ctx, collector, metrics, names=None):
+
+        """
+        Runs the checks that apply to the node on its session and records their findings to the collector.
+        A failing command or parser only fails the checks that depend on it, each with an UNKNOWN record.
+
+            : param ctx : The CheckContext() of the node.
+            : param collector : The ResultCollector() of the run.
+            : param metrics : The Metrics() the time of each check is recorded to.
+            : param names : Optional names of the checks to run, all of them by default.
+
+        """
+
+        checks = self.for_row(ctx.row, names)
+        ctx.conn.prefetch(self.commands(checks))
+
+        outputs = {}
+        parsed = {}
+
+        for check in checks:
+            try:
+                with metrics.span(ctx.node, check.name):
+                    key = (check.command, check.parse)
+
+                    if key not in parsed:
+                        try:
+                            parsed[key] = check.parse(self._output(ctx.conn, check.command, outputs), ctx)
+                        except Exception as e:
+                            parsed[key] = e
+
+                    if isinstance(parsed[key], Exception):
+                        raise parsed[key]
+
+                    findings = check.evaluate(parsed[key], check.thresholds)
+
+                logging.debug('## {} - {}.run({}) -- {} -- {}'.format(__name__, self, ctx.node, check.name, findings))
+
+                for severity, value, item in findings:
+                    collector.add(ctx.node, check.name, severity, value, item)
+
+            except Exception as e:
+                logging.debug('## {} - {}.run({}) -- {} -- EXCEPTION -- {}'.format(__name__, self, ctx.node, check.name, e))
+                collector.add(ctx.node, check.name, UNKNOWN, check.error.format(e=e))
+
+
+    @staticmethod
+    def _output(conn, cmd, outputs):
+        if cmd not in outputs:
+            try:
+                outputs[cmd] = list(conn.iter_cmd(cmd))
+            except Exception as e:
+                outputs[cmd] = e
+
+        if isinstance(outputs[cmd], Exception):
+            raise outputs[cmd]
+
+        return outputs[cmd]
@@ -0,0 +1,233 @@
+##############################################################################################
+# modules
+##############################################################################################
+
+import os
+import threading
+import logging
+import results
+from results import UNKNOWN
+
+
+##############################################################################################
+# Functions
+##############################################################################################
+
+def _format_stopped_service(record):
+    return record.node + ': ' + record.item + (', ' + str(record.value) if record.value else '')
+
+
+def _format_expiring_cert(record):
+    return record.node + ': ' + record.item + ', ' + str(record.value)
+
+
+def _format_failed_backup(record):
+    last_backup, days_since = record.value
+    return record.node + ': Last successful backp = ' + str(last_backup) + ', Days since last backup = ' + str(days_since)
+
+
+def _format_high_uptime(record):
+    return record.node + ': ' + str(record.value) + ' days'
+
+
+def _format_usage(record):
+    return record.node + ': ' + (record.item + ' ' if record.item else '') + str(record.value) + '% used'
+
+
+def _format_exp_alarms(record):
+    alarm = record.value
+    line = record.node + ': ' + alarm['id'] + ' ' + alarm['title'] + ', ' + alarm['level'] + ', ' + alarm['state']
+    if alarm['peer'] != 'This system':
+        line += ', raised by ' + alarm['peer']
+    return line
+
+
+def _format_default(record):
+    return record.node + ': ' + str(record.value)
+
+
+## The report sections in the order they are written, as (check, title, formatter).
+sections = [
+    (results.NOT_RESPONDING, 'NODES NOT RESPONDING', _format_default),
+    (results.TIMED_OUT, 'NODES TIMED OUT', _format_default),
+    (results.STOPPED_SERVICE, 'UCM NODES WITH STOPPED SERVICES', _format_stopped_service),
+    (results.EXPIRING_CERT, 'UCM NODES WITH EXPIRING CERTS', _format_expiring_cert),
+    (results.FAILED_BACKUP, 'UCM NODES WITH FAILED BACKUPS', _format_failed_backup),
+    (results.HIGH_UPTIME, 'UCM NODES WITH UPTIME >180 DAYS', _format_high_uptime),
+    (results.HIGH_CPU, 'UCM NODES WITH HIGH CPU', _format_usage),
+    (results.HIGH_MEMORY, 'UCM NODES WITH HIGH MEMORY', _format_usage),
+    (results.HIGH_DISK, 'UCM NODES WITH FULL DISKS', _format_usage),
+    (results.EXP_ALARMS, 'EXPRESSWAY NODES WITH ALARMS', _format_exp_alarms),
+]
+
+
+def format_record(record, formatter):
+
+    """
+    Returns the report line of a record. Records of checks that failed to run are written with their error.
+
+        : param record : A CheckResult().
+        : param formatter : The formatter of the record's section.
+
+    """
+
+    if record.severity == UNKNOWN:
+        return _format_default(record)
+
+    return formatter(record)
+
+
+def _render_section(title, lines):
+    return [title + '\n', '='*len(title) + '\n'] + [elem + '\n' for elem in lines] + ['\n\n']
+
+
+def _render_sections(records, skip_empty=False):
+    lines = []
+
+    for check, title, formatter in sections:
+        section = sorted((elem for elem in records if elem.check == check), key=lambda elem: (elem.node, elem.item))
+        if skip_empty and not section:
+            continue
+
+        lines.extend(_render_section(title, [format_record(elem, formatter) for elem in section]))
+
+    return lines
+
+
+def render_text(collector):
+
+    """
+    Returns the plain text report of a run, one section per check.
+
+        : param collector : The ResultCollector() of the run.
+
+    """
+
+    return ''.join(_render_sections(list(collector)))
+
+
+def render_changes(changes):
+
+    """
+    Returns the plain text report of what changed since the previous run, with the new, resolved and still
+    open findings under their own headings, and the findings of the nodes that could not be checked this time
+    under theirs. Empty sections are left out.
+
+        : param changes : The dict returned by ResultsDB.diff().
+
+    """
+
+    lines = []
+
+    for key, title in (('new', 'NEW SINCE THE LAST RUN'), ('resolved', 'RESOLVED SINCE THE LAST RUN'), ('open', 'STILL OPEN'),
+                       ('unverified', 'OPEN, NODE NOT CHECKED THIS RUN')):
+        if key not in changes:
+            continue
+
+        heading = title + ' (' + str(len(changes[key])) + ')'
+        lines.append('#'*len(heading) + '\n')
+        lines.append(heading + '\n')
+        lines.append('#'*len(heading) + '\n\n')
+        lines.extend(_render_sections(changes[key], skip_empty=True))
+
+    return ''.join(lines)
+
+
+##############################################################################################
+# Classes
+##############################################################################################
+
+class StreamingReport:
+
+    """
+    Renders each finding into its report section as soon as it is recorded, so the report is ready when the last
+    node finishes. Add its add() to the listeners of the run's ResultCollector().
+    With a journal path every line is also appended and flushed to that file as it is rendered, so the findings
+    of a run that crashes are not lost. The file is only ever appended to, never read back. Records added after
+    close(), i.e. by a node that outlived the run, are ignored so the journal is not opened again.
+
+        : param journal : Optional path of the file the lines are appended to.
+
+    """
+
+    def __init__(self, journal=None):
+        self.journal = journal
+        self._sections = {check: [] for check, title, formatter in sections}
+        self._titles = {check: (title, formatter) for check, title, formatter in sections}
+        self._file = None
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f'StreamingReport({sum(len(elem) for elem in self._sections.values())} lines)'
+
+    def __str__(self):
+        return f'StreamingReport({sum(len(elem) for elem in self._sections.values())} lines)'
+
+
+    def add(self, record):
+
+        """
+        Renders a record into its section, and appends the line to the journal.
+
+            : param record : A CheckResult().
+
+        """
+
+        if record.check not in self._titles:
+            return
+
+        title, formatter = self._titles[record.check]
+        line = format_record(record, formatter)
+
+        with self._lock:
+            if self._closed:
+                return
+
+            self._sections[record.check].append((record.node, record.item, line))
+
+            if self.journal is None:
+                return
+
+            try:
+                if self._file is None:
+                    self._file = open(self.journal, 'a', buffering=1)
+                self._file.write(title + ' | ' + line + '\n')
+            except OSError as e:
+                logging.debug('## {} - {}.add() -- JOURNAL FAILED -- {}'.format(__name__, self, e))
+
+
+    def render(self):
+
+        """
+        Returns the plain text report, the same as render_text() of the collector the records were added to.
+
+        """
+
+        lines = []
+
+        with self._lock:
+            for check, title, formatter in sections:
+                lines.extend(_render_section(title, [elem[2] for elem in sorted(self._sections[check])]))
+
+        return ''.join(lines)
+
+
+    def close(self, remove=False):
+
+        """
+        Closes the journal, removing it once the report has been sent.
+
+            : param remove : True to delete the journal file.
+
+        """
+
+        with self._lock:
+            self._closed = True
+
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+            if remove and self.journal is not None and os.path.exists(self.journal):
+                os.remove(self.journal)
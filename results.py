@@ -0,0 +1,209 @@
+##############################################################################################
+# modules
+##############################################################################################
+
+import csv
+import json
+import threading
+import logging
+from datetime import datetime
+
+
+##############################################################################################
+# Global Variables & Config
+##############################################################################################
+
+## Severities, from the most to the least serious.
+CRITICAL = 'critical'
+WARNING = 'warning'
+UNKNOWN = 'unknown'
+
+## Check names.
+NOT_RESPONDING = 'not_responding'
+TIMED_OUT = 'timed_out'
+STOPPED_SERVICE = 'stopped_service'
+EXPIRING_CERT = 'expiring_cert'
+FAILED_BACKUP = 'failed_backup'
+HIGH_UPTIME = 'high_uptime'
+HIGH_CPU = 'high_cpu'
+HIGH_MEMORY = 'high_memory'
+HIGH_DISK = 'high_disk'
+EXP_ALARMS = 'exp_alarms'
+
+
+##############################################################################################
+# Classes
+##############################################################################################
+
+class CheckResult:
+
+    """
+    A single finding of a check on a node.
+
+        : param node : The hostname or IP of the server.
+        : param check : The name of the check, i.e. STOPPED_SERVICE.
+        : param severity : CRITICAL, WARNING or UNKNOWN when the check itself failed.
+        : param value : The value the check found, i.e. the days of uptime or the cert expiry date.
+        : param item : What the finding is about within the node, i.e. the service or cert name. Empty for
+                       findings about the node as a whole.
+        : param timestamp : When the finding was recorded. Defaults to now.
+
+    """
+
+    __slots__ = ('node', 'check', 'severity', 'value', 'item', 'timestamp')
+
+    def __init__(self, node, check, severity, value=None, item='', timestamp=None):
+        self.node = node
+        self.check = check
+        self.severity = severity
+        self.value = value
+        self.item = item
+        self.timestamp = timestamp or datetime.now()
+
+    def __repr__(self):
+        return f'CheckResult("{self.node}", "{self.check}", "{self.severity}", {self.value!r}, "{self.item}")'
+
+    def __str__(self):
+        return f'CheckResult("{self.node}", "{self.check}", "{self.severity}", {self.value!r}, "{self.item}")'
+
+
+    def to_dict(self):
+        return {
+            'node': self.node,
+            'check': self.check,
+            'severity': self.severity,
+            'value': self.value,
+            'item': self.item,
+            'timestamp': self.timestamp.isoformat(timespec='seconds'),
+        }
+
+
+class ResultCollector:
+
+    """
+    Collects the CheckResult() records of a single run. Each run owns its collector, records can be added
+    from any worker thread.
+    Functions added to listeners are called with every new record as it is added, i.e. by the streaming report.
+    The thread of a timed out node keeps running after the engine gave up on it, so once a node has a TIMED_OUT
+    record its later records are dropped, and once the collector is closed every record is.
+
+    """
+
+    def __init__(self):
+        self.listeners = []
+        self.started = datetime.now()
+        self.timed_out = set()
+        self.closed = False
+        self._records = []
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f'ResultCollector({len(self._records)} records)'
+
+    def __str__(self):
+        return f'ResultCollector({len(self._records)} records)'
+
+    def __len__(self):
+        return len(self._records)
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._records))
+
+
+    def add(self, node, check, severity, value=None, item='', timestamp=None):
+
+        """
+        Records a finding and returns the new CheckResult(), or None when it came too late and was dropped.
+
+            : param node : The hostname or IP of the server.
+            : param check : The name of the check.
+            : param severity : CRITICAL, WARNING or UNKNOWN.
+            : param value : The value the check found.
+            : param item : What the finding is about within the node.
+            : param timestamp : When the finding was recorded, i.e. by a worker process. Defaults to now.
+
+        """
+
+        record = CheckResult(node, check, severity, value, item, timestamp)
+
+        with self._lock:
+            if self.closed or node in self.timed_out:
+                logging.debug('## {} - {}.add({}, {}) -- TOO LATE, DROPPED'.format(__name__, self, node, check))
+                return None
+
+            if check == TIMED_OUT: self.timed_out.add(node)
+            self._records.append(record)
+
+        for listener in self.listeners:
+            listener(record)
+
+        return record
+
+
+    def close(self):
+
+        """
+        Stops the collector taking records, once the run is over.
+
+        """
+
+        with self._lock:
+            self.closed = True
+
+
+    def by_check(self, check):
+
+        """
+        Returns the records of a check sorted by node and item.
+
+            : param check : The name of the check.
+
+        """
+
+        return sorted((elem for elem in self if elem.check == check), key=lambda elem: (elem.node, elem.item))
+
+
+    def by_node(self, node):
+
+        """
+        Returns the records of a node.
+
+            : param node : The hostname or IP of the server.
+
+        """
+
+        return [elem for elem in self if elem.node == node]
+
+
+    def to_dicts(self):
+        return [elem.to_dict() for elem in self]
+
+
+    def export_json(self, path):
+
+        """
+        Writes every record to a json file.
+
+            : param path : Path of the json file.
+
+        """
+
+        with open(path, 'w') as f:
+            json.dump(self.to_dicts(), f, indent=1, default=str)
+
+
+    def export_csv(self, path):
+
+        """
+        Writes every record to a csv file.
+
+            : param path : Path of the csv file.
+
+        """
+
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=CheckResult.__slots__)
+            writer.writeheader()
+            for elem in self.to_dicts():
+                writer.writerow(elem)
@@ -0,0 +1,189 @@
+##############################################################################################
+# modules
+##############################################################################################
+
+import json
+import sqlite3
+import logging
+from datetime import datetime
+from results import CheckResult, NOT_RESPONDING, TIMED_OUT
+
+
+##############################################################################################
+# Global Variables & Config
+##############################################################################################
+
+schema = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started TEXT NOT NULL,
+    finished TEXT NOT NULL,
+    source TEXT NOT NULL DEFAULT 'scheduled'
+);
+CREATE TABLE IF NOT EXISTS findings (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    node TEXT NOT NULL,
+    check_name TEXT NOT NULL,
+    item TEXT NOT NULL,
+    severity TEXT NOT NULL,
+    value TEXT,
+    timestamp TEXT NOT NULL,
+    carried INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS findings_key ON findings (run_id, node, check_name, item);
+'''
+
+## Columns added after the first release, added to older databases when they are opened.
+_migrations = [
+    ('runs', 'source', "ALTER TABLE runs ADD COLUMN source TEXT NOT NULL DEFAULT 'scheduled'"),
+    ('findings', 'carried', 'ALTER TABLE findings ADD COLUMN carried INTEGER NOT NULL DEFAULT 0'),
+]
+
+## Checks recording that a node could not be checked, its other findings of the previous run are then carried over.
+_unchecked = (NOT_RESPONDING, TIMED_OUT)
+
+## Rows of the current run that do (open) or don't (new) have a matching finding in the previous run.
+_compare_query = '''
+SELECT cur.node, cur.check_name, cur.severity, cur.value, cur.item, cur.timestamp
+FROM findings AS cur
+WHERE cur.run_id = :current AND cur.carried IN ({}) AND {} EXISTS (
+    SELECT 1 FROM findings AS prev
+    WHERE prev.run_id = :previous AND prev.node = cur.node AND prev.check_name = cur.check_name AND prev.item = cur.item
+)
+'''
+
+
+##############################################################################################
+# Classes
+##############################################################################################
+
+class ResultsDB:
+
+    """
+    Local SQLite store of the findings of every run, used to report only what changed since the previous run.
+    A finding is identified by its node, check and item, so a cert or service that is still failing is
+    'open' even if its value, i.e. the days to expiry, has moved on.
+    When a node is not responding or times out, its findings of the previous run are carried over into the run as
+    unverified, instead of showing as resolved and then as new again once the node answers.
+    Runs are tagged with their source, i.e. 'scheduled' or 'manual', and only compared with runs of the same source.
+
+        : param path : Path to the SQLite database file.
+
+    """
+
+    def __init__(self, path='results.db'):
+        self.path = path
+
+        with self._connect() as db:
+            db.executescript(schema)
+
+            for table, column, statement in _migrations:
+                if column not in [row[1] for row in db.execute(f'PRAGMA table_info({table})')]:
+                    db.execute(statement)
+
+    def __repr__(self):
+        return f'ResultsDB("{self.path}")'
+
+    def __str__(self):
+        return f'ResultsDB("{self.path}")'
+
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+
+    def save_run(self, collector, source='scheduled'):
+
+        """
+        Saves the findings of a run and returns the id of the run. The nodes that were not responding or timed
+        out keep their other findings of the previous run of the same source, saved as carried.
+
+            : param collector : The ResultCollector() of the run.
+            : param source : What started the run, runs are only compared with runs of the same source.
+
+        """
+
+        unchecked = sorted({elem.node for elem in collector if elem.check in _unchecked})
+
+        with self._connect() as db:
+            previous = db.execute('SELECT MAX(id) FROM runs WHERE source = ?', (source,)).fetchone()[0]
+
+            cursor = db.execute('INSERT INTO runs (started, finished, source) VALUES (?, ?, ?)',
+                                (collector.started.isoformat(timespec='seconds'), datetime.now().isoformat(timespec='seconds'), source))
+            run_id = cursor.lastrowid
+
+            db.executemany('INSERT INTO findings (run_id, node, check_name, item, severity, value, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?)', [
+                (run_id, elem.node, elem.check, elem.item, elem.severity, json.dumps(elem.value, default=str),
+                 elem.timestamp.isoformat(timespec='seconds'))
+                for elem in collector
+            ])
+
+            if previous is not None and unchecked:
+                db.executemany('''
+                    INSERT INTO findings (run_id, node, check_name, item, severity, value, timestamp, carried)
+                    SELECT :current, prev.node, prev.check_name, prev.item, prev.severity, prev.value, prev.timestamp, 1
+                    FROM findings AS prev
+                    WHERE prev.run_id = :previous AND prev.node = :node AND prev.check_name NOT IN (:not_responding, :timed_out)
+                    AND NOT EXISTS (
+                        SELECT 1 FROM findings AS cur
+                        WHERE cur.run_id = :current AND cur.node = prev.node AND cur.check_name = prev.check_name AND cur.item = prev.item
+                    )
+                ''', [{'current': run_id, 'previous': previous, 'node': node, 'not_responding': NOT_RESPONDING, 'timed_out': TIMED_OUT}
+                      for node in unchecked])
+
+        logging.debug('## {} - {}.save_run() -- RUN {} -- {} FINDINGS'.format(__name__, self, run_id, len(collector)))
+        return run_id
+
+
+    def previous_run(self, run_id):
+
+        """
+        Returns the id of the run of the same source before run_id, or None if it is the first one.
+
+            : param run_id : The id of a run.
+
+        """
+
+        with self._connect() as db:
+            row = db.execute('SELECT MAX(id) FROM runs WHERE id < ? AND source = (SELECT source FROM runs WHERE id = ?)',
+                             (run_id, run_id)).fetchone()
+
+        return row[0]
+
+
+    def diff(self, run_id):
+
+        """
+        Compares a run with the one before it and returns a dict of CheckResult() lists:
+        'new' findings, findings still 'open' since the previous run, 'unverified' findings carried over from the
+        previous run for the nodes that could not be checked, and 'resolved' findings of the previous run.
+
+            : param run_id : The id of the run to report on.
+
+        """
+
+        previous = self.previous_run(run_id)
+        params = {'current': run_id, 'previous': previous if previous is not None else -1}
+
+        with self._connect() as db:
+            new = db.execute(_compare_query.format('0', 'NOT'), params).fetchall()
+            still_open = db.execute(_compare_query.format('0', ''), params).fetchall()
+            unverified = db.execute(_compare_query.format('1', ''), params).fetchall()
+
+            ## Resolved findings are the previous run's findings missing from this one, so the roles are swapped.
+            resolved = db.execute(_compare_query.format('0, 1', 'NOT'), {'current': params['previous'], 'previous': run_id}).fetchall()
+
+        logging.debug('## {} - {}.diff({}) -- {} NEW, {} OPEN, {} UNVERIFIED, {} RESOLVED'.format(__name__, self, run_id, len(new), len(still_open), len(unverified), len(resolved)))
+
+        return {
+            'new': [self._to_result(row) for row in new],
+            'open': [self._to_result(row) for row in still_open],
+            'unverified': [self._to_result(row) for row in unverified],
+            'resolved': [self._to_result(row) for row in resolved],
+        }
+
+
+    @staticmethod
+    def _to_result(row):
+        node, check, severity, value, item, timestamp = row
+        return CheckResult(node, check, severity, json.loads(value), item, datetime.fromisoformat(timestamp))
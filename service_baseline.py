@@ -0,0 +1,205 @@
+##############################################################################################
+# modules
+##############################################################################################
+
+import json
+import os
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from ucm_cli import open_session, parse_services, expected_for, commanded_out
+
+
+##############################################################################################
+# Global Variables & Config
+##############################################################################################
+
+## Nodes snapshotted at the same time by learn().
+learn_workers = 20
+
+
+##############################################################################################
+# Functions
+##############################################################################################
+
+def role_of(row):
+
+    """
+    Returns the role of an inventory row as 'device/role', i.e. 'ucm/publisher', 'ucm/subscriber' or 'cuc/subscriber'.
+
+    """
+
+    return f"{row.get('device') or 'ucm'}/{row.get('role') or 'subscriber'}"
+
+
+def learn(inventory, baseline, factory=open_session):
+
+    """
+    Snapshots the stopped services of every UCM, IM&P and CUC node of the inventory into the baseline.
+    Only run it when the nodes are known to be healthy, as whatever is stopped then is expected from then on.
+
+        : param inventory : The Inventory() loaded from the infrastructure.csv.
+        : param baseline : The ServiceBaseline() to learn into.
+        : param factory : Function opening a session, called as factory(node, username, password, port, address).
+
+    """
+
+    def _learn(row):
+        node = row['hostname']
+        conn = None
+
+        try:
+            conn = factory(node, row['username'], row['password'], int(row.get('port') or 22), row.get('address') or None)
+            baseline.learn(node, role_of(row), parse_services(conn.iter_cmd('utils service list')))
+
+        except Exception as e:
+            logging.info('## {} - learn({}) -- EXCEPTION -- {}'.format(__name__, node, e))
+
+        finally:
+            if conn is not None:
+                conn.close_ssh()
+
+    with ThreadPoolExecutor(max_workers=learn_workers) as executor:
+        list(executor.map(_learn, inventory.ucm_nodes))
+
+
+def _stopped(snapshot):
+
+    ## Snapshots learned before the reasons were kept hold bare names, stopped on purpose.
+    return frozenset((elem, commanded_out) if isinstance(elem, str) else tuple(elem) for elem in snapshot['stopped'])
+
+
+##############################################################################################
+# Classes
+##############################################################################################
+
+class ServiceBaseline:
+
+    """
+    The services expected to be stopped on each node, learned from snapshots of the nodes themselves.
+    A node without a snapshot of its own is compared with the services stopped on every learned node of its role,
+    and a role without learned nodes falls back to ucm_cli.expected_stopped. Services are expected to be stopped
+    with the reason they were stopped with when learned, so one that has since crashed is still reported.
+
+        : param path : Path to the json file the snapshots are stored in.
+
+    """
+
+    def __init__(self, path='service_baseline.json'):
+        self.path = path
+        self.nodes = {}
+        self.roles = {}
+        self.dirty = False
+        self._lock = threading.Lock()
+
+        if os.path.exists(self.path):
+            try:
+                with open(self.path) as f:
+                    self.nodes = json.load(f)
+            except Exception as e:
+                logging.debug('## {} - {}.__init__() -- EXCEPTION -- {}'.format(__name__, self, e))
+
+        self._learn_roles()
+
+    def __repr__(self):
+        return f'ServiceBaseline("{self.path}")'
+
+    def __str__(self):
+        return f'ServiceBaseline("{self.path}")'
+
+    def __len__(self):
+        return len(self.nodes)
+
+
+    def expected(self, node, role):
+
+        """
+        Returns the (name, reason) pairs of the services expected to be stopped on a node, as a frozenset.
+
+            : param node : The hostname or IP of the server.
+            : param role : The role of the node as returned by role_of().
+
+        """
+
+        snapshot = self.nodes.get(node)
+        if snapshot is not None:
+            return _stopped(snapshot)
+
+        if role in self.roles:
+            return self.roles[role]
+
+        return expected_for(role)
+
+
+    def learn(self, node, role, services):
+
+        """
+        Stores the activated services stopped on a node as its snapshot.
+
+            : param node : The hostname or IP of the server.
+            : param role : The role of the node as returned by role_of().
+            : param services : The ServiceRecord() list of the node.
+
+        """
+
+        stopped = sorted({(elem.name, elem.reason) for elem in services if elem.stopped and elem.activated})
+
+        with self._lock:
+            self.nodes[node] = {'role': role, 'stopped': stopped}
+            self._learn_roles()
+            self.dirty = True
+
+        logging.debug('## {} - {}.learn({}) -- {} STOPPED'.format(__name__, self, node, len(stopped)))
+
+
+    def _learn_roles(self):
+
+        ## A service is expected stopped for a role only when it is stopped on every learned node of the role.
+        roles = {}
+        for snapshot in self.nodes.values():
+            stopped = _stopped(snapshot)
+            roles[snapshot['role']] = roles[snapshot['role']] & stopped if snapshot['role'] in roles else stopped
+
+        self.roles = roles
+
+
+    def save(self):
+
+        """
+        Writes the snapshots back to disk if they have changed, replacing the file atomically.
+
+        """
+
+        with self._lock:
+            if not self.dirty:
+                return
+
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self.nodes, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+
+        logging.debug('## {} - {}.save() -- {} NODES'.format(__name__, self, len(self.nodes)))
+
+
+## Shared by every caller that does not pass its own baseline.
+service_baseline = ServiceBaseline()
+
+
+##############################################################################################
+# Run
+##############################################################################################
+
+if __name__ == '__main__':
+
+    format = "%(asctime)s: %(message)s"
+    logging.basicConfig(format=format, level=logging.INFO, datefmt="%H:%M:%S")
+
+    ## Learns the baseline from the nodes as they are now.
+    from inventory import Inventory
+
+    learn(Inventory('infrastructure.csv'), service_baseline)
+    service_baseline.save()
+
+    logging.info('## {} - {} -- {} NODES LEARNED'.format(__name__, service_baseline, len(service_baseline)))
@@ -0,0 +1,222 @@
+##############################################################################################
+# modules
+##############################################################################################
+
+import threading
+import logging
+from collections import OrderedDict
+
+
+##############################################################################################
+# Global Variables & Config
+##############################################################################################
+
+## Maximum number of idle sessions kept open across all nodes.
+max_idle = 100
+
+## Seconds between health checks of the idle sessions by the maintenance thread.
+check_interval = 300
+
+
+##############################################################################################
+# Classes
+##############################################################################################
+
+class SessionPool:
+
+    """
+    Keeps authenticated CLI sessions open between runs, at most one idle session per node.
+    Idle sessions are health checked before they are handed out and by the maintenance thread, and dead ones
+    are rebuilt in the background so the next run finds them ready.
+
+        : param factory : Function called as factory(node, *args) that returns a session at the CLI prompt.
+                          The session must provide is_alive() and close_ssh().
+        : param max_idle : The maximum number of idle sessions kept open across all nodes.
+
+    """
+
+    def __init__(self, factory, max_idle=max_idle):
+        self.factory = factory
+        self.max_idle = max_idle
+        self._idle = OrderedDict()
+        self._args = {}
+        self._rebuilding = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._maintenance = None
+
+    def __repr__(self):
+        return f'SessionPool({len(self._idle)} idle)'
+
+    def __str__(self):
+        return f'SessionPool({len(self._idle)} idle)'
+
+
+    def acquire(self, node, *args, **kwargs):
+
+        """
+        Returns a healthy session for the node, reusing the idle one if it still answers and building a new
+        one otherwise.
+
+            : param node : The hostname or IP of the server.
+            : param args : Extra arguments passed to the factory, i.e. username and password. They are kept to
+                           rebuild the session in the background.
+            : param kwargs : Keyword arguments passed to the factory for this call only, i.e. the run's metrics.
+
+        """
+
+        with self._lock:
+            self._args[node] = args
+            session = self._idle.pop(node, None)
+
+        if session is not None:
+            if session.is_alive():
+                logging.debug('## {} - {}.acquire({}) -- REUSED'.format(__name__, self, node))
+                return session
+
+            logging.debug('## {} - {}.acquire({}) -- IDLE SESSION DEAD'.format(__name__, self, node))
+            self._close(session)
+
+        logging.debug('## {} - {}.acquire({}) -- NEW SESSION'.format(__name__, self, node))
+        return self.factory(node, *args, **kwargs)
+
+
+    def release(self, node, session):
+
+        """
+        Returns a session to the pool. The least recently used idle sessions are closed once there are more
+        than max_idle of them. A session marked broken, i.e. after a command on it raised, is closed instead as
+        late output could leave it out of step with its prompts.
+
+            : param node : The hostname or IP of the server.
+            : param session : The session returned by acquire().
+
+        """
+
+        if getattr(session, 'broken', False):
+            logging.debug('## {} - {}.release({}) -- BROKEN, CLOSED'.format(__name__, self, node))
+            self._close(session)
+            return
+
+        evicted = []
+
+        with self._lock:
+            previous = self._idle.pop(node, None)
+            if previous is not None and previous is not session:
+                evicted.append(previous)
+
+            self._idle[node] = session
+
+            while len(self._idle) > self.max_idle:
+                evicted.append(self._idle.popitem(last=False)[1])
+
+        for elem in evicted:
+            self._close(elem)
+
+        logging.debug('## {} - {}.release({}) -- {} EVICTED'.format(__name__, self, node, len(evicted)))
+
+
+    def check_idle(self):
+
+        """
+        Health checks every idle session, closes the dead ones and rebuilds them in background threads.
+        Each session is taken out of the pool while it is probed, so acquire() never hands it to a worker halfway
+        through the probe, and put back once it has answered.
+
+        """
+
+        with self._lock:
+            nodes = list(self._idle)
+
+        for node in nodes:
+            with self._lock:
+                session = self._idle.pop(node, None)
+
+            if session is None:
+                continue
+
+            if session.is_alive():
+                self.release(node, session)
+                continue
+
+            self._close(session)
+            self._rebuild(node)
+
+
+    def _rebuild(self, node):
+
+        """
+        Builds a new session for the node in a background thread and adds it to the idle sessions.
+
+            : param node : The hostname or IP of the server.
+
+        """
+
+        with self._lock:
+            if node in self._rebuilding:
+                return
+            self._rebuilding.add(node)
+            args = self._args.get(node, ())
+
+        def _run():
+            try:
+                self.release(node, self.factory(node, *args))
+                logging.debug('## {} - {}._rebuild({}) -- REBUILT'.format(__name__, self, node))
+
+            except Exception as e:
+                logging.debug('## {} - {}._rebuild({}) -- EXCEPTION -- {}'.format(__name__, self, node, e))
+
+            finally:
+                with self._lock:
+                    self._rebuilding.discard(node)
+
+        threading.Thread(target=_run, name=f'rebuild-{node}', daemon=True).start()
+
+
+    def start_maintenance(self, interval=check_interval):
+
+        """
+        Starts a daemon thread that calls check_idle() every interval seconds.
+
+            : param interval : Seconds between health checks.
+
+        """
+
+        if self._maintenance is not None:
+            return
+
+        def _run():
+            while not self._stop.wait(interval):
+                try:
+                    self.check_idle()
+                except Exception as e:
+                    logging.debug('## {} - {}.start_maintenance() -- EXCEPTION -- {}'.format(__name__, self, e))
+
+        self._maintenance = threading.Thread(target=_run, name='session-pool', daemon=True)
+        self._maintenance.start()
+
+
+    def close_all(self):
+
+        """
+        Stops the maintenance thread and closes every idle session.
+
+        """
+
+        self._stop.set()
+
+        with self._lock:
+            idle = list(self._idle.values())
+            self._idle.clear()
+
+        for session in idle:
+            self._close(session)
+
+        logging.debug('## {} - {}.close_all()'.format(__name__, self))
+
+
+    def _close(self, session):
+        try:
+            session.close_ssh()
+        except Exception as e:
+            logging.debug('## {} - {}._close({}) -- EXCEPTION -- {}'.format(__name__, self, session, e))
@@ -0,0 +1,243 @@
+##############################################################################################
+# modules
+##############################################################################################
+
+import multiprocessing
+import os
+import queue
+import time
+import zlib
+import logging
+
+
+##############################################################################################
+# Global Variables & Config
+##############################################################################################
+
+## Seconds the parent waits on the result queue before it checks that the workers are still alive.
+poll_interval = 1
+
+## Seconds a worker that has sent its results is given to exit before it is terminated.
+exit_timeout = 5
+
+## Seconds the parent waits past the run's time budget for the workers to send their results, after that the
+## workers left are terminated and their unreported nodes recorded as timed out.
+deadline_grace = 30
+
+
+##############################################################################################
+# Functions
+##############################################################################################
+
+def shard_of(cluster, count):
+
+    """
+    Returns the shard of a cluster. Whole clusters go to one shard so the per-cluster limits and the cluster
+    alarm dedup keep working, and the crc32 keeps the split the same in every process and run.
+
+        : param cluster : The cluster name.
+        : param count : The number of shards.
+
+    """
+
+    return zlib.crc32(str(cluster).encode()) % count
+
+
+def worker_options(engine, processes, browser_pool_size, cert_cache_path, breaker_path):
+
+    """
+    Returns the options dict of the workers from the engine of the parent, its limits shared out between them.
+
+        : param engine : The CheckEngine() of the parent.
+        : param processes : The number of worker processes.
+        : param browser_pool_size : The browsers of the parent, shared out between the workers.
+        : param cert_cache_path : Path of the cert cache the workers start from.
+        : param breaker_path : Path of the circuit breaker file the workers start from.
+
+    """
+
+    limiter = engine.limiter
+
+    return {
+        'max_concurrency': max(1, engine.max_concurrency // processes),
+        'cluster_concurrency': engine.cluster_concurrency,
+        'initial_concurrency': max(1, int(limiter.limit if limiter else engine.max_concurrency) // processes),
+        'min_concurrency': limiter.minimum if limiter else 1,
+        'start_jitter': engine.start_jitter,
+        'time_left': engine.deadline - time.monotonic() if engine.deadline is not None else None,
+        'node_timeout': engine.node_timeout,
+        'browser_pool_size': max(1, browser_pool_size // processes),
+        'cert_cache': cert_cache_path,
+        'breaker': breaker_path,
+    }
+
+
+def _worker(path, shard, count, options, results):
+
+    """
+    Runs all_checks() on one shard of the inventory in its own process and streams each finding to the parent
+    as a plain tuple as soon as it is recorded. The per-node cert cache and circuit breaker entries, and the
+    timings, are sent once at the end.
+
+    """
+
+    from checks import all_checks
+    from engine import CheckEngine, AdaptiveLimiter
+    from exp_gui import BrowserPool
+    from inventory import Inventory
+    from metrics import Metrics
+    from results import ResultCollector
+    from session_pool import SessionPool
+    from cert_cache import CertCache
+    from circuit_breaker import CircuitBreaker
+    from ucm_cli import open_session
+
+    class _StreamingCollector(ResultCollector):
+        def add(self, node, check, severity, value=None, item='', timestamp=None):
+            record = super().add(node, check, severity, value, item, timestamp)
+            if record is not None:
+                results.put(('result', (record.node, record.check, record.severity, record.value, record.item, record.timestamp)))
+            return record
+
+    inventory = Inventory(path, shard=(shard, count))
+    nodes = [row['hostname'] for row in inventory.ucm_nodes + inventory.exp_nodes]
+
+    limiter = AdaptiveLimiter(options['initial_concurrency'], options['min_concurrency'], options['max_concurrency'])
+    deadline = time.monotonic() + options['time_left'] if options['time_left'] is not None else None
+    engine = CheckEngine(options['max_concurrency'], options['cluster_concurrency'], deadline, options['node_timeout'], limiter,
+                         options['start_jitter'])
+
+    metrics = Metrics(inventory.cluster_of)
+    metrics.listeners.append(limiter.observe)
+
+    pool = SessionPool(open_session)
+    cert_cache = CertCache(options['cert_cache'])
+    breaker = CircuitBreaker(options['breaker']) if options['breaker'] else None
+    browsers = BrowserPool(options['browser_pool_size'])
+
+    try:
+        all_checks(inventory, _StreamingCollector(), engine, pool, cert_cache, metrics, browsers, breaker=breaker,
+                   on_result=lambda node, result, e: results.put(('done', node)))
+    finally:
+        browsers.close_all()
+        pool.close_all()
+
+    prefixes = tuple(node + '|' for node in nodes)
+    results.put(('end', shard, {
+        'nodes': nodes,
+        'cert_cache': {key: value for key, value in cert_cache.entries.items() if key.startswith(prefixes)},
+        'breaker': {node: breaker.nodes[node] for node in nodes if node in breaker.nodes} if breaker else {},
+        'spans': metrics.spans,
+        'commands': {cmd: (elem.counts, elem.count, elem.sum) for cmd, elem in metrics.commands.items()},
+    }))
+
+    ## The threads of timed out nodes would hold up a normal exit until they finish, so once the queue has been
+    ## flushed the process exits straight away.
+    results.close()
+    results.join_thread()
+    os._exit(0)
+
+
+def run_sharded(inventory, collector, processes, options, metrics=None, cert_cache=None, breaker=None):
+
+    """
+    Splits the inventory by cluster across worker processes, each running its own engine, sessions and threads, so
+    the SSH key exchange and cipher work is spread over several cores instead of one GIL.
+    The findings are streamed back into the collector as the nodes finish. The cert cache, circuit breaker and
+    timings of each shard are merged in when its worker ends. The nodes of a worker that dies are recorded as
+    NOT_RESPONDING, and those of a worker still running deadline_grace seconds past options['time_left'] as TIMED_OUT.
+
+        : param inventory : The Inventory() loaded from the infrastructure.csv.
+        : param collector : The ResultCollector() of the run the findings are recorded to.
+        : param processes : The number of worker processes.
+        : param options : Dict of the engine and path options of the workers, the limits are per worker.
+        : param metrics : Optional Metrics() the timings of the workers are merged into.
+        : param cert_cache : Optional CertCache() the entries of the workers are merged into.
+        : param breaker : Optional CircuitBreaker() the node states of the workers are merged into.
+
+    """
+
+    from results import NOT_RESPONDING, TIMED_OUT, CRITICAL
+
+    deadline = time.monotonic() + options['time_left'] + deadline_grace if options['time_left'] is not None else None
+
+    def _unreported(shard):
+        for row in inventory.ucm_nodes + inventory.exp_nodes:
+            node = row['hostname']
+            if node not in done and shard_of(inventory.cluster_of(node), processes) == shard:
+                yield node
+
+    ctx = multiprocessing.get_context('spawn')
+    results = ctx.Queue()
+
+    workers = {}
+    for shard in range(processes):
+        worker = ctx.Process(target=_worker, args=(inventory.path, shard, processes, options, results), name=f'uc-checks-{shard}')
+        worker.start()
+        workers[shard] = worker
+
+    logging.info('## {} - run_sharded() -- {} WORKERS STARTED'.format(__name__, processes))
+
+    done = set()
+    ended = set()
+
+    while len(ended) < processes:
+        if deadline is not None and time.monotonic() >= deadline:
+            for shard, worker in workers.items():
+                if shard in ended:
+                    continue
+
+                logging.info('## {} - run_sharded() -- WORKER {} PAST THE DEADLINE, TERMINATED'.format(__name__, shard))
+                worker.terminate()
+                for node in _unreported(shard):
+                    collector.add(node, TIMED_OUT, CRITICAL, 'Worker process did not finish before the run deadline. Check node manually')
+                ended.add(shard)
+            break
+
+        try:
+            timeout = poll_interval if deadline is None else max(0, min(poll_interval, deadline - time.monotonic()))
+            message = results.get(timeout=timeout)
+
+        except queue.Empty:
+            dead = [shard for shard, worker in workers.items() if shard not in ended and not worker.is_alive()]
+
+            ## A worker may have put its last messages just before exiting, so the queue is drained once more first.
+            if dead and results.empty():
+                for shard in dead:
+                    logging.info('## {} - run_sharded() -- WORKER {} DIED, EXITCODE {}'.format(__name__, shard, workers[shard].exitcode))
+                    for node in _unreported(shard):
+                        collector.add(node, NOT_RESPONDING, CRITICAL, 'Worker process died before the checks finished')
+                    ended.add(shard)
+            continue
+
+        if message[0] == 'result':
+            node, check, severity, value, item, timestamp = message[1]
+            collector.add(node, check, severity, value, item, timestamp)
+
+        elif message[0] == 'done':
+            done.add(message[1])
+
+        elif message[0] == 'end':
+            shard, state = message[1], message[2]
+            ended.add(shard)
+
+            if cert_cache is not None: cert_cache.merge(state['nodes'], state['cert_cache'])
+            if breaker is not None: breaker.merge(state['nodes'], state['breaker'])
+            if metrics is not None: metrics.merge(state['spans'], state['commands'])
+
+            logging.info('## {} - run_sharded() -- WORKER {} ENDED, {} NODES'.format(__name__, shard, len(state['nodes'])))
+
+    ## The workers exit on their own once they have sent their results, one that hangs is not waited for.
+    for shard, worker in workers.items():
+        worker.join(exit_timeout)
+        if worker.is_alive():
+            logging.info('## {} - run_sharded() -- WORKER {} STILL RUNNING, TERMINATED'.format(__name__, shard))
+            worker.terminate()
+            worker.join(exit_timeout)
+
+        ## A worker that does not even act on SIGTERM, i.e. stuck in a system call, is killed.
+        if worker.is_alive():
+            worker.kill()
+            worker.join()
+
+    return done
@@ -0,0 +1,36 @@
+import asyncio
+
+from engine import AdaptiveLimiter, CheckEngine
+from metrics import Metrics
+
+
+def test_observe_after_loop_closed():
+    limiter = AdaptiveLimiter(4, 1, 8)
+
+    async def _acquire():
+        await limiter.acquire()
+        limiter.release()
+
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(_acquire())
+    loop.close()
+
+    ## The loop is still set, as when a limiter outlives a run that did not go through CheckEngine.run().
+    assert limiter._loop is loop
+    limiter.observe('node', 'cmd', 100, False)
+    assert limiter.limit == 2
+
+
+def test_run_detaches_limiter():
+    limiter = AdaptiveLimiter(4, 1, 8)
+    metrics = Metrics()
+    metrics.listeners.append(limiter.observe)
+
+    engine = CheckEngine(4, 4, limiter=limiter)
+    results = engine.run(lambda node: node, ['a', 'b', 'c'])
+
+    assert sorted(elem[1] for elem in results) == ['a', 'b', 'c']
+    assert limiter._loop is None
+
+    ## A straggler reporting after the run does not raise out of Metrics.record().
+    metrics.record('a', 'cmd', 0.1)
@@ -0,0 +1,62 @@
+import threading
+import time
+
+import pytest
+
+from exp_gui import BrowserPool
+
+
+class FakeDriver:
+    def __init__(self):
+        self.quit_called = False
+
+    def delete_all_cookies(self):
+        pass
+
+    def execute_script(self, script, *args):
+        pass
+
+    def get(self, url):
+        pass
+
+    def quit(self):
+        self.quit_called = True
+
+
+class FakeBrowserPool(BrowserPool):
+    def _start(self):
+        return FakeDriver()
+
+
+def test_broken_browser_wakes_waiter():
+    pool = FakeBrowserPool(size=1)
+    driver = pool.acquire()
+    acquired = []
+
+    waiter = threading.Thread(target=lambda: acquired.append(pool.acquire(timeout=5)))
+    waiter.start()
+    time.sleep(0.1)
+
+    start = time.monotonic()
+    pool.release(driver, broken=True)
+    waiter.join(5)
+
+    assert driver.quit_called
+    assert acquired and acquired[0] is not driver
+    assert time.monotonic() - start < 1
+
+
+def test_released_browser_is_reused():
+    pool = FakeBrowserPool(size=1)
+    driver = pool.acquire()
+    pool.release(driver)
+
+    assert pool.acquire(timeout=0) is driver
+
+
+def test_acquire_times_out():
+    pool = FakeBrowserPool(size=1)
+    pool.acquire()
+
+    with pytest.raises(TimeoutError):
+        pool.acquire(timeout=0.1)
@@ -0,0 +1,59 @@
+import pytest
+import requests
+
+from exp_http import ExpresswayHTTP, expressway_alarm_cleanup_http
+from fake_server import FakeExpresswayWeb
+
+
+@pytest.fixture
+def web():
+    server = FakeExpresswayWeb(alarms=4, username='admin', password='password')
+    server.start()
+    yield server
+    server.stop()
+
+
+def test_cleanup_acknowledges_own_license_alarms(web):
+    client = ExpresswayHTTP('http', port=web.port)
+
+    assert expressway_alarm_cleanup_http('exp-1', 'admin', 'password', client, '127.0.0.1') == 2
+    assert web.acknowledge_posts == 1
+
+    ## The license alarm raised by a peer and the alarm that is not about licenses are left alone.
+    states = {elem['title']: elem['state'] for elem in web.alarms}
+    assert states == {
+        'Call license limit reached': 'Acknowledged',
+        'Room system license limit reached': 'Acknowledged',
+        'Capacity warning': 'Unacknowledged',
+        'NTP server not available': 'Unacknowledged',
+    }
+
+    assert expressway_alarm_cleanup_http('exp-1', 'admin', 'password', client, '127.0.0.1') == 0
+    assert web.acknowledge_posts == 1
+
+
+def test_cleanup_wrong_password(web):
+    client = ExpresswayHTTP('http', port=web.port)
+
+    with pytest.raises(PermissionError):
+        expressway_alarm_cleanup_http('exp-1', 'admin', 'wrong', client, '127.0.0.1')
+
+
+def test_address_keeps_hostname_for_tls():
+    client = ExpresswayHTTP()
+    base_url = client.base_url('lab-expe-01.example.com', '10.1.1.1')
+    session = client.session('lab-expe-01.example.com', '10.1.1.1')
+
+    assert base_url == 'https://10.1.1.1:7443'
+    assert session.headers['Host'] == 'lab-expe-01.example.com:7443'
+
+    request = requests.Request('GET', base_url + '/login').prepare()
+    host_params, pool_kwargs = client.adapter.build_connection_pool_key_attributes(request, True)
+
+    assert host_params['host'] == '10.1.1.1'
+    assert pool_kwargs['server_hostname'] == 'lab-expe-01.example.com'
+    assert pool_kwargs['assert_hostname'] == 'lab-expe-01.example.com'
+
+
+def test_pool_sized_from_workers():
+    assert ExpresswayHTTP('http', workers=200).adapter._pool_maxsize == 200
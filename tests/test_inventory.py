@@ -0,0 +1,39 @@
+import csv
+import os
+import time
+
+from inventory import Inventory
+
+
+fields = ['hostname', 'role', 'username', 'password', 'region', 'device', 'cluster']
+
+
+def _write(path, hostnames):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        for hostname in hostnames:
+            writer.writerow({'hostname': hostname, 'role': 'subscriber', 'username': 'admin', 'password': 'password',
+                             'region': 'emea', 'device': 'exp' if 'exp' in hostname else 'ucm', 'cluster': 'c1'})
+
+
+def test_reload_swaps_the_index(tmp_path):
+    path = str(tmp_path / 'infrastructure.csv')
+    _write(path, ['ucm-1', 'exp-1'])
+
+    inventory = Inventory(path)
+    index = inventory.index
+
+    assert [row['hostname'] for row in inventory.ucm_nodes] == ['ucm-1']
+    assert [row['hostname'] for row in inventory.exp_nodes] == ['exp-1']
+    assert not inventory.reload()
+
+    _write(path, ['ucm-1', 'ucm-2'])
+    os.utime(path, (time.time() + 10, time.time() + 10))
+
+    assert inventory.reload()
+    assert 'ucm-2' in inventory and 'exp-1' not in inventory
+    assert [row['hostname'] for row in inventory.ucm_nodes] == ['ucm-1', 'ucm-2']
+
+    ## A reader holding the previous index keeps a complete view of the previous load.
+    assert [row['hostname'] for row in index.rows] == ['ucm-1', 'exp-1']
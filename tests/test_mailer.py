@@ -0,0 +1,88 @@
+import os
+from email.message import EmailMessage
+
+import pytest
+
+import mailer
+from fake_server import FakeSMTPServer
+from mailer import ReportMailer
+
+
+def _message(to='noc@example.com'):
+    msg = EmailMessage()
+    msg.set_content('report')
+    msg['Subject'] = 'UC Checks'
+    msg['From'] = 'uc-checks@example.com'
+    msg['To'] = to
+    return msg
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(mailer, 'backoff_base', 0.01)
+
+
+def _start(tmp_path, **kwargs):
+    server = FakeSMTPServer(**kwargs)
+    server.start()
+    return server, ReportMailer('127.0.0.1', server.port, spool=str(tmp_path), timeout=5)
+
+
+def test_reports_share_one_connection(tmp_path):
+    server, reports = _start(tmp_path)
+
+    for _ in range(3):
+        reports.send(_message())
+
+    assert reports.wait(10)
+    assert len(server.messages) == 3 and reports.sent == 3
+    assert server.connections == 1
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.eml')]
+
+    reports.close()
+    server.stop()
+
+
+def test_retries_after_refusals(tmp_path):
+    server, reports = _start(tmp_path, refuse_first=2)
+
+    reports.send(_message())
+
+    assert reports.wait(10)
+    assert len(server.messages) == 1
+    assert server.connections == 3
+
+    reports.close()
+    server.stop()
+
+
+@pytest.mark.parametrize('kwargs', [{'reject_data': True}, {'reject': ['noc@example.com']}])
+def test_rejected_report_moved_out_of_spool(tmp_path, kwargs):
+    server, reports = _start(tmp_path, **kwargs)
+
+    path = reports.send(_message())
+
+    assert reports.wait(10)
+    assert not server.messages and reports.sent == 0
+    assert not os.path.exists(path)
+    assert os.listdir(os.path.join(tmp_path, mailer.rejected_dir)) == [os.path.basename(path)]
+
+    ## The next start() does not queue the rejected report again.
+    reports.start()
+    assert reports.wait(0)
+
+    reports.close()
+    server.stop()
+
+
+def test_wait_times_out(tmp_path):
+    server, reports = _start(tmp_path, delay=1)
+
+    reports.send(_message())
+
+    assert not reports.wait(0.1)
+    assert reports.wait(10)
+    assert len(server.messages) == 1
+
+    reports.close()
+    server.stop()
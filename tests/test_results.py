@@ -0,0 +1,35 @@
+import time
+
+from checks import run_tasks
+from engine import CheckEngine
+from results import ResultCollector, CRITICAL, WARNING, HIGH_CPU, TIMED_OUT
+
+
+def test_records_of_timed_out_node_dropped():
+    collector = ResultCollector()
+
+    def _check(node):
+        if node == 'slow':
+            time.sleep(0.5)
+        collector.add(node, HIGH_CPU, WARNING, 95)
+
+    engine = CheckEngine(4, 4, node_timeout=0.2)
+    run_tasks(engine, collector, [(_check, ['fast', 'slow'], None)])
+
+    ## The slow node's thread finishes after the engine has given up on it.
+    time.sleep(0.5)
+
+    assert sorted((elem.node, elem.check) for elem in collector) == [('fast', HIGH_CPU), ('slow', TIMED_OUT)]
+    assert collector.timed_out == {'slow'}
+
+
+def test_closed_collector_drops_records():
+    collector = ResultCollector()
+    seen = []
+    collector.listeners.append(seen.append)
+
+    assert collector.add('a', HIGH_CPU, CRITICAL, 99) is not None
+    collector.close()
+    assert collector.add('b', HIGH_CPU, CRITICAL, 99) is None
+
+    assert len(collector) == 1 and len(seen) == 1
@@ -0,0 +1,29 @@
+from ucm_cli import expected_for, parse_stopped_srvs
+
+
+service_list = [
+    'Requesting service status, please wait...',
+    'Cisco CallManager[STARTED]',
+    'Cisco CAR DB[STOPPED]  Commanded Out of Service',
+    'Cisco License Manager[STOPPED]  Service Not Running',
+    'Cisco Extension Mobility[STOPPED]  Service Not Activated',
+]
+
+
+def _names(resp, role):
+    return [elem.name for elem in parse_stopped_srvs(resp, expected_for(role))]
+
+
+def test_expected_service_stopped_for_another_reason_reported():
+    assert _names(service_list, 'ucm/subscriber') == ['Cisco License Manager']
+
+
+def test_publisher_car_commanded_out_expected():
+    assert _names(service_list, 'ucm/publisher') == ['Cisco License Manager']
+
+
+def test_publisher_drf_master_reported():
+    resp = ['Cisco DRF Master[STOPPED]  Commanded Out of Service']
+
+    assert _names(resp, 'ucm/publisher') == ['Cisco DRF Master']
+    assert _names(resp, 'ucm/subscriber') == []
@@ -3,38 +3,311 @@
 ##############################################################################################
 
 import paramiko
+import socket
+import time
 import datetime
 from datetime import datetime
 import re
 import logging
+from cli_reader import PromptReader
+from metrics import null_metrics, timed
 
 test_data = ['Unable to connect to Master Agent host: NYVMITEL01, Port: 4040. This may be due to Master or Local Agent being down.', 'drfCliMsg:  No history data is available']
 
 
+##############################################################################################
+# Global Variables & Config
+##############################################################################################
+
+months = {
+    'Jan': '01',
+    'Feb': '02',
+    'Mar': '03',
+    'Apr': '04',
+    'May': '05',
+    'Jun': '06',
+    'Jul': '07',
+    'Aug': '08',
+    'Sep': '09',
+    'Oct': '10',
+    'Nov': '11',
+    'Dec': '12'
+}
+
+## The reason given for a service stopped on purpose.
+commanded_out = 'Commanded Out of Service'
+
+## The services expected to be stopped, as (name, reason) pairs by role as returned by service_baseline.role_of(),
+## i.e. 'ucm/subscriber'. '*/publisher' applies to the publishers of every device without an entry of their own and
+## '*' to the other roles. A service stopped for another reason, i.e. one that crashed, is still reported.
+## A baseline learned from the nodes takes precedence.
+_expected_stopped = [
+    'Cisco CAR DB',
+    'Cisco CAR Scheduler',
+    'Cisco CDR Repository Manager',
+    'Cisco DRF Master',
+    'Cisco License Manager',
+    'Cisco SOAP - CallRecord Service',
+    'Cisco Intercluster Lookup Service',
+    'Connection HTTPS Directory Feeder',
+]
+
+## The DRF Master runs on the publisher, the backups depend on it. The CAR and CDR services also run there, but
+## are commanded out of service on purpose where CAR is not used, so that state stays expected.
+_publisher_only = ['Cisco DRF Master']
+
+expected_stopped = {
+    '*': frozenset((name, commanded_out) for name in _expected_stopped),
+    '*/publisher': frozenset((name, commanded_out) for name in _expected_stopped if name not in _publisher_only),
+}
+
+## Lines of 'show status'.
+status_cpu = re.compile(r'^\s*CPU Idle:\s*([\d.]+)%')
+
+status_memory = re.compile(r'^\s*(?:Memory )?(\w+):\s+(\d+)K\s*$')
+
+status_disk = re.compile(r'^\s*(Disk/\S+)\s+(\d+)K\s+(\d+)K\s+(\d+)K\s+\((\d+)%\)')
+
+## Lines of 'utils service list', i.e. 'Cisco CAR DB[STOPPED]  Commanded Out of Service'.
+service_line = re.compile(r'^(\S.*?)\s*\[(\w+)\]\s*(.*?)\s*$')
+
+
 ##############################################################################################
 # Functions
 ##############################################################################################
 
-def parse_resp(func):
+def open_session(node, username, password, port=22, address=None, metrics=None):
+
+    """
+    Returns an SSHConnect() instance waiting at the 'admin:' prompt with CLI pagination turned off.
+    Used as the factory of the session pool.
+
+        : param node : The hostname or IP of the UCM, IM&P or CUC server.
+        : param username : username of the given server.
+        : param password : password of the given server.
+        : param port : SSH port of the given server.
+        : param address : Optional address to connect to when the node name is not resolvable.
+        : param metrics : Optional Metrics() the timings are recorded to.
+
+    """
+
+    conn = SSHConnect(node, username, password, port, address, metrics)
+    logging.debug('## {} - SSHConnect("{}")'.format(__name__, node))
+
+    conn.init_connect()
+    logging.debug('## {} - SSHConnect("{}").init_connect()'.format(__name__, node))
+
+    try:
+        conn.run_cmd('set cli pagination off')
+        logging.debug('## {} - SSHConnect("{}").run_cmd()'.format(__name__, node))
+
+    except Exception as e:
+        logging.debug('## {} - SSHConnect("{}").run_cmd() -- EXCEPTION -- {}'.format(__name__, node, e))
+
+    return conn
+
+
+def parse_uptime(resp):
+
+    """
+    Returns the uptime and its unit from the output lines of 'show status'. The unit is 'day', 'days', 'min' or 'hours'.
+
+    """
+
+    for elem in resp:
+        fields = elem.replace(',', '').split()
+
+        if len(fields) > 3 and fields[1] == 'up':
+            uptime, unit = fields[2], fields[3]
+
+            if unit != 'day' and unit != 'days' and unit != 'min':
+                unit = 'hours'
+
+            return uptime, unit
+
+    raise ValueError('No uptime in show status')
+
+
+def parse_status(resp):
+
+    """
+    Returns the uptime, CPU, memory and disk usage from the output lines of 'show status' as a dict of
+    uptime (uptime, unit), cpu_idle (percent), memory ({name: KB}) and disks ({partition: percent used}).
+
+    """
+
+    status = {'uptime': parse_uptime(resp), 'cpu_idle': None, 'memory': {}, 'disks': {}}
+    in_memory = False
+
+    for elem in resp:
+        match = status_cpu.match(elem)
+        if match:
+            status['cpu_idle'] = float(match.group(1))
+            continue
+
+        if elem.strip().startswith('Memory Total:'):
+            in_memory = True
+
+        match = status_memory.match(elem) if in_memory else None
+        if match:
+            status['memory'][match.group(1).lower()] = int(match.group(2))
+            continue
+        in_memory = False
+
+        match = status_disk.match(elem)
+        if match:
+            status['disks'][match.group(1)] = int(match.group(5))
+
+    return status
+
+
+def expected_for(role):
 
     """
-    Decorator function to parse th results of each command that is run in the server CLI.
+    Returns the expected_stopped entry of a role, falling back to that of '*/<role>' and then to '*'.
+
+        : param role : The role of the node as returned by service_baseline.role_of(), i.e. 'ucm/publisher'.
 
     """
 
-    def inner(*args,**kwargs):
+    if role in expected_stopped:
+        return expected_stopped[role]
+
+    return expected_stopped.get('*/' + role.rpartition('/')[2], expected_stopped['*'])
+
+
+def parse_stopped_srvs(resp, expected=None):
+
+    """
+    Returns the activated services that are stopped although they are not expected to be, as ServiceRecord()
+    sorted by name, from the output lines of 'utils service list'.
+    A service is only expected to be stopped for the reason it is expected with, so one that crashed is reported.
+
+        : param resp : The output lines.
+        : param expected : (name, reason) pairs of the services expected to be stopped, defaults to expected_stopped['*'].
+
+    """
+
+    if expected is None: expected = expected_stopped['*']
+
+    stopped = {elem.name: elem for elem in parse_services(resp)
+               if elem.stopped and elem.activated and (elem.name, elem.reason) not in expected}
+
+    return [stopped[name] for name in sorted(stopped)]
+
+
+def parse_services(resp):
+
+    """
+    Returns every service from the output lines of 'utils service list' as a list of ServiceRecord(),
+    i.e. ServiceRecord('Cisco CAR DB', 'STOPPED', 'Commanded Out of Service').
+
+    """
+
+    services = []
+
+    for elem in resp:
+        match = service_line.match(elem)
+        if match:
+            services.append(ServiceRecord(match.group(1), match.group(2), match.group(3)))
+
+    return services
+
+
+def parse_backup(resp):
+
+    """
+    Returns the status of the last backup, the date of the last successful backup and the #days since a
+    successful backup from the output lines of 'utils disaster_recovery history Backup'.
+
+    """
+
+    backup_list = [elem for elem in resp if '.tar' in elem or 'TAR file not created' in elem]
+    today = datetime.now()
+
+    latest_backup_status = 'ERROR'
+
+    if 'SUCCESS' in str(backup_list[-1]): latest_backup_status = 'SUCCESS'
+    logging.debug('## {} - parse_backup() -- latest_backup_status == {}'.format(__name__, latest_backup_status))
+
+    def _get_backup():
 
-        resp = str(func(*args,**kwargs)).replace("'b'", "").split('\\r\\n')
+        logging.debug('## {} - parse_backup() -- backup_list == {}'.format(__name__, backup_list))
 
-        return resp
+        latest_backup = str(backup_list.pop()).split()
 
-    return inner
+        logging.debug('## {} - parse_backup() -- latest_backup == {} {}'.format(__name__, len(latest_backup), latest_backup))
+
+        ## Seperates year and status in the backup history if these have been merged in output due to long timezone, i.e. GMT-02:00
+        if len(latest_backup) == 12 or len(latest_backup) == 13:
+            year_and_status = list(latest_backup.pop(7))
+            year = ''.join(year_and_status[0:4])
+            status = ''.join(year_and_status[4:])
+            latest_backup.insert(7, year)
+            latest_backup.insert(8, status)
+
+        while 'SUCCESS' in latest_backup:
+            logging.debug('## {} - parse_backup() -- WHILE LOOP -- latest_backup = {}'.format(__name__, latest_backup))
+            latest_backup[3] = months[latest_backup[3]]
+            last_successful_backup = str(latest_backup[4] + '/' + latest_backup[3] + '/' + latest_backup[7])
+            last_successful_backup_strptime = datetime.strptime(last_successful_backup, '%d/%m/%Y')
+            delta = today - last_successful_backup_strptime
+            delta_days = delta.days
+
+            logging.debug('## {} - parse_backup() -- RETURN == {}, {}, {}'.format(__name__, latest_backup_status, last_successful_backup, delta_days))
+            return latest_backup_status, last_successful_backup, delta_days
+
+        else:
+            return _get_backup()
+
+
+    return _get_backup()
 
 
 ##############################################################################################
 # Classes
 ##############################################################################################
 
+class ServiceRecord:
+
+    """
+    A service of 'utils service list'. Records compare equal, and hash, by name, state and reason.
+
+        : param name : The service name, i.e. 'Cisco CallManager'.
+        : param state : The state between the brackets, i.e. 'STARTED' or 'STOPPED'.
+        : param reason : The text after the state, i.e. 'Commanded Out of Service'. Empty if there is none.
+
+    """
+
+    __slots__ = ('name', 'state', 'reason')
+
+    def __init__(self, name, state, reason=''):
+        self.name = name
+        self.state = state
+        self.reason = reason
+
+    def __repr__(self):
+        return f'ServiceRecord("{self.name}", "{self.state}", "{self.reason}")'
+
+    def __str__(self):
+        return f'{self.name}[{self.state}]' + (f'  {self.reason}' if self.reason else '')
+
+    def __eq__(self, other):
+        return isinstance(other, ServiceRecord) and (self.name, self.state, self.reason) == (other.name, other.state, other.reason)
+
+    def __hash__(self):
+        return hash((self.name, self.state, self.reason))
+
+
+    @property
+    def stopped(self):
+        return self.state == 'STOPPED'
+
+    @property
+    def activated(self):
+        return 'Not Activated' not in self.reason
+
+
 class SSHConnect:
 
     """
@@ -43,31 +316,42 @@ class SSHConnect:
         : param node : The hostname or IP of the UCM, IM&P or CUC server.
         : param username : username of the given server.
         : param password : password of the given server.
+        : param port : SSH port of the given server.
+        : param address : Optional address to connect to when the node name is not resolvable.
+        : param metrics : Optional Metrics() the connect, auth, command and check timings are recorded to.
 
     """
 
-    def __init__(self, node, username, password):
+    def __init__(self, node, username, password, port=22, address=None, metrics=None):
         self.node = node
         self.username = username
         self.password = password
+        self.port = port
+        self.address = address or node
+        self.metrics = metrics or null_metrics
         self.client = paramiko.SSHClient()
         self.client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        self.client.connect(hostname=self.node,username=self.username,password=self.password,timeout=60)
-        self.conn = self.client.invoke_shell()
-        self.months = {
-                'Jan': '01',
-                'Feb': '02',
-                'Mar': '03',
-                'Apr': '04',
-                'May': '05',
-                'Jun': '06',
-                'Jul': '07',
-                'Aug': '08',
-                'Sep': '09',
-                'Oct': '10',
-                'Nov': '11',
-                'Dec': '12'
-            }
+
+        ## The TCP connect is timed on its own, the key exchange and authentication then run over its socket.
+        with self.metrics.span(self.node, 'connect'):
+            sock = socket.create_connection((self.address, self.port), timeout=60)
+
+        try:
+            with self.metrics.span(self.node, 'auth'):
+                self.client.connect(hostname=self.address,port=self.port,username=self.username,password=self.password,timeout=60,sock=sock)
+                self.conn = self.client.invoke_shell()
+
+        except Exception:
+            self.client.close()
+            sock.close()
+            raise
+
+        self.reader = PromptReader(self.conn, 'admin:')
+        self.prefetched = {}
+        self.months = months
+
+        ## Set once a command raised or was left half read, the session is then closed instead of pooled.
+        self.broken = False
 
     def __repr__(self):
         return f'SSHConnect("{self.node}")'
@@ -76,6 +360,7 @@ class SSHConnect:
         return f'SSHConnect("{self.node}")'
 
 
+    @timed('init_connect')
     def init_connect(self):
 
         """
@@ -86,74 +371,107 @@ class SSHConnect:
         logging.debug('## {} - {}.init_connect() -- ENTER'.format(__name__, self))
 
         try:
-            def _init_connect(buffer=''):
-                prompt = False
-                output = self.conn.recv(65535)
-                buffer += str(output)
-                recursion_depth = 1
-                max_recursion_depth = 10
-
-                if 'admin:' not in buffer and max_recursion_depth <= 10:
-                    logging.debug('## {} - {}.init_connect() -- PROMPT == {}'.format(__name__, self, prompt))
-                    recursion_depth += 1
-                    return _init_connect(buffer)
-
-                elif 'admin:' not in buffer and max_recursion_depth > 10:
-                    raise RecursionError('Too many loops.')
-
-                elif 'admin:' in buffer:
-                    prompt = True
-                    logging.debug('## {} - {}.init_connect() -- PROMPT == {}'.format(__name__, self, prompt))
-                    return prompt
-
-            return _init_connect()
+            self.reader.read_lines()
+            logging.debug('## {} - {}.init_connect() -- PROMPT == {}'.format(__name__, self, True))
+            return True
 
         except Exception as e:
             logging.debug('## {} - {}.init_connect() -- EXCEPTION == {}'.format(__name__, self, e))
             return e
 
 
-    @parse_resp
     def run_cmd(self, cmd):
 
         """
         Runs a CLI command on the target server and confirms the return of the 'admin:' prompt before completing.
-        Decorated by the parse_resp() function to properly parse the return.
+        Returns the decoded output as a list of lines.
 
         """
 
         logging.debug('## {} - {}.run_cmd() -- ENTER'.format(__name__, self))
 
+        try:
+            resp = list(self.iter_cmd(cmd))
+            logging.debug('## {} - {}.run_cmd("{}") -- PROMPT == {}'.format(__name__, self, cmd, True))
+            return resp
+
+        except Exception as e:
+            logging.debug('## {} - {}.run_cmd("{}") -- EXCEPTION == {}'.format(__name__, self, cmd, e))
+            return [str(e)]
+
+
+    def iter_cmd(self, cmd):
+
+        """
+        Runs a CLI command on the target server and yields the decoded lines of its output as they arrive,
+        so a parser can work through a large output without holding it all. Unlike run_cmd() any error is raised.
+        The generator must be run to the end to leave the session at the prompt.
+
+        """
+
+        ## Output already read by prefetch() is handed out without another round trip.
+        if cmd in self.prefetched:
+            logging.debug('## {} - {}.iter_cmd("{}") -- PREFETCHED'.format(__name__, self, cmd))
+            resp = self.prefetched.pop(cmd)
+            if isinstance(resp, Exception):
+                raise resp
+            yield from resp
+            return
+
+        start = time.monotonic()
+        ok = None
+
         try:
             self.conn.send(cmd + '\n')
+            yield from self.reader.iter_lines()
+            ok = True
 
-            def _run_cmd(buffer=''):
-                prompt = False
-                output = self.conn.recv(65535)
-                buffer += str(output)
-                recursion_depth = 1
-                max_recursion_depth = 10
+        ## A command that timed out, ran over max_cmd_bytes or lost its channel is recorded as failed, so the limiter
+        ## backs off. A generator closed early by its caller is neither.
+        except Exception:
+            ok = False
+            raise
 
-                if 'admin:' not in buffer and max_recursion_depth <= 10:
-                    logging.debug('## {} - {}.run_cmd("{}") -- PROMPT == {}'.format(__name__, self, cmd, prompt))
-                    recursion_depth += 1
-                    return _run_cmd(buffer)
+        finally:
+            if not ok: self.broken = True
+            if ok is not None: self.metrics.observe_command(self.node, cmd, time.monotonic() - start, ok)
 
-                elif 'admin:' not in buffer and max_recursion_depth > 10:
-                    raise RecursionError('Too many loops.')
 
-                elif 'admin:' in buffer:
-                    prompt = True
-                    logging.debug('## {} - {}.run_cmd("{}") -- PROMPT == {}'.format(__name__, self, cmd, prompt))
-                    return buffer
+    def prefetch(self, cmds):
 
-            return _run_cmd()
+        """
+        Runs the commands in one pipelined batch and keeps their output, so the following run_cmd() calls for
+        the same commands, i.e. from the get_*() methods, return straight away.
+        If the batch fails the failed command and the ones after it are marked with the exception, as the session
+        can no longer be trusted to line up outputs with commands.
 
-        except Exception as e:
-            logging.debug('## {} - {}.run_cmd("{}") -- EXCEPTION == {}'.format(__name__, self, cmd, e))
-            return e
+            : param cmds : List of CLI commands.
+
+        """
+
+        if not cmds:
+            return
+
+        logging.debug('## {} - {}.prefetch({}) -- ENTER'.format(__name__, self, cmds))
 
+        start = time.monotonic()
+        self.conn.send(''.join(cmd + '\n' for cmd in cmds))
 
+        ## Each command is timed from the send of the batch, as that is when its output could start.
+        for index, cmd in enumerate(cmds):
+            try:
+                self.prefetched[cmd] = self.reader.read_lines()
+                self.metrics.observe_command(self.node, cmd, time.monotonic() - start)
+
+            except Exception as e:
+                logging.debug('## {} - {}.prefetch({}) -- EXCEPTION == {}'.format(__name__, self, cmd, e))
+                self.metrics.observe_command(self.node, cmd, time.monotonic() - start, False)
+                self.prefetched.update((elem, e) for elem in cmds[index:])
+                self.broken = True
+                return
+
+
+    @timed('get_uptime')
     def get_uptime(self):
 
         """
@@ -163,58 +481,42 @@ class SSHConnect:
 
         resp = self.run_cmd('show status')
         logging.debug('## {} - {}.get_uptime() -- RESP == {}'.format(__name__, self, resp))
-        uptime = resp[10].replace(',', '').split()[2]
-        logging.debug('## {} - {}.get_uptime() -- UPTIME == {}'.format(__name__, self, uptime))
-        unit = resp[10].replace(',', '').split()[3]
-        logging.debug('## {} - {}.get_uptime() -- UNIT == {}'.format(__name__, self, unit))
-
-        if unit != 'day' and unit != 'days' and unit != 'min':
-            unit = 'hours'
+        uptime, unit = parse_uptime(resp)
+        logging.debug('## {} - {}.get_uptime() -- UPTIME == {} {}'.format(__name__, self, uptime, unit))
 
         return uptime, unit
 
 
-    def get_stopped_srvs(self):
+    @timed('get_stopped_srvs')
+    def get_stopped_srvs(self, expected=None):
 
         """
-        Returns any stopped services on the target server.
+        Returns the services stopped on the target server that are not expected to be.
+
+            : param expected : (name, reason) pairs of the services expected to be stopped, see parse_stopped_srvs().
 
         """
 
-        ## A list of services that are usually disabled on subscriber nodes.
-        ignore_list = [
-            'Cisco CAR DB[STOPPED]  Commanded Out of Service', 
-            'Cisco CAR Scheduler[STOPPED]  Commanded Out of Service', 
-            'Cisco CDR Repository Manager[STOPPED]  Commanded Out of Service', 
-            'Cisco DRF Master[STOPPED]  Commanded Out of Service', 
-            'Cisco License Manager[STOPPED]  Commanded Out of Service', 
-            'Cisco SOAP - CallRecord Service[STOPPED]  Commanded Out of Service',
-            'Cisco Intercluster Lookup Service[STOPPED]  Commanded Out of Service',
-            'Connection HTTPS Directory Feeder[STOPPED]  Commanded Out of Service'
-            ]
-
-        resp = self.run_cmd('utils service list')
-        logging.debug('## {} - {}.get_stopped_srvs() -- RESP == {}'.format(__name__, self, resp))
-        stopped_list = [elem for elem in resp if '[STOPPED]' in elem and 'Not Activated' not in elem]
-
-        ## Compares the returned list of stopped services to the above list of services usually disbaled on subscriber nodes.
-        for elem in ignore_list:
-            if elem in stopped_list:
-                stopped_list.remove(elem)
+        stopped_list = parse_stopped_srvs(self.iter_cmd('utils service list'), expected)
 
         logging.debug('## {} - {}.get_stopped_srvs() -- STOPPED SERVICES == {}'.format(__name__, self, stopped_list))
 
         return stopped_list
 
 
-    def get_certs(self):
+    @timed('get_certs')
+    def get_certs(self, cert_cache=None, resp=None):
 
         """
         Returns the name, issuer, expiry date, and #days to expiry of each cert installed on the server.
 
+            : param cert_cache : Optional CertCache(). Only certs that are new, changed, close to expiry or due for a
+                                 refresh are looked up with 'show cert own', the rest take their expiry date from the cache.
+            : param resp : Optional output of 'show cert list own' already read, so the command is not run again.
+
         """
 
-        resp = self.run_cmd('show cert list own')
+        if resp is None: resp = self.run_cmd('show cert list own')
         logging.debug('## {} - {}.get_certs() -- RESP == {}'.format(__name__, self, resp))
         cert_list = [elem.split(': ') for elem in resp if '.pem' in elem]
 
@@ -268,8 +570,24 @@ class SSHConnect:
             return delta_days
 
 
+        ## Fetches the details of every cert that is not already cached in one pipelined batch.
+        self.prefetch(['show cert own ' + elem[0] for elem in cert_list
+                       if cert_cache is None or cert_cache.get(self.node, elem[0], elem[1]) is None])
+
         for elem in cert_list:
-            elem.append(_get_expire_date(elem))
+            expire_date = cert_cache.get(self.node, elem[0], elem[1]) if cert_cache is not None else None
+
+            if expire_date is None:
+                expire_date = _get_expire_date(elem)
+                if cert_cache is not None and expire_date is not None:
+                    cert_cache.set(self.node, elem[0], elem[1], expire_date)
+            else:
+                logging.debug('## {} - {}.get_certs() -- CACHED == {}, {}'.format(__name__, self, elem[0], expire_date))
+
+            elem.append(expire_date)
+
+        if cert_cache is not None:
+            cert_cache.prune(self.node, [cert_cache.key(self.node, elem[0], elem[1]) for elem in cert_list])
 
         for elem in cert_list:
             elem.append(_expire_delta(elem))
@@ -278,6 +596,7 @@ class SSHConnect:
         return cert_list
 
 
+    @timed('get_backup')
     def get_backup(self):
 
 
@@ -289,46 +608,35 @@ class SSHConnect:
 
         resp = self.run_cmd('utils disaster_recovery history Backup')
         logging.debug('## {} - {}.get_backup() -- RESP == {}'.format(__name__, self, resp))
-        backup_list = [elem for elem in resp if '.tar' in elem or 'TAR file not created' in elem]
-        today = datetime.now()
-
-        latest_backup_status = 'ERROR'
 
-        if 'SUCCESS' in str(backup_list[-1]): latest_backup_status = 'SUCCESS'
-        logging.debug('## {} - {}.get_backup() -- latest_backup_status == {}'.format(__name__, self, latest_backup_status))
+        return parse_backup(resp)
 
-        def _get_backup():
 
-            logging.debug('## {} - {}._get_backup() -- backup_list == {}'.format(__name__, self, backup_list))
+    def is_alive(self, timeout=5):
 
-            latest_backup = str(backup_list.pop()).split()
-
-            logging.debug('## {} - {}._get_backup() -- latest_backup == {} {}'.format(__name__, self, len(latest_backup), latest_backup))
+        """
+        Cheap health check used by the session pool. Sends an empty line and confirms the 'admin:' prompt comes back.
 
-            ## Seperates year and status in the backup history if these have been merged in output due to long timezone, i.e. GMT-02:00
-            if len(latest_backup) == 12 or len(latest_backup) == 13:
-                year_and_status = list(latest_backup.pop(7))
-                year = ''.join(year_and_status[0:4])
-                status = ''.join(year_and_status[4:])
-                latest_backup.insert(7, year)
-                latest_backup.insert(8, status)
+            : param timeout : Seconds to wait for the prompt.
 
-            while 'SUCCESS' in latest_backup:
-                logging.debug('## {} - {}._get_backup() -- WHILE LOOP -- latest_backup = {}'.format(__name__, self, latest_backup))
-                latest_backup[3] = self.months[latest_backup[3]]
-                last_successful_backup = str(latest_backup[4] + '/' + latest_backup[3] + '/' + latest_backup[7])
-                last_successful_backup_strptime = datetime.strptime(last_successful_backup, '%d/%m/%Y')
-                delta = today - last_successful_backup_strptime
-                delta_days = delta.days
+        """
 
-                logging.debug('## {} - {}.get_backup() -- RETURN == {}, {}, {}'.format(__name__, self, latest_backup_status, last_successful_backup, delta_days))
-                return latest_backup_status, last_successful_backup, delta_days
+        try:
+            transport = self.client.get_transport()
+            if transport is None or not transport.is_active() or self.conn.closed:
+                return False
 
-            else:
-                return _get_backup()
+            ## Drops any output left over from an earlier command so the prompt read below is a fresh one.
+            self.reader.discard()
+            self.prefetched = {}
 
+            self.conn.send('\n')
+            self.reader.read_lines(timeout)
+            return True
 
-        return _get_backup()
+        except Exception as e:
+            logging.debug('## {} - {}.is_alive() -- EXCEPTION == {}'.format(__name__, self, e))
+            return False
 
 
     def close_ssh(self):